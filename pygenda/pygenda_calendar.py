@@ -21,7 +21,7 @@
 # along with Pygenda. If not, see <https://www.gnu.org/licenses/>.
 
 
-from icalendar import Calendar as iCalendar, Event as iEvent, Todo as iTodo, Alarm as iAlarm, vRecur
+from icalendar import Calendar as iCalendar, Event as iEvent, Todo as iTodo, Alarm as iAlarm, Component as iComponent, vRecur
 from datetime import timedelta, datetime as dt_datetime, time as dt_time, date as dt_date, timezone
 from dateutil.relativedelta import relativedelta
 from dateutil.rrule import rrulestr, rrule as rruleobj
@@ -29,21 +29,36 @@ from dateutil import tz as du_tz
 from sys import stderr
 from uuid import uuid1
 from pathlib import Path
-from functools import reduce
+from functools import reduce, wraps
 import stat
 from time import monotonic as time_monotonic
 import tempfile
-from typing import Optional, Union, Tuple, List, Any, Set
+import pickle
+from threading import Thread, Lock, RLock, Timer
+from os import fsync, open as os_open, close as os_close, O_RDONLY
+from mmap import mmap, ACCESS_READ
+import gzip
+from heapq import merge as heapq_merge
+from typing import Optional, Union, Tuple, List, Any, Set, Dict, Iterator, Iterable, Callable, TypeVar
 from copy import deepcopy
 from math import ceil
-from calendar import monthrange
+from calendar import monthrange, isleap
 from string import punctuation as str_punctuation
 
 # Pygenda components
 from .pygenda_config import Config
-from .pygenda_util import dt_lt, dt_lte, datetime_to_date, date_to_datetime, get_local_tz, dt_add_delta, utc_now_stamp
+from .pygenda_util import dt_lt, dt_lte, datetime_to_date, datetime_to_local_date, date_to_datetime, get_local_tz, utc_to_local, dt_add_delta, utc_now_stamp, dt_epoch_us, dt_sort_key, entry_sort_key
+from .pygenda_index import IntervalIndex, SortedKeyList, TextIndex, WindowCache, ExclusionIndex, text_tokens
+from .pygenda_snapshot import snapshot_key, load_snapshot, save_snapshot
+from .pygenda_lazyload import lazy_load_ical
+from .pygenda_repeat_numpy import repeats_numpy
 from .pygenda_entryinfo import EntryInfo
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None # Optional, only needed for zstd-compressed files
+
 
 # Interface base class to connect to different data sources.
 # Used by Calendar class (below).
@@ -53,6 +68,9 @@ class CalendarConnector:
     displayclass = None # type:str
     flags = 0
     uid = ""
+    tz_fixed = False # True if entry timezones already "fixed" on loading
+    save_latency = None # type:Optional[float] # secs from change to last save
+    lazy_loaded = False # True if entries are only parsed when accessed
 
     READONLY = 1
     TYPE_EVENT = 2
@@ -90,19 +108,67 @@ class CalendarConnector:
         # Delete entry component to the calendar data and remove from store.
         print('Warning: Delete entry not implemented', file=stderr)
 
+    def init_complete(self) -> None:
+        # Called by Calendar after it has finished setting up the
+        # connector's entries (e.g. fixing timezones).
+        pass
+
+    def presorted_norep_list(self) -> Optional[list]:
+        # Return list of non-repeating entries, probably sorted (i.e.
+        # as a hint to speed up sorting), or None if not available.
+        return None
+
+    def close(self) -> None:
+        # Called on clean exit, so any pending writes can be completed.
+        pass
+
+    def save_pending(self) -> bool:
+        # Return True if there are changes waiting to be written to store.
+        return False
+
+
+_F = TypeVar('_F', bound=Callable[..., Any])
+
+def _edits_entries(func:_F) -> _F:
+    # Decorator for Calendar methods that modify entries. These hold
+    # Calendar._edit_lock while working, so connectors saving in the
+    # background can check that no entry is part-way through a change.
+    @wraps(func)
+    def wrapper(cls:Any, *args:Any, **kwargs:Any) -> Any:
+        with cls._edit_lock:
+            return func(cls, *args, **kwargs)
+    return wrapper # type:ignore[return-value]
+
 
 # Singleton class for calendar data access/manipulation
 class Calendar:
     STATUS_LIST_EVENT = ('TENTATIVE','CONFIRMED','CANCELLED')
     STATUS_LIST_TODO = ('NEEDS-ACTION','IN-PROCESS','COMPLETED','CANCELLED')
 
+    Config.set_defaults('cache',{
+        'occurrence_windows': 32,
+        })
+
     calConnectors = None # type:List[CalendarConnector]
     _default_connector_event = None # type:int
     _default_connector_todo = None # type:int
-    _entry_norep_list_sorted = None # type:Optional[list]
-    _entry_rep_list = None # type:Optional[list]
-    _entry_norep_xover_list_sorted = None # type:Optional[list]
+    _entry_norep_list_sorted = None # type:Optional[SortedKeyList]
+    _entry_norep_list_tz = None # type:Any # local tz used for sort keys
+    _entry_rep_index = None # type:Optional[IntervalIndex]
+    _entry_rep_tz = None # type:Any # local tz used for index
+    _entry_norep_xover_index = None # type:Optional[IntervalIndex]
+    _entry_norep_xover_tz = None # type:Any # local tz used for index
     _todo_list = None # type:Optional[list]
+    _uid_index = None # type:Optional[Dict[str,Union[iEvent,iTodo]]]
+    _uid_dup_set = None # type:Optional[Set[str]] # UIDs used >1 times
+    _override_index = None # type:Optional[Dict[Tuple[int,str],Dict[int,iEvent]]]
+    _override_index_tz = None # type:Any # local tz used for index keys
+    _search_index = None # type:Optional[TextIndex]
+    _search_index_pending = None # type:Optional[Iterator] # entries to add
+    _occ_cache = None # type:Optional[WindowCache]
+    _occ_cache_tz = None # type:Any # local tz used for cached results
+    _generation = 0 # incremented whenever an entry is changed
+    _edit_lock = RLock() # held while entries are being modified
 
     @classmethod
     def init(cls) -> None:
@@ -175,25 +241,45 @@ class Calendar:
             if conn.stores_events():
                 for ev in conn.cal.walk('VEVENT'):
                     ev._cal_idx = calidx
-                    cls._fix_tz(ev)
+                    if not conn.tz_fixed:
+                        cls._fix_tz(ev)
+                    if 'DTSTART' in ev:
+                        entry_sort_key(ev) # Calculate & cache sort key
+                    cls._uid_index_add(ev)
+                    cls._override_index_add(ev)
             if conn.stores_todos():
                 for td in conn.cal.walk('VTODO'):
                     td._cal_idx = calidx
-                    cls._fix_tz(td)
+                    if not conn.tz_fixed:
+                        cls._fix_tz(td)
+                    if 'DUE' in td:
+                        entry_sort_key(td) # Calculate & cache sort key
+                    cls._uid_index_add(td)
+            conn.tz_fixed = True
 
             # Finally, append our new connector to the list
             cls.calConnectors.append(conn)
+            conn.init_complete()
 
 
         # Re-initialise connections and saved lists so init()
         # can be called more than once if necessary
+        cls.close()
         cls.calConnectors = []
         cls._default_connector_event = None # type:ignore[assignment]
         cls._default_connector_todo = None # type:ignore[assignment]
         cls._entry_norep_list_sorted = None
-        cls._entry_rep_list = None
-        cls._entry_norep_xover_list_sorted = None
+        cls._entry_rep_index = None
+        cls._entry_norep_xover_index = None
         cls._todo_list = None
+        cls._uid_index = {}
+        cls._uid_dup_set = set()
+        cls._override_index = {}
+        cls._override_index_tz = get_local_tz()
+        cls._search_index = None
+        cls._search_index_pending = None
+        cls._occ_cache = WindowCache(Config.get_int('cache','occurrence_windows') or 0)
+        cls._generation += 1
 
         i = 0 # Calendar index
         caltype = Config.get('calendar','type')
@@ -231,6 +317,29 @@ class Calendar:
                     break
 
 
+    @classmethod
+    def close(cls) -> None:
+        # Called on clean exit, so connectors can complete pending writes.
+        for conn in cls.calConnectors or ():
+            conn.close()
+
+
+    @classmethod
+    def save_pending(cls) -> bool:
+        # Return True if any calendar has changes waiting to be saved
+        # (e.g. so UI can show a "saving" indicator).
+        return any(conn.save_pending() for conn in cls.calConnectors or ())
+
+
+    @classmethod
+    def save_latency(cls) -> Optional[float]:
+        # Return longest time (in seconds) between a change and it being
+        # saved, for the most recent save of each calendar.
+        # None if nothing has been saved.
+        lats = [conn.save_latency for conn in cls.calConnectors or () if conn.save_latency is not None]
+        return max(lats) if lats else None
+
+
     @staticmethod
     def _parse_config_icalfile(calsect:str, flags:int) -> CalendarConnector:
         # Reads config filename setting for an icalfile and returns an
@@ -240,7 +349,20 @@ class Calendar:
         filename = Config.get_filepath(calsect, 'filename', default)
         if filename is None:
             raise ValueError('Unable to get filename for ical file')
-        return CalendarConnectorICalFile(filename, flags)
+        use_snapshot = Config.get_bool(calsect, 'snapshot_cache') is not False
+        use_journal = Config.get_bool(calsect, 'journal') is True
+        journal_max_size = Config.get_int(calsect, 'journal_max_size')
+        journal_max_age = Config.get_int(calsect, 'journal_max_age')
+        save_delay = Config.get_float(calsect, 'save_delay')
+        use_lazy = Config.get_bool(calsect, 'lazy_load') is True
+        compression = Config.get(calsect, 'compression')
+        if compression == '':
+            compression = None
+        elif compression is not None:
+            compression = compression.lower()
+            if compression not in CalendarConnectorICalFile.COMPRESSION_TYPES:
+                raise ValueError('Unknown compression type "{:s}" for ical file'.format(compression))
+        return CalendarConnectorICalFile(filename, flags, use_snapshot=use_snapshot, use_journal=use_journal, journal_max_size=journal_max_size, journal_max_age=journal_max_age, save_delay=save_delay, use_lazy=use_lazy, compression=compression)
 
 
     @staticmethod
@@ -264,7 +386,7 @@ class Calendar:
     def _fix_tz(entry:Union[iEvent,iTodo]) -> None:
         # Function to set timezones for entry dates.
         # Modifies entry dates in-place.
-        for l in ('DTSTART','DTEND','DUE'):
+        for l in ('DTSTART','DTEND','DUE','RECURRENCE-ID'):
             if l in entry:
                 prop = entry[l]
                 if 'TZID' in prop.params:
@@ -323,6 +445,7 @@ class Calendar:
 
 
     @classmethod
+    @_edits_entries
     def new_entry(cls, e_inf:EntryInfo) -> Union[iEvent,iTodo]:
         # Add a new iCal entry with content from entry info object
         # Return a reference to the new entry.
@@ -376,14 +499,18 @@ class Calendar:
     def _update_lists_new_entry(cls, en:Union[iEvent,iTodo]) -> None:
         # Clear/update appropriate lists for new entry.
         # Note: en should be a *new* entry, not an updated entry.
-        if cls._entry_belongs_in_norep_list(en):
-            cls._entry_norep_list_sorted = None
-        if cls._entry_rep_list is not None and cls._entry_belongs_in_rep_list(en):
-            cls._entry_rep_list.append(en) # unsorted, so just add entry
-        if cls._entry_belongs_in_norep_xover_list(en):
-            cls._entry_norep_xover_list_sorted = None
+        cls._entry_changed(cls._entry_occ_bounds(en))
+        if cls._entry_norep_list_sorted is not None and cls._entry_belongs_in_norep_list(en):
+            cls._entry_norep_list_sorted.add(en)
+        if cls._entry_rep_index is not None and cls._entry_belongs_in_rep_list(en):
+            cls._add_to_rep_index(en)
+        if cls._entry_norep_xover_index is not None and cls._entry_belongs_in_norep_xover_list(en):
+            cls._add_to_norep_xover_index(en)
         if cls._todo_list is not None and isinstance(en, iTodo):
             cls._todo_list.append(en)
+        cls._uid_index_add(en)
+        cls._override_index_add(en)
+        cls._search_index_changed(en, en)
 
 
     @classmethod
@@ -410,6 +537,7 @@ class Calendar:
             tgt_en.add(elt, fallback)
 
     @classmethod
+    @_edits_entries
     def _new_entry_from_example(cls, exen:Union[iEvent,iTodo], e_type:int=None, dt_start:dt_date=None, e_cats:Union[list,bool,None]=True, cal_idx:int=None, use_ex_uid_created:bool=False, use_ex_rpts:bool=False, use_ex_alarms:bool=True)-> Union[iEvent,iTodo]:
         # Add a new iCal entry to store given example iEvent as a "template".
         # Used to implement pasting entries and importing entries.
@@ -523,6 +651,9 @@ class Calendar:
                 cls._en_add_elt_from_en(en, exen, 'X-PYGENDA-ANNIVERSARY')
                 cls._en_add_elt_from_en(en, exen, 'X-EPOCAGENDAENTRYTYPE')
                 cls._en_add_elt_from_en(en, exen, 'X-PYGENDA-ANNIVERSARY-SHOW')
+            if use_ex_uid_created:
+                # Keep link to occurrence of repeat this entry overrides
+                cls._en_add_elt_from_en(en, exen, 'RECURRENCE-ID')
             if use_ex_alarms:
                 alms = exen.walk('VALARM')
                 for alm in alms:
@@ -554,6 +685,7 @@ class Calendar:
 
 
     @classmethod
+    @_edits_entries
     def update_entry(cls, en:Union[iEvent,iTodo], e_inf:EntryInfo) -> Union[iEvent,iTodo]:
         # Update entry using details from EntryInfo e_inf.
 
@@ -573,9 +705,8 @@ class Calendar:
             raise ValueError('Unrecognized entry type')
 
         # Check which lists the entry was in previously
-        was_in_norep_list = cls._entry_belongs_in_norep_list(en)
-        was_in_rep_list = cls._entry_belongs_in_rep_list(en)
-        was_in_norep_xover_list = cls._entry_belongs_in_norep_xover_list(en)
+        old_bounds = cls._entry_occ_bounds(en)
+        old_uid = str(en['UID']) if 'UID' in en else None
         was_in_todo_list = isinstance(en, iTodo)
 
         if 'UID' not in en:
@@ -636,30 +767,94 @@ class Calendar:
             cls.calConnectors[old_cal_idx].delete_entry(en)
 
         # Now clear/update lists depending on previous & new states
-        if was_in_norep_list or cls._entry_belongs_in_norep_list(new_en):
-            cls._entry_norep_list_sorted = None
-        if cls._entry_rep_list is not None:
-            if was_in_rep_list != cls._entry_belongs_in_rep_list(new_en):
-                # List not sorted, so no need to re-sort if no change
-                if was_in_rep_list:
-                    cls._entry_rep_list.remove(en)
-                else:
-                    cls._entry_rep_list.append(new_en)
-            elif was_in_rep_list is True and en is not new_en:
-                cls._entry_rep_list.remove(en)
-                cls._entry_rep_list.append(new_en)
-        if was_in_norep_xover_list or cls._entry_belongs_in_norep_xover_list(new_en):
-            cls._entry_norep_xover_list_sorted = None
+        if cls._entry_norep_list_sorted is not None:
+            # Dates may have changed, so remove & re-add to update position
+            cls._entry_norep_list_sorted.discard(en)
+            if cls._entry_belongs_in_norep_list(new_en):
+                cls._entry_norep_list_sorted.add(new_en)
+        if cls._entry_rep_index is not None:
+            # Repeat rule may have changed, so remove & re-add to update span
+            cls._entry_rep_index.discard(en)
+            if cls._entry_belongs_in_rep_list(new_en):
+                cls._add_to_rep_index(new_en)
+        if cls._entry_norep_xover_index is not None:
+            # Dates may have changed, so remove & re-add to update span
+            cls._entry_norep_xover_index.discard(en)
+            if cls._entry_belongs_in_norep_xover_list(new_en):
+                cls._add_to_norep_xover_index(new_en)
 
         if cls._todo_list is not None:
             if was_in_todo_list:
                 cls._todo_list.remove(en)
             if isinstance(new_en, iTodo):
                 cls._todo_list.append(new_en)
-
+        if en is not new_en or old_uid is None:
+            cls._uid_index_remove(en, old_uid)
+            cls._uid_index_add(new_en)
+        cls._override_index_remove(en)
+        cls._override_index_add(new_en)
+        cls._search_index_changed(en, new_en)
+
+        cls._entry_changed(old_bounds)
+        cls._entry_changed(cls._entry_occ_bounds(new_en))
         return new_en
 
 
+    @classmethod
+    def _entry_changed(cls, bounds:Optional[Tuple[Any,Any]]) -> None:
+        # Record that an entry has been added/changed/deleted.
+        # `bounds` is the range of the entry's occurrences, as returned
+        # by _entry_occ_bounds(). Cached occurrence lists overlapping
+        # this range are invalidated.
+        cls._generation += 1
+        if bounds is not None and cls._occ_cache is not None:
+            cls._occ_cache.invalidate(*bounds)
+
+
+    @classmethod
+    def _entry_occ_bounds(cls, en:Union[iEvent,iTodo]) -> Optional[Tuple[Any,Any]]:
+        # Return (lo,hi) epoch times such that every occurrence of en
+        # returned by occurrence_list() starts in lo <= . <= hi, or None
+        # if en has no occurrences. Bounds do not need to be tight.
+        try:
+            if isinstance(en, iTodo):
+                if not cls._todo_belongs_in_norep_list(en):
+                    return None
+                lo = dt_epoch_us(en['DUE'].dt)
+                return lo,lo
+            lo = dt_epoch_us(en['DTSTART'].dt)
+            if not cls._event_belongs_in_rep_list(en):
+                if 'RECURRENCE-ID' in en:
+                    # Override also hides occurrence of repeating entry
+                    rid = dt_epoch_us(en['RECURRENCE-ID'].dt)
+                    return min(lo,rid), max(lo,rid)
+                return lo,lo
+            rrule = en['RRULE']
+            hi = float('inf') # type:Any
+            if 'UNTIL' in rrule:
+                # Add margin, since UNTIL might be a date or in a different timezone
+                hi = dt_epoch_us(rrule['UNTIL'][0]+timedelta(days=2))
+            elif 'COUNT' in rrule:
+                # Need last occurrence (ignoring exdates), cached in plan
+                last = repeat_plan(en).count_bound(en)
+                if last is None:
+                    hi = None # No occurrences from RRULE
+                else:
+                    hi = dt_epoch_us(last)
+            rdates = repeat_plan(en).rdate_list(en)
+            if rdates:
+                # Add margin, since RDATE might be a date
+                lo = min(lo, dt_epoch_us(rdates[0])-86400000000)
+                rd_hi = dt_epoch_us(rdates[-1])+86400000000
+                hi = rd_hi if hi is None else max(hi, rd_hi)
+            if hi is None:
+                return None # No occurrences
+            return lo, hi
+        except Exception:
+            # Can't calculate bounds (e.g. bad data) - so all is possible
+            return float('-inf'), float('inf')
+
+
     @staticmethod
     def _del_entry_field(en:Union[iEvent,iTodo], fname:str) -> None:
         # Helper function to delete an entry field if it exists.
@@ -831,25 +1026,31 @@ class Calendar:
 
 
     @classmethod
+    @_edits_entries
     def delete_entry(cls, entry:Union[iEvent,iTodo]) -> None:
         # Delete given entry.
         if cls.calendar_readonly(entry):
             raise ValueError('Tried to delete entry from calendar set readonly')
 
         # Need to remove entry from any internal lists...
-        if cls._entry_norep_list_sorted is not None and cls._entry_belongs_in_norep_list(entry):
-            cls._entry_norep_list_sorted.remove(entry)
-        if cls._entry_rep_list is not None and cls._entry_belongs_in_rep_list(entry):
-            cls._entry_rep_list.remove(entry)
-        if cls._entry_norep_xover_list_sorted is not None and cls._entry_belongs_in_norep_xover_list(entry):
-            cls._entry_norep_xover_list_sorted.remove(entry)
+        if cls._entry_norep_list_sorted is not None:
+            cls._entry_norep_list_sorted.discard(entry)
+        if cls._entry_rep_index is not None:
+            cls._entry_rep_index.discard(entry)
+        if cls._entry_norep_xover_index is not None:
+            cls._entry_norep_xover_index.discard(entry)
         if cls._todo_list is not None and isinstance(entry, iTodo):
             cls._todo_list.remove(entry)
 
         cls.calConnectors[entry._cal_idx].delete_entry(entry)
+        cls._uid_index_remove(entry)
+        cls._override_index_remove(entry)
+        cls._search_index_changed(entry, None)
+        cls._entry_changed(cls._entry_occ_bounds(entry))
 
 
     @classmethod
+    @_edits_entries
     def set_toggle_status_entry(cls, entry:Union[iEvent,iTodo], stat:Optional[str]) -> None:
         # Set entry STATUS to stat & save entry.
         # If STATUS is set and equals stat, toggle it off.
@@ -865,6 +1066,7 @@ class Calendar:
         cls._add_status_entry(entry, stat)
         cls._update_timestamps(entry, is_new=False)
         cls.calConnectors[entry._cal_idx].update_entry(entry) # Write to store
+        cls._entry_changed(cls._entry_occ_bounds(entry))
 
 
     @staticmethod
@@ -886,18 +1088,28 @@ class Calendar:
 
     @classmethod
     def _update_entry_norep_list(cls) -> None:
-        # Re-build _entry_norep_list_sorted, if it has been cleared (==None)
+        # Re-build _entry_norep_list_sorted, if it has not been created
+        # (==None) or if sort keys are out of date because local timezone
+        # changed. Otherwise, it is updated in place as entries change.
+        if cls._entry_norep_list_tz is not get_local_tz():
+            cls._entry_norep_list_sorted = None
         if cls._entry_norep_list_sorted is None:
             # Get events with no repeat rule
-            cls._entry_norep_list_sorted = []
+            norep = []
             for conn in cls.calConnectors:
+                presorted = conn.presorted_norep_list()
+                if presorted is not None:
+                    norep.extend(presorted)
+                    continue
                 if conn.stores_events():
                     evs = conn.cal.walk('VEVENT')
-                    cls._entry_norep_list_sorted.extend([e for e in evs if Calendar._event_belongs_in_norep_list(e)])
+                    norep.extend([e for e in evs if Calendar._event_belongs_in_norep_list(e)])
                 if conn.stores_todos():
                     tds = conn.cal.walk('VTODO')
-                    cls._entry_norep_list_sorted.extend([t for t in tds if Calendar._todo_belongs_in_norep_list(t)])
-            cls._entry_norep_list_sorted.sort()
+                    norep.extend([t for t in tds if Calendar._todo_belongs_in_norep_list(t)])
+            # Note: sort is fast for runs of already-sorted entries
+            cls._entry_norep_list_sorted = SortedKeyList(entry_sort_key, norep)
+            cls._entry_norep_list_tz = get_local_tz()
 
 
     @staticmethod
@@ -921,52 +1133,83 @@ class Calendar:
 
 
     @classmethod
-    def _update_entry_rep_list(cls) -> None:
-        # Re-build _entry_rep_list, if it has been cleared (==None)
-        # Possible optimisation: sort most -> least frequent
-        # (so don't get last one inserting loads into array) 
-        if cls._entry_rep_list is None:
-            cls._entry_rep_list = []
+    def _update_entry_rep_index(cls) -> None:
+        # Re-build _entry_rep_index, if it is cleared (==None).
+        # Also re-build if local timezone has changed, since spans of
+        # entries with floating times/dates depend on timezone.
+        if cls._entry_rep_index is None or cls._entry_rep_tz is not get_local_tz():
+            cls._entry_rep_index = IntervalIndex()
+            cls._entry_rep_tz = get_local_tz()
             for conn in cls.calConnectors:
                 if conn.stores_events():
                     evs = conn.cal.walk('VEVENT')
-                    cls._entry_rep_list.extend([e for e in evs if Calendar._event_belongs_in_rep_list(e)])
+                    for e in evs:
+                        if Calendar._event_belongs_in_rep_list(e):
+                            cls._add_to_rep_index(e)
+
+
+    @classmethod
+    def _add_to_rep_index(cls, ev:iEvent) -> None:
+        # Add repeating event to _entry_rep_index, spanning from its first
+        # to last occurrence (or infinity), so queries can skip repeats
+        # that have finished or not yet started.
+        # Events with no occurrences (e.g. COUNT=0) are not added.
+        bounds = cls._entry_occ_bounds(ev)
+        if bounds is not None:
+            # Index spans are [start,end), but bounds are inclusive
+            cls._entry_rep_index.add(ev, bounds[0], bounds[1]+1) # type:ignore[union-attr]
 
 
     @staticmethod
     def _event_belongs_in_rep_list(ev:iEvent) -> bool:
-        # Return True if ev should be in _entry_rep_list
+        # Return True if ev should be in _entry_rep_index
         return 'RRULE' in ev and ev['RRULE'] is not None
 
 
     @staticmethod
     def _todo_belongs_in_rep_list(td:iTodo) -> bool:
-        # Return True if td should be in _entry_rep_list
+        # Return True if td should be in _entry_rep_index
         return False
 
 
     @staticmethod
     def _entry_belongs_in_rep_list(en:Union[iEvent,iTodo]) -> bool:
-        # Return True if en should be in _entry_rep_list
+        # Return True if en should be in _entry_rep_index
         if isinstance(en, iEvent):
             return Calendar._event_belongs_in_rep_list(en)
         return Calendar._todo_belongs_in_rep_list(en)
 
 
     @classmethod
-    def _update_entry_norep_xover_list_sorted(cls) -> None:
-        # Re-build _entry_norep_xover_list_sorted, if it is cleared (==None)
-        if cls._entry_norep_xover_list_sorted is None:
-            cls._entry_norep_xover_list_sorted = []
+    def _update_entry_norep_xover_index(cls) -> None:
+        # Re-build _entry_norep_xover_index, if it is cleared (==None).
+        # Also re-build if local timezone has changed, since which
+        # entries cross over days, and their spans, depend on timezone.
+        if cls._entry_norep_xover_index is None or cls._entry_norep_xover_tz is not get_local_tz():
+            cls._entry_norep_xover_index = IntervalIndex()
+            cls._entry_norep_xover_tz = get_local_tz()
             for conn in cls.calConnectors:
                 evs = conn.cal.walk('vEvent')
-                cls._entry_norep_xover_list_sorted.extend([e for e in evs if Calendar._event_belongs_in_norep_xover_list(e)])
-            cls._entry_norep_xover_list_sorted.sort()
+                for e in evs:
+                    if Calendar._event_belongs_in_norep_xover_list(e):
+                        cls._add_to_norep_xover_index(e)
+
+
+    @classmethod
+    def _add_to_norep_xover_index(cls, ev:iEvent) -> None:
+        # Add event to _entry_norep_xover_index, with normalised span.
+        # Assumes ev belongs in index (so it has an end or duration).
+        st = ev['DTSTART'].dt
+        if 'DTEND' in ev:
+            end = ev['DTEND'].dt
+        else: # 'DURATION' in ev
+            end = dt_add_delta(st, ev['DURATION'].dt)
+        cls._entry_norep_xover_index.add(ev, dt_epoch_us(st), dt_epoch_us(end)) # type:ignore[union-attr]
 
 
     @staticmethod
     def _event_belongs_in_norep_xover_list(ev:iEvent) -> bool:
-        # Return True if ev should be in _entry_norep_xover_list_sorted
+        # Return True if ev should be in _entry_norep_xover_index
         if 'RRULE' in ev and ev['RRULE'] is not None:
             return False
         if 'DTEND' in ev:
@@ -990,13 +1233,13 @@ class Calendar:
 
     @staticmethod
     def _todo_belongs_in_norep_xover_list(td:iTodo) -> bool:
-        # Return True if td should be in _entry_norep_xover_list_sorted
+        # Return True if td should be in _entry_norep_xover_index
         return False
 
 
     @staticmethod
     def _entry_belongs_in_norep_xover_list(en:Union[iEvent,iTodo]) -> bool:
-        # Return True if en should be in _entry_norep_xover_list_sorted
+        # Return True if en should be in _entry_norep_xover_index
         if isinstance(en, iEvent):
             return Calendar._event_belongs_in_norep_xover_list(en)
         return Calendar._todo_belongs_in_norep_xover_list(en)
@@ -1009,74 +1252,272 @@ class Calendar:
         # An "occurrence" is a pair: (event,datetime)
         #  for repeating entries, datetime may not be the DTSTART entry
         # Needs to also return events that last/end over range??
-        ret_list = []
+        # Results are cached, since views often re-request the same range.
+        if cls._occ_cache_tz is not get_local_tz():
+            # Results depend on local timezone, so can't use old results
+            cls._occ_cache.clear() # type:ignore[union-attr]
+            cls._occ_cache_tz = get_local_tz()
+        key = (start, stop, include_single, include_repeated, in_grid)
+        cached = cls._occ_cache.get(key) # type:ignore[union-attr]
+        if cached is not None:
+            return list(cached) # Copy, so caller can modify list
+        ret_list = list(merge_occurrences(cls._occurrence_sources(start, stop, include_single, include_repeated, in_grid, False)))
+        cls._occ_cache.put(key, dt_epoch_us(start), dt_epoch_us(stop), ret_list) # type:ignore[union-attr]
+        return list(ret_list)
+
+
+    @classmethod
+    def occurrence_iter(cls, start:dt_date, stop:dt_date, include_single:bool=True, include_repeated:bool=True, in_grid:bool=False) -> Iterator[Tuple[Union[iEvent,iTodo],dt_date]]:
+        # Generator version of occurrence_list(): yields occurrences in
+        # range start <= . < stop in order. Repeats are calculated lazily
+        # as the generator is advanced, so this is quicker for callers
+        # that only need the first few occurrences (or to know if there
+        # are any). Uses cached results from occurrence_list() if present.
+        if cls._occ_cache_tz is get_local_tz():
+            key = (start, stop, include_single, include_repeated, in_grid)
+            cached = cls._occ_cache.get(key) # type:ignore[union-attr]
+            if cached is not None:
+                yield from list(cached) # Copy, in case cache changes
+                return
+        yield from merge_occurrences(cls._occurrence_sources(start, stop, include_single, include_repeated, in_grid, True))
+
+
+    @classmethod
+    def _occurrence_sources(cls, start:dt_date, stop:dt_date, include_single:bool, include_repeated:bool, in_grid:bool, lazy:bool) -> list:
+        # Return list of sorted iterables of occurrences in range, to be
+        # merged by merge_occurrences(): first the non-repeating entries,
+        # then one for each repeating entry that might be in range.
+        # If lazy is True, repeats are calculated as iterables are read.
+        sources = [] # type:List[Iterable]
         if include_single:
             cls._update_entry_norep_list()
-            # bisect to find starting point
-            ii = 0
-            llen = len(cls._entry_norep_list_sorted) # type:ignore[arg-type]
-            top = llen
-            while ii<top:
-                mid = (ii+top)//2
-                if dt_lt(cls._entry_norep_list_sorted[mid]._sort_dt(),start): # type:ignore[index]
-                    ii = mid+1
-                else:
-                    top = mid
-            # ii is now the start, append occs to ret_list
-            while ii < llen:
-                e = cls._entry_norep_list_sorted[ii] # type:ignore[index]
-                e_st = e._sort_dt()
-                if dt_lte(stop, e_st):
-                    break
+            singles = cls._entry_norep_list_sorted.irange_key(dt_sort_key(start), dt_sort_key(stop)) # type:ignore[union-attr]
+            if in_grid:
+                singles = (e for e in singles if cls.calConnectors[e._cal_idx].show_in_grid())
+            sources.append((e,e._sort_dt()) for e in singles)
+        if include_repeated:
+            cls._update_entry_rep_index()
+            # Only repeats with occurrences that might be in range
+            reps = cls._entry_rep_index.overlapping(dt_epoch_us(start), dt_epoch_us(stop)) # type:ignore[union-attr]
+            for e in reps:
+                if not in_grid or cls.calConnectors[e._cal_idx].show_in_grid():
+                    occs = entry_repeat_occurrences(e, start, stop, lazy)
+                    overrides = cls._overrides_of(e)
+                    if overrides:
+                        # Overridden occurrences are replaced by override
+                        # entries, which are listed as single entries.
+                        occs = (o for o in occs if dt_sort_key(o[1]) not in overrides)
+                        if not lazy:
+                            occs = list(occs)
+                    sources.append(occs)
+        return sources
+
+
+    @classmethod
+    def days_with_occurrences(cls, start:dt_date, stop:dt_date, include_single:bool=True, include_repeated:bool=True, in_grid:bool=False) -> Dict[dt_date,list]:
+        # Return dictionary mapping each local date in range start <= . < stop
+        # to list of entries with occurrences on that date (each entry is
+        # listed once, even if it occurs several times in the day).
+        # Designed for views that only show which days have entries
+        # (e.g. Year View), since dense repeats (e.g. every minute) are
+        # calculated per day, not per occurrence.
+        ret = {} # type:Dict[dt_date,list]
+        if include_single:
+            cls._update_entry_norep_list()
+            singles = cls._entry_norep_list_sorted.irange_key(dt_sort_key(start), dt_sort_key(stop)) # type:ignore[union-attr]
+            for e in singles:
                 if not in_grid or cls.calConnectors[e._cal_idx].show_in_grid():
-                    ret_list.append((e,e_st))
-                ii += 1
+                    d = datetime_to_local_date(e._sort_dt())
+                    if not dt_lt(d,start) and dt_lt(d,stop):
+                        ret.setdefault(d,[]).append(e)
         if include_repeated:
-            cls._update_entry_rep_list()
-            for e in cls._entry_rep_list: # type:ignore[union-attr]
+            cls._update_entry_rep_index()
+            reps = cls._entry_rep_index.overlapping(dt_epoch_us(start), dt_epoch_us(stop)) # type:ignore[union-attr]
+            for e in reps:
                 if not in_grid or cls.calConnectors[e._cal_idx].show_in_grid():
-                    merge_repeating_entries_sort(ret_list,e,start,stop)
-        return ret_list
+                    overrides = cls._overrides_of(e)
+                    if overrides:
+                        # Need to check each occurrence for overrides
+                        days = [] # type:List[dt_date]
+                        for o in entry_repeat_occurrences(e, start, stop, True):
+                            if dt_sort_key(o[1]) not in overrides:
+                                d = datetime_to_local_date(o[1])
+                                if (not days or d!=days[-1]) and not dt_lt(d,start) and dt_lt(d,stop):
+                                    days.append(d)
+                    else:
+                        days = entry_repeat_days(e, start, stop)
+                    for d in days:
+                        ret.setdefault(d,[]).append(e)
+        return ret
+
+
+    @classmethod
+    def occurrence_cache_stats(cls) -> dict:
+        # Return statistics for occurrence_list() cache (e.g. for tuning
+        # cache size in config, or for debugging).
+        oc = cls._occ_cache
+        return {
+            'hits': oc.hits if oc else 0,
+            'misses': oc.misses if oc else 0,
+            'size': len(oc) if oc else 0,
+            'maxsize': oc.maxsize if oc else 0,
+            'generation': cls._generation,
+            }
 
 
     @classmethod
     def ongoing_list(cls, dt:dt_date, include_single:bool=True, include_repeated:bool=True) -> list:
         # Return list of events that are ongoing at datetime 'dt'
+        # (i.e. started before dt, and end after dt).
         ret_list = []
         if include_single:
-            # Naive implementation - scope for optimisation here!!
-            cls._update_entry_norep_xover_list_sorted()
-            for e in cls._entry_norep_xover_list_sorted:#type:ignore[union-attr]
-                e_st = e['DTSTART'].dt
-                if dt_lte(dt, e_st):
-                    break # List is sorted, so we can stop search here
-                if 'DTEND' in e:
-                    e_end = e['DTEND'].dt
-                else: # 'DURATION' in e
-                    e_end = dt_add_delta(e_st, e['DURATION'].dt)
-                if dt_lt(dt, e_end):
-                    ret_list.append((e,e_st))
+            cls._update_entry_norep_xover_index()
+            dt_us = dt_epoch_us(dt)
+            ongoing = cls._entry_norep_xover_index.overlapping(dt_us, dt_us) # type:ignore[union-attr]
+            ret_list.extend([(e,e['DTSTART'].dt) for e in ongoing])
         return ret_list
 
 
     @classmethod
     def get_entry_by_uid(cls, uid:str) -> Union[iEvent,iTodo,None]:
-        # Return entry corresponding to UID.
-        # Assumes UID only occurs once in all calendars.
-        # Used when importing ical files to check if entry already
-        # exists, so no particular need to be super-speedy.
-        for conn in cls.calConnectors:
-            if conn.stores_events():
-                evs = conn.cal.walk('VEVENT')
-                for ev in evs:
-                    if 'UID' in ev and ev['UID']==uid:
-                        return ev
-            if conn.stores_todos():
-                tds = conn.cal.walk('VTODO')
-                for td in tds:
-                    if 'UID' in td and td['UID']==uid:
-                        return td
-        return None
+        # Return entry corresponding to UID, or None if there isn't one.
+        # If the UID occurs more than once (see uid_is_duplicate()), one
+        # of the entries is returned.
+        # Uses UID index, so is quick enough to use to check for existing
+        # entries when importing/pasting/syncing.
+        return cls._uid_index.get(str(uid)) # type:ignore[union-attr]
+
+
+    @classmethod
+    def uid_exists(cls, uid:str) -> bool:
+        # Return True if an entry with given UID is in a calendar.
+        return str(uid) in cls._uid_index # type:ignore[operator]
+
+
+    @classmethod
+    def override_exists(cls, uid:str, recurrence_id:dt_date) -> bool:
+        # Return True if a calendar has an entry with given UID that
+        # overrides the occurrence at recurrence_id (i.e. has that
+        # RECURRENCE-ID). Overrides share their repeating entry's UID,
+        # so uid_exists() can't be used to check for these.
+        cls._update_override_index()
+        if not cls._override_index:
+            return False
+        uid = str(uid)
+        key = dt_sort_key(recurrence_id)
+        for i in range(len(cls.calConnectors)):
+            overrides = cls._override_index.get((i,uid))
+            if overrides is not None and key in overrides:
+                return True
+        return False
+
+
+    @classmethod
+    def uid_is_duplicate(cls, uid:str) -> bool:
+        # Return True if more than one entry has the given UID.
+        return str(uid) in cls._uid_dup_set # type:ignore[operator]
+
+
+    @classmethod
+    def duplicate_uids(cls) -> Set[str]:
+        # Return set of UIDs that are used by more than one entry.
+        return set(cls._uid_dup_set) # type:ignore[arg-type]
+
+
+    @classmethod
+    def _uid_index_add(cls, en:Union[iEvent,iTodo]) -> None:
+        # Add entry to UID index. Entries with no UID are not indexed.
+        if 'UID' in en:
+            uid = str(en['UID'])
+            idx_en = cls._uid_index.get(uid) # type:ignore[union-attr]
+            if idx_en is None:
+                cls._uid_index[uid] = en # type:ignore[index]
+            elif idx_en is not en:
+                cls._uid_dup_set.add(uid) # type:ignore[union-attr]
+
+
+    @classmethod
+    def _uid_index_remove(cls, en:Union[iEvent,iTodo], uid:Optional[str]=None) -> None:
+        # Remove entry from UID index.
+        # Entry UID can be given, in case it has changed since indexing.
+        if uid is None:
+            if 'UID' not in en:
+                return
+            uid = str(en['UID'])
+        if uid in cls._uid_dup_set: # type:ignore[operator]
+            # UID is duplicated, so find which entries remain.
+            # Slow, but duplicates should be rare.
+            cls._uid_dup_set.discard(uid) # type:ignore[union-attr]
+            cls._uid_index.pop(uid, None) # type:ignore[union-attr]
+            for conn in cls.calConnectors:
+                ens = [] # type:list
+                if conn.stores_events():
+                    ens.extend(conn.cal.walk('VEVENT'))
+                if conn.stores_todos():
+                    ens.extend(conn.cal.walk('VTODO'))
+                for e in ens:
+                    if e is not en and 'UID' in e and e['UID']==uid:
+                        cls._uid_index_add(e)
+        elif cls._uid_index.get(uid) is en: # type:ignore[union-attr]
+            del(cls._uid_index[uid]) # type:ignore[union-attr]
+
+
+    @staticmethod
+    def _override_index_key(en:Union[iEvent,iTodo]) -> Optional[Tuple[Tuple[int,str],int]]:
+        # Return key for override index if entry en overrides an occurrence
+        # of a repeating entry (i.e. it has a RECURRENCE-ID), or None.
+        # Key is ((calendar index, UID), sort key of overridden occurrence).
+        if 'RECURRENCE-ID' not in en or 'UID' not in en or not isinstance(en, iEvent):
+            return None
+        return (en._cal_idx, str(en['UID'])), dt_sort_key(en['RECURRENCE-ID'].dt)
+
+
+    @classmethod
+    def _override_index_add(cls, en:Union[iEvent,iTodo]) -> None:
+        # Add entry to override index, if it has a RECURRENCE-ID.
+        # The key is saved in the entry, so it can be removed even if
+        # the entry's UID/RECURRENCE-ID or the local timezone changes.
+        key = cls._override_index_key(en)
+        if key is not None:
+            cls._override_index.setdefault(key[0], {})[key[1]] = en # type:ignore[union-attr]
+            en._override_key = key
+
+
+    @classmethod
+    def _override_index_remove(cls, en:Union[iEvent,iTodo]) -> None:
+        # Remove entry from override index (if it's in there).
+        key = getattr(en, '_override_key', None)
+        if key is not None:
+            del(en._override_key)
+            overrides = cls._override_index.get(key[0]) # type:ignore[union-attr]
+            if overrides is not None and overrides.get(key[1]) is en:
+                del(overrides[key[1]])
+                if not overrides:
+                    del(cls._override_index[key[0]]) # type:ignore[union-attr]
+
+
+    @classmethod
+    def _update_override_index(cls) -> None:
+        # Keys of floating times depend on local timezone, so if that has
+        # changed, the override index is rebuilt.
+        if cls._override_index_tz is not get_local_tz():
+            cls._override_index = {}
+            cls._override_index_tz = get_local_tz()
+            for conn in cls.calConnectors:
+                if conn.stores_events():
+                    for e in conn.cal.walk('VEVENT'):
+                        cls._override_index_add(e)
+
+
+    @classmethod
+    def _overrides_of(cls, ev:iEvent) -> Optional[Dict[int,iEvent]]:
+        # Return dictionary of entries overriding occurrences of repeating
+        # event ev, keyed by dt_sort_key() of the overridden occurrence,
+        # or None if there are none.
+        cls._update_override_index()
+        if 'UID' not in ev or not cls._override_index:
+            return None
+        return cls._override_index.get((ev._cal_idx, str(ev['UID'])))
 
 
     @classmethod
@@ -1096,30 +1537,125 @@ class Calendar:
         return cls._todo_list # type:ignore[return-value]
 
 
+    # Field names that can be used to restrict searches, e.g. 'loc:office'
+    SEARCH_FIELDS = {
+        'summary': 'SUMMARY',
+        'sum': 'SUMMARY',
+        'title': 'SUMMARY',
+        'location': 'LOCATION',
+        'loc': 'LOCATION',
+        'description': 'DESCRIPTION',
+        'desc': 'DESCRIPTION',
+        'notes': 'DESCRIPTION',
+        'note': 'DESCRIPTION',
+        'categories': 'CATEGORIES',
+        'category': 'CATEGORIES',
+        'cats': 'CATEGORIES',
+        'cat': 'CATEGORIES',
+        }
+
     @classmethod
     def search(cls, txt:str) -> list:
-        # Searches through entries for text string 'txt'.
-        # !! Simple version - need to add options
-        ret_list = []
-        txt_n = txt.casefold() # !! also need to remove accents !!
-        # Non-repeating entries
-        cls._update_entry_norep_list()
-        for ev in cls._entry_norep_list_sorted: # type:ignore[union-attr]
-            if 'SUMMARY' in ev and txt_n in ev['SUMMARY'].casefold():
-                ret_list.append(ev)
-        # Repeating entries
-        cls._update_entry_rep_list()
-        for ev in cls._entry_rep_list: # type:ignore[union-attr]
-            if 'SUMMARY' in ev and txt_n in ev['SUMMARY'].casefold():
-                ret_list.append(ev)
-        # Todo entries
-        cls._update_todo_list()
-        for td in cls._todo_list: # type:ignore[union-attr]
-            if 'SUMMARY' in td and txt_n in td['SUMMARY'].casefold():
-                ret_list.append(td)
+        # Searches through entries for text in query string 'txt'.
+        # Returns entries matching all words in txt (case & accent
+        # insensitive), where words can be the start of words in entry
+        # Summary, Location, Description or Categories. A word can be
+        # restricted to a field with a prefix, e.g. 'loc:office'.
+        # Results are events in date order, followed by todos.
+        terms = [] # type:List[Tuple[str,Optional[Tuple[str]]]]
+        for word in txt.split():
+            flds = None # type:Optional[Tuple[str]]
+            if ':' in word:
+                f,w = word.split(':',1)
+                if f.lower() in cls.SEARCH_FIELDS:
+                    flds = (cls.SEARCH_FIELDS[f.lower()],)
+                    word = w
+            terms.extend([(t,flds) for t in text_tokens(word)])
+        if not terms:
+            return []
+        while cls.search_index_build_step(None):
+            pass # build index if not done yet
+        ret_list = cls._search_index.search(terms) # type:list # type:ignore[union-attr]
+        ret_list.sort(key=cls._search_result_sort_key)
         return ret_list
 
 
+    @staticmethod
+    def _search_result_sort_key(en:Union[iEvent,iTodo]) -> Tuple[int,int]:
+        # Sort key for search results: events by date, then todos.
+        # (Sort is stable, so todos remain in calendar order.)
+        if isinstance(en, iTodo):
+            return (1,0)
+        return (0, entry_sort_key(en) if 'DTSTART' in en else 0)
+
+
+    @classmethod
+    def search_index_build_step(cls, max_entries:Optional[int]=2000) -> bool:
+        # Build the search index incrementally, by adding up to
+        # max_entries entries (None -> all remaining entries).
+        # Return True if there are more entries to add, so can be used
+        # as a GLib idle callback, to build index while app is idle.
+        # (Otherwise it's built when the first search is done.)
+        # Not built in steps if a calendar is lazily loaded, since
+        # indexing would parse all its entries.
+        if max_entries is not None and any(conn.lazy_loaded for conn in cls.calConnectors):
+            return False
+        if cls._search_index is None:
+            cls._search_index = TextIndex()
+            ens = [] # type:list
+            for conn in cls.calConnectors:
+                if conn.stores_events():
+                    ens.extend(conn.cal.walk('VEVENT'))
+                if conn.stores_todos():
+                    ens.extend(conn.cal.walk('VTODO'))
+            cls._search_index_pending = iter(ens)
+        elif cls._search_index_pending is None:
+            return False # Already complete
+        cnt = 0
+        for en in cls._search_index_pending: # type:ignore[union-attr]
+            cls._search_index.add(en, cls._entry_search_texts(en))
+            cnt += 1
+            if max_entries is not None and cnt >= max_entries:
+                return True
+        cls._search_index_pending = None
+        return False
+
+
+    @classmethod
+    def _search_index_changed(cls, en:Union[iEvent,iTodo], new_en:Union[iEvent,iTodo,None]) -> None:
+        # Update search index after en has changed (to new_en).
+        # new_en==None means en has been deleted.
+        if cls._search_index_pending is not None:
+            # Index is partly built, so simplest to start again later
+            cls._search_index = None
+            cls._search_index_pending = None
+        elif cls._search_index is not None:
+            cls._search_index.discard(en)
+            if new_en is not None:
+                cls._search_index.add(new_en, cls._entry_search_texts(new_en))
+
+
+    @staticmethod
+    def _entry_search_texts(en:Union[iEvent,iTodo]) -> dict:
+        # Return dict of searchable text fields of entry en
+        texts = {}
+        for fld in ('SUMMARY','LOCATION','DESCRIPTION'):
+            if fld in en:
+                v = en[fld]
+                texts[fld] = ' '.join(v) if isinstance(v,list) else str(v)
+        if 'CATEGORIES' in en:
+            # If entry has multiple CATEGORIES lines, will be a list
+            catgs = en['CATEGORIES']
+            cats = [] # type:List[str]
+            for c in (catgs if isinstance(catgs,list) else (catgs,)):
+                if isinstance(c,str):
+                    cats.append(c)
+                else:
+                    cats.extend(c.cats)
+            texts['CATEGORIES'] = ' '.join(cats)
+        return texts
+
+
     @staticmethod
     def caldatetime_tree_to_dt_list(ed) -> list:
         # Utility function to map a "tree" of dates (arg `ed`)
@@ -1139,16 +1675,101 @@ class CalendarConnectorICalFile(CalendarConnector):
     BACKUP_PERIOD = 90 # seconds
     BACKUP_EXT = 'bak'
     NEWFILE_EXT = 'new'
-
-    def __init__(self, filename:Path, flags:int):
+    JOURNAL_EXT = 'journal'
+    SNAPSHOT_MIN_SIZE = 256*1024 # bytes; smaller files are quick to parse
+    LAZY_MIN_SIZE = 256*1024 # bytes; smaller files are parsed on loading
+    COMPRESSION_TYPES = ('gzip', 'zstd', 'none')
+    COMPRESSION_EXTS = {'.gz':'gzip', '.zst':'zstd'}
+    GZIP_MAGIC = b'\x1f\x8b'
+    ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+    GZIP_LEVEL = 6
+    ZSTD_LEVEL = 3
+    READ_CHUNK = 1024*1024 # bytes; compressed files are decoded in chunks
+    JOURNAL_MAX_SIZE = 1024*1024 # bytes; compact journal when larger
+    JOURNAL_MAX_AGE = 600 # seconds; compact journal when older
+    SAVE_DELAY = 0.5 # seconds; changes in this time are saved together
+    SAVE_RETRY = 2 # seconds; if background save interrupted by a change
+    JOURNAL_COMPONENT = 'X-PYGENDA-JOURNAL'
+    JOURNAL_RECORD_END = b'\r\nEND:X-PYGENDA-JOURNAL\r\n'
+
+    def __init__(self, filename:Path, flags:int, use_snapshot:bool=False, use_journal:bool=False, journal_max_size:Optional[int]=None, journal_max_age:Optional[int]=None, save_delay:Optional[float]=None, use_lazy:bool=False, compression:Optional[str]=None):
         self._filename = filename
         self.flags = flags
+        self._snapshot_key = None # type:Optional[tuple] # set if snapshot needs saving
+        self._snapshot_norep = None # type:Optional[dict]
+        self._save_count = 0 # So we know if data changes while snapshotting
+        self._snapshot_thread = None # type:Optional[Thread]
+        # Journal: if enabled, changes are appended to a "journal" file
+        # next to the iCal file, rather than re-writing the whole file.
+        # The journal is compacted into the iCal file later.
+        self._journal_filename = Path('.'.join((str(filename),self.JOURNAL_EXT)))
+        self._use_journal = use_journal
+        self._journal_max_size = self.JOURNAL_MAX_SIZE if journal_max_size is None else journal_max_size
+        self._journal_max_age = self.JOURNAL_MAX_AGE if journal_max_age is None else journal_max_age
+        self._journal_keys = None # type:Optional[Dict[Tuple[str,str],Any]]
+        self._journal_lock = Lock() # Held while writing files
+        # Saving: changes are written to file in a background thread,
+        # after a short delay, so several changes can be saved together.
+        self._save_delay = self.SAVE_DELAY if save_delay is None else save_delay
+        self._save_lock = Lock() # Held while accessing scheduling data
+        self._save_timer = None # type:Optional[Timer]
+        self._save_due = 0.0 # time_monotonic() when timer will fire
+        self._save_requested = 0 # _save_count when last save requested
+        self._save_requested_time = 0.0 # time of first unsaved request
+        self._save_written = 0 # _save_count of data last written to file
+        self._closed = False
+        self._mmap = None # type:Optional[mmap]
+        if compression is None:
+            # Not specified, so use extension (or format of existing file)
+            compression = self.COMPRESSION_EXTS.get(filename.suffix.lower())
         if filename.exists():
             # We want to read all entries here, even ones we can't handle
             # (e.g. journal entries), so that when the iCal data is written
             # back to the file nothing is lost.
+            cal = None
+            data = None # type:Optional[bytes]
             with filename.open('rb') as file:
-                self.cal = iCalendar.from_ical(file.read())
+                file_compression = self._detect_compression(file)
+                if file_compression is not None:
+                    data = self._read_compressed(file, file_compression)
+                elif use_lazy and filename.stat().st_size >= self.LAZY_MIN_SIZE:
+                    # Large file, so map it into memory and only parse
+                    # events when they're needed (e.g. displayed). The file
+                    # is not changed in place (saving writes a new file),
+                    # so mapped data stays valid.
+                    self._mmap = mmap(file.fileno(), 0, access=ACCESS_READ)
+            if compression is None:
+                compression = file_compression # keep format of file
+            if self._mmap is not None:
+                cal = lazy_load_ical(self._mmap)
+                if cal is None:
+                    self._mmap.close()
+                    self._mmap = None
+            elif use_lazy and data is not None and len(data) >= self.LAZY_MIN_SIZE:
+                # Compressed, so can't be mapped; scan decompressed data
+                cal = lazy_load_ical(data)
+            if cal is not None:
+                self.cal = cal
+                self.lazy_loaded = True
+            else:
+                if data is None:
+                    with filename.open('rb') as file:
+                        data = file.read()
+                snap = None
+                if use_snapshot and len(data) >= self.SNAPSHOT_MIN_SIZE:
+                    # Large file, so try to use snapshot of parsed data
+                    # (Key includes entry types, since only these are tz-fixed)
+                    key = snapshot_key(filename, data) + (flags&CalendarConnector.TYPE_ALL,)
+                    snap = load_snapshot(filename, key)
+                    if snap is None:
+                        self._snapshot_key = key # so snapshot is re-created
+                if snap is not None:
+                    self.cal = snap['cal']
+                    self._snapshot_norep = snap['norep']
+                    self.tz_fixed = True # timezones were fixed before snapshot
+                else:
+                    self.cal = iCalendar.from_ical(data)
+                del(data)
             if filename.stat().st_mode & stat.S_IWUSR == 0:
                 # File is readonly, set flags so this is respected
                 self.flags |= CalendarConnector.READONLY
@@ -1159,12 +1780,163 @@ class CalendarConnectorICalFile(CalendarConnector):
             # These aren't added automatically and spec requires them:
             self.cal.add('PRODID', '-//Semiprime//Pygenda//EN')
             self.cal.add('VERSION', '2.0')
+        self._compression = None if compression == 'none' else compression
+        if self._compression == 'zstd' and zstandard is None and not self.is_readonly():
+            raise ValueError('Saving zstd-compressed iCal file requires zstandard module')
         self._backup_saved_time = float('-inf') # so first change creates backup
         self.uid = ':'.join(('icalfile',str(filename)))
+        if self._journal_filename.exists():
+            # Always replay journal (even if journal not enabled now)
+            # or changes would be lost.
+            self._replay_journal()
+
+
+    def init_complete(self) -> None:
+        # Called by Calendar after it has set up entries.
+        # If the snapshot needs to be (re)built, do it in the background.
+        if self._snapshot_key is not None:
+            self._snapshot_thread = Thread(target=self._write_snapshot, args=(self._snapshot_key,self._save_count), daemon=True)
+            self._snapshot_thread.start()
+            self._snapshot_key = None
+        if self._journal_filename.exists() and not self.is_readonly():
+            if self._use_journal:
+                self._check_journal()
+            else:
+                # Journal no longer enabled, so save changes to file now
+                self._save_file()
+
+
+    def _write_snapshot(self, key:tuple, save_count:int) -> None:
+        # Write snapshot of calendar data, so it's quicker to load.
+        # Runs in background thread. If calendar is changed while we're
+        # working then the snapshot is not saved - it would be out of
+        # date anyway, because the file will be re-written.
+        try:
+            norep = {
+                'VEVENT': [e for e in self.cal.walk('VEVENT') if Calendar._event_belongs_in_norep_list(e)],
+                'VTODO': [t for t in self.cal.walk('VTODO') if Calendar._todo_belongs_in_norep_list(t)],
+                }
+            norep['VEVENT'].sort(key=entry_sort_key)
+            norep['VTODO'].sort(key=entry_sort_key)
+            content = pickle.dumps({'cal':self.cal, 'norep':norep}, protocol=pickle.HIGHEST_PROTOCOL)
+            with Calendar._edit_lock: # So no entry is part-way through a change
+                unchanged = save_count == self._save_count
+            if unchanged:
+                save_snapshot(self._filename, key, content)
+        except Exception as excep:
+            # E.g. calendar was modified during pickling. Not fatal.
+            print('Warning: Failed saving calendar snapshot ({:s})'.format(str(excep)), file=stderr)
+
+
+    def presorted_norep_list(self) -> Optional[list]:
+        # Return sorted list of non-repeating entries, if loaded from
+        # snapshot and calendar not changed since loading.
+        if self._snapshot_norep is None:
+            return None
+        ret = []
+        if self.stores_events():
+            ret.extend(self._snapshot_norep['VEVENT'])
+        if self.stores_todos():
+            ret.extend(self._snapshot_norep['VTODO'])
+        return ret
 
 
     def _save_file(self) -> None:
-        # Save file to disk/storage. Called after any entry updated.
+        # Save file to disk/storage. Called after any entry updated
+        # (unless change can be saved in journal).
+        # Unless save delay is zero, the file is written later, in the
+        # background, so the UI is not held up and a burst of changes
+        # results in a single write.
+        self._save_count += 1
+        self._snapshot_norep = None # Data changed, so no longer valid
+        with self._save_lock:
+            if self._save_requested == self._save_written:
+                self._save_requested_time = time_monotonic()
+            self._save_requested = self._save_count
+        if self._save_delay <= 0 or self._closed:
+            self._save_now()
+        else:
+            self._schedule_save(self._save_delay)
+
+
+    def _save_now(self) -> None:
+        # Write file synchronously, including any changes in journal.
+        save_count = self._save_count
+        with self._journal_lock:
+            self._write_file(self._to_ical())
+            self._remove_journal()
+            self._saved(save_count)
+
+
+    def _saved(self, save_count:int) -> None:
+        # Record that calendar data at save_count has been written to file.
+        # Called with _journal_lock held.
+        with self._save_lock:
+            if self._save_requested > self._save_written:
+                self.save_latency = time_monotonic() - self._save_requested_time
+            self._save_written = save_count
+            if self._save_requested > save_count:
+                # Later changes still to be saved
+                self._save_requested_time = time_monotonic()
+
+
+    def save_pending(self) -> bool:
+        # Return True if there are changes not yet written to file.
+        # (Changes in journal are not pending - they're already stored.)
+        return self._save_requested > self._save_written
+
+
+    def _schedule_save(self, delay:float) -> None:
+        # Arrange for calendar file to be written in background after
+        # delay seconds (or sooner, if a save is already due sooner).
+        with self._save_lock:
+            if self._closed:
+                return
+            due = time_monotonic() + delay
+            if self._save_timer is not None:
+                if self._save_due <= due:
+                    return
+                self._save_timer.cancel()
+            self._save_due = due
+            self._save_timer = Timer(delay, self._background_save)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+
+    def _background_save(self) -> None:
+        # Write calendar data to file (and delete journal, if any).
+        # Runs in timer thread. Data is serialised without a lock, so the
+        # UI isn't blocked. Afterwards, _save_count is checked with
+        # Calendar._edit_lock held: any change that overlapped the
+        # serialisation has then been completed, so has changed the
+        # count. If so, the data is not written and the save is tried
+        # again later.
+        with self._save_lock:
+            self._save_timer = None
+            if self._closed:
+                return
+        save_count = self._save_count
+        try:
+            data = self._to_ical()
+        except Exception:
+            data = None # E.g. calendar modified during serialisation
+        with Calendar._edit_lock:
+            if save_count != self._save_count:
+                data = None
+        with self._journal_lock:
+            if data is not None and save_count == self._save_count:
+                try:
+                    self._write_file(data)
+                    self._remove_journal()
+                    self._saved(save_count)
+                    return
+                except OSError as excep:
+                    print('Warning: Failed saving calendar file ({:s})'.format(str(excep)), file=stderr)
+        self._schedule_save(self.SAVE_RETRY)
+
+
+    def _write_file(self, data:bytes) -> None:
+        # Write data to calendar file.
         # Implementation tries to minimise possibility/extent of data loss.
         file_exists = False
         try:
@@ -1183,7 +1955,9 @@ class CalendarConnectorICalFile(CalendarConnector):
         with tempfile.NamedTemporaryFile(mode='wb', prefix=tfpre, dir=str(tfdir), delete=False) as tf:
             temp_filename = Path(tf.name)
             temp_filename.chmod(mode)
-            tf.write(self.cal.to_ical())
+            self._write_data(tf, data)
+            tf.flush()
+            fsync(tf.fileno()) # So data is on disk before rename
 
         # Possibly make a backup of original file before overwriting
         if file_exists and time_monotonic() - self._backup_saved_time > self.BACKUP_PERIOD:
@@ -1193,24 +1967,281 @@ class CalendarConnectorICalFile(CalendarConnector):
         temp_filename.rename(self._filename)
 
 
+    def _detect_compression(self, file:Any) -> Optional[str]:
+        # Return compression type of file (open in binary mode), from
+        # its first bytes; None if not compressed. File position is reset.
+        magic = file.read(len(self.ZSTD_MAGIC))
+        file.seek(0)
+        if magic.startswith(self.GZIP_MAGIC):
+            return 'gzip'
+        if magic == self.ZSTD_MAGIC:
+            return 'zstd'
+        return None
+
+
+    def _read_compressed(self, file:Any, compression:str) -> bytes:
+        # Return decompressed contents of file (open in binary mode).
+        # Data is decoded in chunks as it is read from the file, so the
+        # compressed data is never all in memory.
+        if compression == 'gzip':
+            stream = gzip.GzipFile(fileobj=file, mode='rb')
+        elif zstandard is None:
+            raise ValueError('Loading zstd-compressed iCal file requires zstandard module')
+        else:
+            stream = zstandard.ZstdDecompressor().stream_reader(file)
+        chunks = []
+        with stream:
+            chunk = stream.read(self.READ_CHUNK)
+            while chunk:
+                chunks.append(chunk)
+                chunk = stream.read(self.READ_CHUNK)
+        return b''.join(chunks)
+
+
+    def _write_data(self, file:Any, data:bytes) -> None:
+        # Write calendar data to file (open in binary mode), compressed
+        # if calendar is saved compressed.
+        if self._compression == 'gzip':
+            # Empty filename & zero mtime, so output only depends on data
+            with gzip.GzipFile(filename='', mode='wb', compresslevel=self.GZIP_LEVEL, fileobj=file, mtime=0) as gz:
+                gz.write(data)
+        elif self._compression == 'zstd':
+            file.write(zstandard.ZstdCompressor(level=self.ZSTD_LEVEL).compress(data))
+        else:
+            file.write(data)
+
+
+    def _to_ical(self) -> bytes:
+        # Return calendar data as bytes, identical to self.cal.to_ical().
+        # The serialised data for each component is cached in the
+        # component, so only components changed since they were last
+        # saved need to be re-serialised. Can be called from background
+        # thread, so only caches data if calendar was not changed.
+        save_count = self._save_count
+        shell = type(self.cal)()
+        shell.name = self.cal.name
+        shell.update(self.cal) # Properties but not subcomponents
+        data = shell.to_ical()
+        tail = b''.join((b'END:',shell.name.encode(),b'\r\n'))
+        if not data.endswith(tail):
+            return self.cal.to_ical() # type:ignore[no-any-return]
+        parts = [data[:-len(tail)]]
+        new_cache = []
+        for c in list(self.cal.subcomponents):
+            try:
+                b = c._ical_cache
+            except AttributeError:
+                b = c.to_ical()
+                new_cache.append((c,b))
+            parts.append(b)
+        parts.append(tail)
+        with self._save_lock:
+            if save_count == self._save_count:
+                for c,b in new_cache:
+                    c._ical_cache = b
+        return b''.join(parts)
+
+
+    @staticmethod
+    def _clear_ical_cache(entry:iComponent) -> None:
+        # Clear cached serialised data for entry, e.g. when it changes
+        try:
+            del(entry._ical_cache)
+        except AttributeError:
+            pass
+
+
+    @staticmethod
+    def _entry_key(entry:iComponent) -> Optional[Tuple[str,str]]:
+        # Return key identifying entry in journal: (UID, RECURRENCE-ID),
+        # or None if entry has no UID (so can't be saved in journal).
+        if 'UID' not in entry:
+            return None
+        rid = entry['RECURRENCE-ID'].to_ical().decode() if 'RECURRENCE-ID' in entry else ''
+        return str(entry['UID']), rid
+
+
+    def _get_journal_keys(self) -> Dict[Tuple[str,str],Any]:
+        # Return dictionary mapping keys to components of the calendar.
+        # Keys that are used by more than one component map to None, so
+        # changes to these components are saved by re-writing the file.
+        if self._journal_keys is None:
+            self._journal_keys = {}
+            for c in self.cal.subcomponents:
+                k = self._entry_key(c)
+                if k is not None:
+                    self._journal_keys[k] = None if k in self._journal_keys else c
+        return self._journal_keys
+
+
+    def _save_change(self, entry:Union[iEvent,iTodo], is_new:bool=False, is_deleted:bool=False) -> None:
+        # Save change to entry (already made to calendar data).
+        # If journal is enabled and entry can be identified uniquely by
+        # its key, the change is appended to the journal. Otherwise the
+        # whole calendar file is saved.
+        with self._save_lock:
+            # Count change & mark entry as needing re-serialising together,
+            # so a background save can't cache pre-change data for entry.
+            self._save_count += 1
+            self._clear_ical_cache(entry)
+        if self._use_journal:
+            keys = self._get_journal_keys()
+            key = self._entry_key(entry)
+            if key is not None and ((is_new and key not in keys) or (not is_new and keys.get(key) is entry)):
+                if is_deleted:
+                    del(keys[key])
+                else:
+                    keys[key] = entry
+                self._snapshot_norep = None # Data changed, so no longer valid
+                self._append_journal(key, None if is_deleted else entry)
+                self._check_journal()
+                return
+        self._journal_keys = None # Re-build when next needed
+        self._save_file()
+
+
+    def _append_journal(self, key:Tuple[str,str], entry:Optional[Union[iEvent,iTodo]]) -> None:
+        # Append record to journal file: entry with given key is replaced
+        # by entry (i.e. it's added/updated), or deleted if entry is None.
+        # File is synced after writing, so the change can't be lost.
+        rec = iComponent()
+        rec.name = self.JOURNAL_COMPONENT
+        rec.add('X-PYGENDA-OP', 'PUT' if entry is not None else 'DELETE')
+        rec.add('X-PYGENDA-UID', key[0])
+        if key[1]:
+            rec.add('X-PYGENDA-RECURRENCE-ID', key[1])
+        if entry is not None:
+            rec.add_component(entry)
+        data = rec.to_ical()
+        with self._journal_lock:
+            is_new = not self._journal_filename.exists()
+            with self._journal_filename.open('ab') as jf:
+                jf.write(data)
+                jf.flush()
+                fsync(jf.fileno())
+            if is_new:
+                # Sync directory too, so new journal file is not lost
+                self._sync_dir()
+
+
+    def _sync_dir(self) -> None:
+        # Sync directory containing calendar file, so file creation
+        # is written to disk. Not possible on all platforms.
+        try:
+            fd = os_open(str(self._filename.parent), O_RDONLY)
+            try:
+                fsync(fd)
+            finally:
+                os_close(fd)
+        except OSError:
+            pass
+
+
+    def _remove_journal(self) -> None:
+        # Delete journal, after its changes have been saved to file.
+        # Called with _journal_lock held.
+        try:
+            self._journal_filename.unlink()
+        except FileNotFoundError:
+            pass
+
+
+    def _replay_journal(self) -> None:
+        # Apply changes in journal file to calendar data, after loading.
+        # Each record replaces/deletes entries with a given key, so
+        # replaying gives the same result even if the changes are
+        # already in the file (e.g. crash while compacting journal).
+        with self._journal_filename.open('rb') as jf:
+            data = jf.read()
+        records = []
+        pos = 0
+        while True:
+            end = data.find(self.JOURNAL_RECORD_END, pos)
+            if end < 0:
+                break
+            end += len(self.JOURNAL_RECORD_END)
+            records.append(data[pos:end])
+            pos = end
+        if pos < len(data):
+            # Incomplete record (e.g. crash while writing). It was not
+            # synced, so change was not completed - remove it.
+            print('Warning: Ignoring incomplete record at end of journal {:s}'.format(str(self._journal_filename)), file=stderr)
+            if not self.is_readonly():
+                with self._journal_filename.open('r+b') as jf:
+                    jf.truncate(pos)
+                    fsync(jf.fileno())
+        if not records:
+            return
+        index = {} # type:Dict[Tuple[str,str],List[iComponent]]
+        for c in self.cal.subcomponents:
+            k = self._entry_key(c)
+            if k is not None:
+                index.setdefault(k,[]).append(c)
+        for r in records:
+            try:
+                rec = iComponent.from_ical(r)
+                key = (str(rec['X-PYGENDA-UID']), str(rec.get('X-PYGENDA-RECURRENCE-ID','')))
+                is_put = str(rec['X-PYGENDA-OP'])=='PUT'
+            except (ValueError, KeyError) as excep:
+                print('Warning: Ignoring bad record in journal {:s} ({:s})'.format(str(self._journal_filename), str(excep)), file=stderr)
+                continue
+            for c in index.pop(key, []):
+                self.cal.subcomponents.remove(c)
+            if is_put and rec.subcomponents:
+                entry = rec.subcomponents[0]
+                self.cal.add_component(entry)
+                index[key] = [entry]
+        # Replayed data is not as in file/snapshot
+        for c in self.cal.subcomponents:
+            self._clear_ical_cache(c) # In case changed by fixing tz
+        self._snapshot_key = None
+        self._snapshot_norep = None
+        self.tz_fixed = False
+
+
+    def _check_journal(self) -> None:
+        # Called after journal written. If journal is big, start compacting
+        # it into the calendar file. Otherwise make sure it will be
+        # compacted before it gets too old.
+        try:
+            size = self._journal_filename.stat().st_size
+        except FileNotFoundError:
+            return
+        self._schedule_save(0 if size > self._journal_max_size else self._journal_max_age)
+
+
+    def close(self) -> None:
+        # Called on clean exit. Write pending changes, including journal,
+        # to calendar file.
+        with self._save_lock:
+            self._closed = True
+            timer = self._save_timer
+            self._save_timer = None
+        if timer is not None:
+            timer.cancel()
+            timer.join() # In case save already in progress
+        if (self.save_pending() or self._journal_filename.exists()) and not self.is_readonly():
+            self._save_now()
+
+
     def add_entry(self, entry:Union[iEvent,iTodo]) -> Union[iEvent,iTodo]:
         # Add a new entry component to the file data and write file.
         self.cal.add_component(entry)
-        self._save_file()
+        self._save_change(entry, is_new=True)
         return entry
 
 
     def update_entry(self, entry:Union[iEvent,iTodo]) -> None:
         # Update an entry component in the calendar data and store it.
         # Entry is a component of the file data, so it's already updated.
-        # We just need to write the file data.
-        self._save_file()
+        # We just need to write the file data (or journal).
+        self._save_change(entry)
 
 
     def delete_entry(self, entry:Union[iEvent,iTodo]) -> None:
         # Delete entry component to the file data and write file.
         self.cal.subcomponents.remove(entry)
-        self._save_file()
+        self._save_change(entry, is_deleted=True)
 
 
 #
@@ -1423,21 +2454,286 @@ class CalendarConnectorEvolution(CalendarConnector):
         self.cal.subcomponents.remove(entry) # delete local copy
 
 
+#
+# Compiled repeat rule for an entry, used by repeat functions (below)
+#
+class RepeatPlan:
+    # Parts of an entry's repeat calculation that don't depend on the
+    # range requested, so they only need to be worked out once: which
+    # method to use (RepeatInfo iterators, or dateutil rrule fallback),
+    # RepeatInfo's delta/until/count etc., and a dateutil rrule object
+    # (built when first needed).
+    # Plans are cached in entries (see repeat_plan()), and compiled again
+    # if entry's DTSTART/RRULE/EXDATE/RDATE or the local timezone change.
+    FAST = 0 # Use RepeatInfo iterators
+    FALLBACK = 1 # RepeatInfo unsupported, use dateutil rrule
+    IMPOSSIBLE = 2 # Repeat has no occurrences
+    INVALID = 3 # Bad repeat data
+
+    # Default values (plans are not pickled, see __getstate__())
+    kind = INVALID
+    error = None # type:Optional[Exception]
+    rinfo = None # type:Optional[RepeatInfo]
+    dtstart_prop = None # type:Any
+    rrule_prop = None # type:Any
+    exdate_prop = None # type:Any
+    rdate_prop = None # type:Any
+    tz = None # type:Any
+    _rr = None # type:Optional[Tuple[rruleobj,bool,bool]]
+    _rr_near = None # type:Optional[Tuple[int,rruleobj]]
+    _rr_dtstart = None # type:Optional[dt_datetime]
+    _exdate_list = None # type:Optional[list]
+    _rdate_list = None # type:Optional[list]
+    _count_bound = None # type:Optional[Tuple[Optional[dt_date]]]
+    _ex_points = None # type:Optional[ExclusionIndex]
+    _ex_days = None # type:Optional[ExclusionIndex]
+
+    # When skipping runs of excluded occurrences, how many exclusions to
+    # look ahead/back (so work is bounded if there are lots).
+    EXCLUSION_SKIP = 32
+    _EPOCH = dt_datetime(1970,1,1,tzinfo=timezone.utc)
+
+    def __init__(self, en:iEvent):
+        # Compile plan for repeating entry en
+        self.dtstart_prop = en['DTSTART']
+        self.rrule_prop = en['RRULE']
+        self.exdate_prop = en.get('EXDATE')
+        self.rdate_prop = en.get('RDATE')
+        self.tz = get_local_tz()
+        rinfo = RepeatInfo.__new__(RepeatInfo)
+        # Note: rinfo kept even if compile fails (see RepeatInfo._compile())
+        self.rinfo = rinfo
+        try:
+            rinfo._compile(en)
+            self.kind = self.FAST
+        except RepeatUnsupportedError as err:
+            # RepeatInfo doesn't handle this type of repeat.
+            # Fall back to using rrule - more complete, but slower for simple repeats
+            print('Notice: Fallback to unoptimised repeat for "{:s}" ({:s})'.format(en['SUMMARY'],str(err)), file=stderr)
+            self.kind = self.FALLBACK
+            self.error = err
+        except RepeatImpossibleError as err:
+            self.kind = self.IMPOSSIBLE
+            self.error = err
+        except ValueError as err:
+            self.kind = self.INVALID
+            self.error = err
+
+
+    def __getstate__(self) -> dict:
+        # Don't save plans when entries are pickled (e.g. in snapshots),
+        # they depend on local timezone so might not be valid when loaded.
+        return {}
+
+
+    def is_current(self, en:iEvent) -> bool:
+        # Return True if plan is up to date for entry en
+        return (self.rrule_prop is en['RRULE']
+            and self.dtstart_prop is en['DTSTART']
+            and self.exdate_prop is en.get('EXDATE')
+            and self.rdate_prop is en.get('RDATE')
+            and self.tz is get_local_tz())
+
+
+    def check(self) -> None:
+        # Raise exception if repeat can't be calculated by RepeatInfo
+        if self.error is not None:
+            raise self.error.with_traceback(None)
+
+
+    def rrule(self, en:iEvent) -> Tuple[rruleobj, bool, bool]:
+        # Return rrule object etc. for entry en, as _rrule_from_entry()
+        if self._rr is None:
+            self._rr = _rrule_from_entry(en)
+        return self._rr # type:ignore[return-value]
+
+
+    def rrule_near(self, en:iEvent, near:dt_datetime) -> rruleobj:
+        # Return rrule object for entry en, as rrule(), but starting a
+        # whole number of repeat periods before datetime 'near', so that
+        # dateutil doesn't step through all occurrences from DTSTART.
+        # Occurrences well before 'near' may be missing.
+        # Cached by number of periods moved, so nearby values of 'near'
+        # (e.g. when moving through days) use the same rrule object.
+        if self._rr_dtstart is None:
+            self._rr_dtstart = _rrule_dtstart(en)[0]
+        k = _seek_periods(en['RRULE'], self._rr_dtstart, near)
+        if self._rr_near is None or self._rr_near[0]!=k:
+            rr = _rrule_from_entry(en, k) if k>0 else None
+            self._rr_near = (k, self.rrule(en)[0] if rr is None else rr[0])
+        return self._rr_near[1]
+
+
+    def exdate_list(self, en:iEvent) -> list:
+        # Return list of excluded dates/datetimes for entry en
+        if self._exdate_list is None:
+            self._exdate_list = Calendar.caldatetime_tree_to_dt_list(en['EXDATE']) if 'EXDATE' in en else []
+        return self._exdate_list
+
+
+    def rdate_list(self, en:iEvent) -> list:
+        # Return sorted list of extra datetimes (from RDATE) for entry en
+        if self._rdate_list is None:
+            self._rdate_list = repeat_rdates(en, True)
+        return self._rdate_list
+
+
+    def count_bound(self, en:iEvent) -> Optional[dt_date]:
+        # Return last occurrence of repeat with RRULE COUNT (ignoring
+        # exclusions, since excluded occurrences are counted), or None if
+        # there are no occurrences. Calculated once per plan, so windows
+        # don't need to count through occurrences each time.
+        if self._count_bound is None:
+            if self.kind==self.FAST and self.rinfo is not None:
+                last = self.rinfo.last_by_count
+            else:
+                try:
+                    last = self.rrule(en)[0][-1]
+                except IndexError:
+                    last = None # No occurrences
+            self._count_bound = (last,)
+        return self._count_bound[0]
+
+
+    def _build_exclusions(self, en:iEvent) -> None:
+        # Build indexes of excluded datetimes (as UTC epoch times) and
+        # dates (as ordinals), used by is_excluded() etc.
+        exl = self.exdate_list(en)
+        self._ex_points = ExclusionIndex(dt_epoch_us(d) for d in exl if isinstance(d,dt_datetime))
+        self._ex_days = ExclusionIndex(d.toordinal() for d in exl if not isinstance(d,dt_datetime))
+
+
+    def is_excluded(self, en:iEvent, dt:dt_date) -> bool:
+        # Return True if occurrence dt (as returned by rrule object from
+        # rrule()) is excluded by entry's EXDATEs.
+        # Like RepeatInfo.is_exdate(): a date EXDATE also excludes timed
+        # daily/weekly/monthly/yearly occurrences on that date.
+        if self._ex_points is None:
+            self._build_exclusions(en)
+        if not self.rrule(en)[2]:
+            # Not timed; rrule gives naive datetimes at midnight
+            return dt.toordinal() in self._ex_days # type:ignore[operator]
+        if dt_epoch_us(dt) in self._ex_points: # type:ignore[operator]
+            return True
+        return not self.rrule(en)[1] and dt.toordinal() in self._ex_days # type:ignore[operator]
+
+
+    def exclusion_bound(self, en:iEvent, dt:dt_date, forward:bool) -> Optional[dt_date]:
+        # Return limit for skipping over a run of excluded occurrences
+        # after (or before) occurrence dt, i.e. a date/time at or beyond
+        # the next few exclusions. Returns None if no exclusions beyond dt.
+        # Uses binary search, so is quick even with many exclusions.
+        if self._ex_points is None:
+            self._build_exclusions(en)
+        is_hr_min_sec, is_timed = self.rrule(en)[1:]
+        n = self.EXCLUSION_SKIP
+        day = dt.toordinal()
+        o = self._ex_days.bound_after(day, n) if forward else self._ex_days.bound_before(day, n) # type:ignore[union-attr]
+        if not is_timed:
+            return None if o is None else dt_datetime.fromordinal(o)
+        ret = None
+        if o is not None and not is_hr_min_sec:
+            # Add margin since day is in entry's timezone, not UTC
+            ret = dt_datetime.fromordinal(o+2 if forward else o-1).replace(tzinfo=timezone.utc)
+        k = dt_epoch_us(dt)
+        k = self._ex_points.bound_after(k, n) if forward else self._ex_points.bound_before(k, n) # type:ignore[union-attr]
+        if k is not None:
+            k_dt = self._EPOCH + timedelta(microseconds=k)
+            if ret is None or (k_dt>ret if forward else k_dt<ret):
+                ret = k_dt
+        return ret
+
+
+def repeat_plan(en:iEvent) -> RepeatPlan:
+    # Return compiled RepeatPlan for repeating entry en.
+    # Plan is cached in the entry, so only compiled when entry changes.
+    try:
+        plan = en._repeat_plan
+        if plan.is_current(en):
+            return plan # type:ignore[no-any-return]
+    except AttributeError:
+        pass
+    plan = RepeatPlan(en)
+    en._repeat_plan = plan
+    return plan
+
+
 #
 # Helper class for repeats_in_range() function (below)
 #
 class RepeatInfo:
     DAY_ABBR = ('MO','TU','WE','TH','FR','SA','SU')
     SUBDAY_REPEATS = ('HOURLY','MINUTELY','SECONDLY')
+    DENSE_DELTA = timedelta(hours=12) # Less than shortest day, with margin
 
     _isby_weekday_in_month = False
+    _isby_period_set = False
+    resolve_gaps = False
+    exdates = None # type:Optional[Set]
+    rdates = [] # type:List[dt_date]
     start_in_rng = None # type: dt_date
 
+    # Set by _compile() (defaults used if it stops early)
+    dtstart = None # type:Any
+    start = None # type:Any
+    subday_rpt = False
+    timed_rpt = False
+    until_raw = None # type:Any
+    delta = None # type:Any
+    byday_day = 0
+    byday_idx = 0
+    period_year = False
+    byday_rules = [] # type:List[Tuple[int,int]]
+    byday_days = set() # type:Set[int]
+    bymonthday = [] # type:List[int]
+    byyearday = [] # type:List[int]
+    bysetpos = [] # type:List[int]
+    until = None # type:Optional[dt_date]
+    last_by_count = None # type:Optional[dt_date]
+
     def __init__(self, event:iEvent, start:dt_date, stop:dt_date):
         # Note: start argument is INclusive, stop is EXclusive
+        # Parts that don't depend on start/stop are taken from event's
+        # compiled repeat plan, so the RRULE is only parsed once.
+        plan = repeat_plan(event)
+        if plan.rinfo is not None:
+            self._copy_compiled(plan.rinfo)
+        self._set_range(start, stop, plan)
+
+
+    def _copy_compiled(self, src:'RepeatInfo') -> None:
+        # Copy parts of repeat set by _compile() from src (the RepeatInfo
+        # compiled by a repeat plan).
+        self.dtstart = src.dtstart
+        self.start = src.start
+        self.subday_rpt = src.subday_rpt
+        self.timed_rpt = src.timed_rpt
+        self.until_raw = src.until_raw
+        self.rdates = src.rdates
+        self.resolve_gaps = src.resolve_gaps
+        self.delta = src.delta
+        self._isby_weekday_in_month = src._isby_weekday_in_month
+        self.byday_day = src.byday_day
+        self.byday_idx = src.byday_idx
+        self._isby_period_set = src._isby_period_set
+        self.period_year = src.period_year
+        self.byday_rules = src.byday_rules
+        self.byday_days = src.byday_days
+        self.bymonthday = src.bymonthday
+        self.byyearday = src.byyearday
+        self.bysetpos = src.bysetpos
+        self.exdates = src.exdates
+        self.until = src.until
+        self.last_by_count = src.last_by_count
+
+
+    def _compile(self, event:iEvent) -> None:
+        # Set up parts of repeat that don't depend on range (delta etc.).
+        # Called by RepeatPlan constructor.
+        # Raises RepeatUnsupportedError etc. if repeat can't be handled.
+        # Attributes used to check if ranges are out of bounds are set
+        # first, so these checks can be done even if exception raised.
         e_dtst = event['DTSTART']
-        if 'TZID' in e_dtst.params:
-            raise RepeatUnsupportedError('Unsupported repeat with TZID')
         self.dtstart = e_dtst.dt
         rrule = event['RRULE']
         self.subday_rpt = rrule['FREQ'][0] in self.SUBDAY_REPEATS
@@ -1448,6 +2744,30 @@ class RepeatInfo:
             if self.subday_rpt:
                 # Need to do calculations in UTC (e.g. for summer time changes)
                 self.start = self.start.astimezone(timezone.utc)
+        else:
+            self.start = self.dtstart
+        self.until_raw = rrule['UNTIL'][0] if 'UNTIL' in rrule else None
+        self.rdates = repeat_rdates(event, self.timed_rpt)
+
+        if 'TZID' in e_dtst.params and getattr(self.dtstart,'tzinfo',None) is None:
+            # TZID not recognised (see Calendar._fix_tz()), leave to rrule
+            raise RepeatUnsupportedError('Unsupported repeat with unknown TZID {}'.format(e_dtst.params['TZID']))
+        # Daily/weekly/... repeats are calculated in "wall clock" time
+        # of DTSTART's timezone (which may be given by a TZID), so some
+        # occurrences may fall in a gap when clocks go forward.
+        # If this can happen, these need adjusting on output.
+        self.resolve_gaps = self.timed_rpt and not self.subday_rpt and not isinstance(self.start.tzinfo, (timezone, du_tz.tzutc, du_tz.tzoffset))
+        self._set_freq(rrule)
+        if 'EXDATE' in event:
+            self._set_exdates(event['EXDATE'])
+        self._set_until_count(rrule)
+
+
+    def _set_range(self, start:dt_date, stop:dt_date, plan:RepeatPlan) -> None:
+        # Set up parts of repeat depending on range (start_in_rng etc.)
+        # Raises exception from plan compilation, if there was one,
+        # unless the range is clearly out of bounds.
+        if self.timed_rpt:
             try:
                 start = date_to_datetime(start, True).astimezone(timezone.utc)
             except OverflowError:
@@ -1457,30 +2777,25 @@ class RepeatInfo:
                 else:
                     raise
             stop = date_to_datetime(stop, True).astimezone(timezone.utc)
-        else:
-            self.start = self.dtstart
+        self.rng_start = start
+        self.rng_stop = stop
 
         # Quickly eliminate some out-of-range cases
         if stop is not None and dt_lte(stop, self.start):
             # self.start_in_rng left with default value of None
             return
-        if start is not None and 'UNTIL' in rrule and dt_lt(rrule['UNTIL'][0],start):
+        if start is not None and self.until_raw is not None and dt_lt(self.until_raw,start):
             # self.start_in_rng left with default value of None
             return
 
-        if rrule['FREQ'][0]=='YEARLY' and self.start.month==2 and self.start.day==29 and ('BYMONTH' not in rrule or 'BYDAY' not in rrule):
-            raise RepeatUnsupportedError('Unsupported YEARLY (29/2) {} in RRULE'.format(self.start))
-
-        self._set_freq(rrule)
-        if 'EXDATE' in event:
-            self._set_exdates(event['EXDATE'])
-        else:
-            self.exdates = None # type:Optional[Set]
+        plan.check()
         if self._isby_weekday_in_month:
             self._set_start_in_rng_byweekdayinmonth(start)
+        elif self._isby_period_set:
+            self._set_start_in_rng_periodset(start)
         else:
             self._set_start_in_rng(start)
-        self._set_stop(rrule, stop)
+        self._set_stop(stop)
 
 
     def _set_freq(self, rrule:vRecur) -> None:
@@ -1494,23 +2809,12 @@ class RepeatInfo:
             raise RepeatUnsupportedError('Unsupported multi-BYMONTH {} in RRULE'.format(rrule['BYMONTH']))
         if 'BYDAY' in rrule and freq not in {'YEARLY','MONTHLY','WEEKLY'}:
             raise RepeatUnsupportedError('Unsupported BYDAY for {} repeat'.format(freq))
-        if 'BYYEARDAY' in rrule:
-            raise RepeatUnsupportedError('Unsupported BYYEARDAY in RRULE')
-        if 'BYMONTHDAY' in rrule:
-            if (freq!='YEARLY' or 'BYMONTH' not in rrule):
-                raise RepeatUnsupportedError('Unsupported BYMONTHDAY in RRULE (not YEARLY/BYMONTH)')
-            # If we get here, it's YEARLY/BYMONTH/BYMONTHDAY
-            if len(rrule['BYMONTH'])>1:
-                raise RepeatUnsupportedError('Unsupported BYMONTHDAY, multi-BYMONTH in RRULE')
-            if len(rrule['BYMONTHDAY'])>1:
-                raise RepeatUnsupportedError('Unsupported multi-BYMONTHDAY in RRULE')
-            bmd_day = int(rrule['BYMONTHDAY'][0])
-            bmd_month = int(rrule['BYMONTH'][0])
-            if bmd_day!=self.start.day or bmd_month!=self.start.month:
-                raise RepeatUnsupportedError('Unsupported YEARLY/BYMONTH/BYMONTHDAY != DTSTART in RRULE')
-
-        if 'BYSETPOS' in rrule:
-            raise RepeatUnsupportedError('Unsupported BYSETPOS in RRULE')
+        if 'BYYEARDAY' in rrule and freq!='YEARLY':
+            raise RepeatUnsupportedError('Unsupported BYYEARDAY in RRULE (not YEARLY)')
+        if 'BYMONTHDAY' in rrule and freq not in {'YEARLY','MONTHLY'}:
+            raise RepeatUnsupportedError('Unsupported BYMONTHDAY in RRULE (not YEARLY/MONTHLY)')
+        if 'BYSETPOS' in rrule and freq not in {'YEARLY','MONTHLY'}:
+            raise RepeatUnsupportedError('Unsupported BYSETPOS in RRULE (not YEARLY/MONTHLY)')
         if 'BYHOUR' in rrule:
             raise RepeatUnsupportedError('Unsupported BYHOUR in RRULE')
         if 'BYMINUTE' in rrule:
@@ -1539,25 +2843,57 @@ class RepeatInfo:
 
     def _set_yearly(self, rrule:vRecur, interval:int) -> None:
         # Called on construction if a simple yearly repeat
-        self.delta = relativedelta(years=interval) # type:Any
-        if 'BYDAY' in rrule:
+        self.delta = relativedelta(years=interval)
+        if 'BYYEARDAY' in rrule:
+            if 'BYMONTH' in rrule or 'BYMONTHDAY' in rrule or 'BYDAY' in rrule:
+                raise RepeatUnsupportedError('YEARLY repeat with BYYEARDAY and BYMONTH/BYMONTHDAY/BYDAY')
+            self._set_period_set(rrule, True)
+        elif 'BYDAY' in rrule or 'BYMONTHDAY' in rrule:
             if 'BYMONTH' not in rrule:
-                raise RepeatUnsupportedError('YEARLY repeat with BYDAY without BYMONTH')
+                raise RepeatUnsupportedError('YEARLY repeat with BYDAY/BYMONTHDAY without BYMONTH')
             bymonth = rrule['BYMONTH']
             if len(bymonth)>1:
                 raise RepeatUnsupportedError('YEARLY repeat with multiple BYMONTH values')
             if int(bymonth[0]) != self.dtstart.month:
                 raise RepeatUnsupportedError('YEARLY BYMONTH/BYDAY repeat with month not matching DTSTART')
-            self._set_byweekdayinmonth(rrule['BYDAY'])
+            if 'BYDAY' in rrule or 'BYSETPOS' in rrule or len(rrule['BYMONTHDAY'])>1 or int(rrule['BYMONTHDAY'][0])!=self.start.day or self._is_leapday():
+                self._set_month_rules(rrule)
+            # Otherwise BYMONTHDAY is just day of DTSTART, so simple repeat
+        elif 'BYSETPOS' in rrule:
+            raise RepeatUnsupportedError('Unsupported BYSETPOS without BYDAY/BYMONTHDAY/BYYEARDAY in RRULE')
+        elif self._is_leapday():
+            # Years without 29th Feb are skipped (RFC-5545), so treat
+            # as a set of days (i.e. just the 29th) in the month.
+            self._set_period_set(vRecur(BYMONTHDAY=[29]), False)
+
+
+    def _is_leapday(self) -> bool:
+        # Return True if repeat starts on 29th February
+        return self.start.month==2 and self.start.day==29 # type:ignore[no-any-return]
 
 
     def _set_monthly(self, rrule:vRecur, interval:int) -> None:
         # Called on construction if a simple monthly repeat
         self.delta = relativedelta(months=interval)
-        if 'BYDAY' in rrule:
-            self._set_byweekdayinmonth(rrule['BYDAY'])
+        if 'BYDAY' in rrule or 'BYMONTHDAY' in rrule:
+            self._set_month_rules(rrule)
+        elif 'BYSETPOS' in rrule:
+            raise RepeatUnsupportedError('Unsupported BYSETPOS without BYDAY/BYMONTHDAY in RRULE')
         elif self.start.day>28:
-            raise RepeatUnsupportedError('Unsupported MONTHLY (day>28) {} in RRULE'.format(self.start))
+            # Months without this day are skipped (RFC-5545), so treat
+            # as a set of days (i.e. just this day) in each month.
+            self._set_period_set(vRecur(BYMONTHDAY=[self.start.day]), False)
+
+
+    def _set_month_rules(self, rrule:vRecur) -> None:
+        # Set up BYDAY/BYMONTHDAY/BYSETPOS parts of a MONTHLY repeat
+        # (or YEARLY repeat in a single month).
+        if 'BYMONTHDAY' not in rrule and 'BYSETPOS' not in rrule and len(rrule['BYDAY'])==1:
+            if rrule['BYDAY'][0][:-2] not in ('','5','+5','-5'):
+                # Single rule like "last Sunday", use simpler calculation
+                self._set_byweekdayinmonth(rrule['BYDAY'])
+                return
+        self._set_period_set(rrule, False)
 
 
     def _set_byweekdayinmonth(self, rrule_byday:list) -> None:
@@ -1575,14 +2911,47 @@ class RepeatInfo:
         if abs_byday==0 or abs_byday>5:
             print('Notice: Impossible BYDAY rule: {}'.format(byday_rule), file=stderr)
             raise RepeatImpossibleError()
-        if (abs_byday==5):
-            raise RepeatUnsupportedError('Unsupported BYDAY {} in MONTHLY/YEARLY repeat'.format(byday_rule))
         # Test to see if DTSTART matches RRULE
         if self.firstday_to_byweekdayinmonth(self.dtstart.replace(day=1)) != self.dtstart:
             raise RepeatUnsupportedError('Given start date does not match RRULE')
         self._isby_weekday_in_month = True
 
 
+    def _set_period_set(self, rrule:vRecur, year:bool) -> None:
+        # Set variables for repeats with a set of days in each month
+        # (or year, if year is True, for BYYEARDAY), using BYDAY (all
+        # or nth weekdays in month), BYMONTHDAY, BYYEARDAY & BYSETPOS.
+        # E.g. '2TU,4TU' -> 2nd & 4th Tuesday; 'MO,TU,WE,TH,FR' with
+        # BYSETPOS '-1' -> last weekday of month.
+        self.period_year = year
+        self.byday_rules = []
+        for byday_rule in (rrule['BYDAY'] if 'BYDAY' in rrule else []):
+            try:
+                day = self.DAY_ABBR.index(byday_rule[-2:])
+                idx = int(byday_rule[:-2]) if byday_rule[:-2] else 0
+            except ValueError:
+                raise RepeatUnsupportedError('Unsupported BYDAY {} in MONTHLY/YEARLY repeat'.format(byday_rule))
+            if abs(idx)>5:
+                print('Notice: Impossible BYDAY rule: {}'.format(byday_rule), file=stderr)
+                raise RepeatImpossibleError()
+            self.byday_rules.append((idx,day))
+        self.bymonthday = [int(d) for d in rrule['BYMONTHDAY']] if 'BYMONTHDAY' in rrule else []
+        self.byyearday = [int(d) for d in rrule['BYYEARDAY']] if 'BYYEARDAY' in rrule else []
+        self.bysetpos = [int(p) for p in rrule['BYSETPOS']] if 'BYSETPOS' in rrule else []
+        for (l,mx,nm) in ((self.bymonthday,31,'BYMONTHDAY'), (self.byyearday,366,'BYYEARDAY'), (self.bysetpos,366,'BYSETPOS')):
+            for n in l:
+                if n==0 or abs(n)>mx:
+                    print('Notice: Impossible {:s} rule: {:d}'.format(nm,n), file=stderr)
+                    raise RepeatImpossibleError()
+        if self.bymonthday and any(idx for (idx,day) in self.byday_rules):
+            raise RepeatUnsupportedError('Unsupported BYDAY with index and BYMONTHDAY in RRULE')
+        self.byday_days = set(day for (idx,day) in self.byday_rules)
+        # Test to see if DTSTART matches RRULE
+        if self.start not in self.firstday_to_periodset(self.period_firstday(self.start)):
+            raise RepeatUnsupportedError('Given start date does not match RRULE')
+        self._isby_period_set = True
+
+
     def _set_weekly(self, rrule:vRecur, interval:int) -> None:
         # Called on construction if a weekly repeat.
         # Try to also handle cases where rrule gives multiple days/startweek.
@@ -1704,10 +3073,24 @@ class RepeatInfo:
                 self.start_in_rng += self.delta
 
 
+    def _set_start_in_rng_periodset(self, start:dt_date) -> None:
+        # Set start of month (or year) at/before start of given range,
+        # for repeats with a set of days in each month/year. Days before
+        # 'start' (or before DTSTART) are skipped by the iterator.
+        # N.B. At this point 'start' may be a date or datetime (matching timed_rpt)
+        self.start_in_rng = self.period_firstday(self.start)
+        if start is not None:
+            self._do_initial_jump(self.period_firstday(start))
+
+
     def _do_initial_jump(self, target:dt_date) -> None:
         # Used by _set_start_in_rng_***() functions to initialise repeats.
         # Updates self.start_in_rng to get close to target date/time based on
         # jumps of self.delta (which must be a timedelta or a relativedelta).
+        if isinstance(target, dt_datetime) and target.tzinfo is not None:
+            # Deltas are added in wall clock time of repeat's timezone,
+            # so measure distance in that (or DST changes can overshoot).
+            target = target.astimezone(self.start_in_rng.tzinfo) # type:ignore[attr-defined]
         d = target - self.start_in_rng # type:Any
         if d > timedelta(0): # start provided was after first repeat, so inc
             # Want to do as much as possible in one increment
@@ -1720,7 +3103,41 @@ class RepeatInfo:
             self.start_in_rng += self.delta * s
 
 
-    def _set_stop(self, rrule:vRecur, stop:dt_date) -> None:
+    def _set_until_count(self, rrule:vRecur) -> None:
+        # Set until & last_by_count from UNTIL/COUNT parts of rrule.
+        # These are used by _set_stop(), below.
+        self.until = self.until_raw
+        if self.timed_rpt and self.until:
+            self.until = date_to_datetime(self.until, True).astimezone(timezone.utc)
+        count = rrule['COUNT'][0] if 'COUNT' in rrule else None
+        self.last_by_count = None
+        if count is not None:
+            # N.B. Excluded occurrences are included in count (RFC-5545),
+            # so last_by_count does not depend on EXDATE
+            if self._isby_weekday_in_month:
+                last_by_count = self.start.replace(day=1) + (self.delta*(count-1))
+                last_by_count = self.firstday_to_byweekdayinmonth(last_by_count)
+            elif self._isby_period_set:
+                # Count through days in each month/year (once, on compile)
+                dt = self.period_firstday(self.start)
+                days = [d for d in self.firstday_to_periodset(dt) if not dt_lt(d,self.start)]
+                while len(days)<count:
+                    count -= len(days)
+                    dt += self.delta
+                    days = self.firstday_to_periodset(dt)
+                last_by_count = days[count-1]
+            elif isinstance(self.delta, list):
+                di,md = divmod(count-1, len(self.delta))
+                last_by_count = self.start
+                last_by_count += di*reduce(lambda x,y:x+y,self.delta) # sum()
+                if md:
+                    last_by_count += reduce(lambda x,y:x+y,self.delta[:md])
+            else:
+                last_by_count = self.start + (self.delta*(count-1))
+            self.last_by_count = last_by_count
+
+
+    def _set_stop(self, stop:dt_date) -> None:
         # Set stop date in range (i.e. before 'stop' parameter).
         # Note, 'stop' parameter is exclusive (this is more usual)
         # but 'UNTIL' field in iCal is inclusive (according to standard).
@@ -1728,9 +3145,7 @@ class RepeatInfo:
         #   - Name it stop_exc for clarity
         #   - Take care when using 'UNTIL'
         # N.B. At this point 'stop' may be a date or datetime (matching timed_rpt)
-        until = rrule['UNTIL'][0] if 'UNTIL' in rrule else None
-        if self.timed_rpt and until:
-            until = date_to_datetime(until, True).astimezone(timezone.utc)
+        until = self.until
         if until is None or (stop is not None and dt_lte(stop, until)):
             # Repeats go beyond stop date - just use stop parameter
             # if timed entry, make stop include timezone
@@ -1740,21 +3155,8 @@ class RepeatInfo:
         else:
             # until is a date only
             self.stop_exc = dt_datetime.combine(until,dt_time(microsecond=1))
-        count = rrule['COUNT'][0] if 'COUNT' in rrule else None
-        if count is not None:
-            if self.exdates is not None:
-                raise RepeatUnsupportedError('Unsupported COUNT & EXDATE') # !! fix me
-            if self._isby_weekday_in_month:
-                last_by_count = self.start.replace(day=1) + (self.delta*(count-1))
-                last_by_count = self.firstday_to_byweekdayinmonth(last_by_count)
-            elif isinstance(self.delta, list):
-                di,md = divmod(count-1, len(self.delta))
-                last_by_count = self.start
-                last_by_count += di*reduce(lambda x,y:x+y,self.delta) # sum()
-                if md:
-                    last_by_count += reduce(lambda x,y:x+y,self.delta[:md])
-            else:
-                last_by_count = self.start + (self.delta*(count-1))
+        last_by_count = self.last_by_count
+        if last_by_count is not None:
             if self.stop_exc is None or dt_lt(last_by_count,self.stop_exc):
                 self.stop_exc = last_by_count+timedelta(milliseconds=1) if isinstance(last_by_count,dt_datetime) else dt_datetime.combine(last_by_count,dt_time(microsecond=1))
         if self.stop_exc is None:
@@ -1777,6 +3179,31 @@ class RepeatInfo:
                 and dt.date() in self.exdates) # type:ignore[attr-defined]
 
 
+    @staticmethod
+    def localise(dt:dt_datetime) -> dt_datetime:
+        # Given "wall clock" occurrence dt, return the time it occurs.
+        # RFC-5545 (Sec 3.3.5) says that a time in a gap (when clocks go
+        # forward) uses the UTC offset before the gap, so it is moved on
+        # by the length of the gap. A time that occurs twice (when clocks
+        # go back) is the first of the two, which datetime arithmetic
+        # already gives us (fold=0), so it is left unchanged.
+        if du_tz.datetime_exists(dt):
+            return dt
+        return du_tz.resolve_imaginary(dt) # type:ignore[no-any-return]
+
+
+    @classmethod
+    def localise_list(cls, dts:list) -> list:
+        # Given sorted list of "wall clock" occurrences, return list of
+        # the times they occur (see localise() above). Times in a gap are
+        # moved on, so can land on (or after) a later occurrence; in that
+        # case the result is de-duplicated and re-sorted.
+        ret = [cls.localise(d) for d in dts]
+        if ret!=dts:
+            ret = sorted(set(ret))
+        return ret
+
+
     def firstday_to_byweekdayinmonth(self, dt:dt_date) -> dt_date:
         # Function to map dt giving first day of the month to the
         # "byday" repeat day (e.g. "last Sunday of the month").
@@ -1795,13 +3222,132 @@ class RepeatInfo:
         return dt.replace(day=retday)
 
 
-    def __iter__(self) -> 'RepeatIter_simpledelta':
+    def period_firstday(self, dt:dt_date) -> dt_date:
+        # Return first day of month/year containing dt, for repeats
+        # with a set of days in each month/year. Time is unchanged.
+        if self.period_year:
+            return dt.replace(month=1, day=1)
+        return dt.replace(day=1)
+
+
+    def firstday_to_periodset(self, dt:dt_date) -> List[dt_date]:
+        # Function to map dt giving first day of the month (or year) to
+        # a sorted list of the repeat days in that month (or year).
+        # Assumes the rules have been set up by _set_period_set().
+        # *Precondition*: dt is 1st day of month/year
+        if self.period_year:
+            ndays = 366 if isleap(dt.year) else 365
+            days = set(n if n>0 else ndays+1+n for n in self.byyearday if abs(n)<=ndays)
+        else:
+            ndays = monthrange(dt.year,dt.month)[1] # no of days in month
+            wday1 = dt.weekday()
+            if self.bymonthday:
+                days = set(n if n>0 else ndays+1+n for n in self.bymonthday if abs(n)<=ndays)
+                if self.byday_days:
+                    # BYDAY limits the BYMONTHDAY days (e.g. Friday 13th)
+                    days = set(n for n in days if (wday1+n-1)%7 in self.byday_days)
+            else:
+                days = set()
+                for (idx,day) in self.byday_rules:
+                    first = 1+(day-wday1)%7 # first of this weekday in month
+                    if idx==0: # every one of these weekdays
+                        days.update(range(first, ndays+1, 7))
+                    elif idx>0:
+                        days.add(first+(idx-1)*7)
+                    else:
+                        days.add(first+((ndays-first)//7+idx+1)*7)
+                days = set(n for n in days if 1<=n<=ndays)
+        dlist = sorted(days)
+        if self.bysetpos:
+            cnt = len(dlist)
+            dlist = sorted(set(dlist[p-1 if p>0 else p] for p in self.bysetpos if abs(p)<=cnt))
+        if self.period_year:
+            return [dt+timedelta(days=n-1) for n in dlist]
+        return [dt.replace(day=n) for n in dlist]
+
+
+    def rdates_in_range(self) -> List[dt_date]:
+        # Return sorted list of extra occurrences (from RDATE) in range.
+        # These are not limited by UNTIL/COUNT, but are by EXDATE.
+        st = self.rng_start
+        sp = self.rng_stop
+        ret = [d for d in self.rdates if (st is None or not dt_lt(d,st)) and (sp is None or dt_lt(d,sp)) and not self.is_exdate(d)]
+        if self.subday_rpt:
+            ret = [utc_to_local(d) for d in ret] # type:ignore[arg-type]
+        return ret
+
+
+    def merge_rdates(self, occs:Iterable[dt_date]) -> Iterator[dt_date]:
+        # Given sorted occurrences occs, yield these merged with extra
+        # occurrences from RDATE, in order, without duplicates.
+        prev = None
+        for d in heapq_merge(occs, self.rdates_in_range(), key=dt_sort_key):
+            if d!=prev:
+                yield d
+            prev = d
+
+
+    def is_dense(self) -> bool:
+        # Returns True if repeat is sub-day with occurrences so frequent
+        # that every day between two occurrences must contain one.
+        return self.subday_rpt and isinstance(self.delta, timedelta) and self.delta<=self.DENSE_DELTA
+
+
+    def occurrence_days(self) -> List[dt_date]:
+        # Return sorted list of local dates with occurrences in range,
+        # for dense repeats (see is_dense()). Days are calculated from
+        # the first and last occurrences, so every occurrence doesn't
+        # need to be listed. Days are only dropped if all occurrences in
+        # them are excluded, which is found by counting EXDATEs.
+        days = set([datetime_to_local_date(d) for d in self.rdates_in_range()])
+        # Dense repeats are sub-daily, so these are UTC datetimes
+        first = self.start_in_rng # type:dt_datetime # type:ignore[assignment]
+        stop = self.stop_exc # type:dt_datetime # type:ignore[assignment]
+        if first is not None and dt_lt(first, stop):
+            n = -((first-stop)//self.delta) # Occurrences in range
+            last = first + self.delta*(n-1) # type:dt_datetime
+            day = utc_to_local(first).date()
+            last_day = utc_to_local(last).date()
+            exdays = {} # type:Dict[dt_date,int]
+            if self.exdates is not None:
+                for ex in self.exdates:
+                    if isinstance(ex,dt_datetime) and not dt_lt(ex,first) and not dt_lt(last,ex) and not (ex-first)%self.delta:
+                        exday = utc_to_local(ex).date()
+                        exdays[exday] = exdays.get(exday,0) + 1
+            oneday = timedelta(days=1)
+            while day <= last_day:
+                if day not in exdays or exdays[day] < self._occurrences_on_day(day, first, last):
+                    days.add(day)
+                day += oneday
+        return sorted(days)
+
+
+    def _occurrences_on_day(self, day:dt_date, first:dt_datetime, last:dt_datetime) -> int:
+        # Return number of occurrences on local date day, from first to
+        # last inclusive (ignoring EXDATEs). Helper for occurrence_days().
+        day_st = max(date_to_datetime(day, True), first)
+        day_end = min(date_to_datetime(day+timedelta(days=1), True), last+timedelta(microseconds=1))
+        if day_end <= day_st:
+            return 0
+        # Count of k with day_st <= first+k*delta < day_end
+        return -((first-day_end)//self.delta) + ((first-day_st)//self.delta) # type:ignore[no-any-return]
+
+
+    def __iter__(self) -> Iterator[dt_date]:
         # Return an iterator for this RepeatInfo
-        if self._isby_weekday_in_month:
-            return RepeatIter_byweekdayinmonth(self)
-        if self.start_in_rng is not None and isinstance(self.delta, list):
-            return RepeatIter_multidelta(self)
-        return RepeatIter_simpledelta(self)
+        it = None # type:Optional[Iterator[dt_date]]
+        if self.start_in_rng is not None:
+            if self._isby_weekday_in_month:
+                it = RepeatIter_byweekdayinmonth(self)
+            elif self._isby_period_set:
+                it = RepeatIter_periodset(self)
+            elif isinstance(self.delta, list):
+                it = RepeatIter_multidelta(self)
+        if it is None:
+            it = RepeatIter_simpledelta(self) # Also if no repeats in range
+        if self.rdates:
+            return self.merge_rdates(it)
+        return it
 
 
 # Exception used to indicate need to used fallback repeat calculation
@@ -1816,6 +3362,8 @@ class RepeatImpossibleError(Exception):
 class RepeatIter_simpledelta:
     # Iterator class for RepeatInfo where we can just use a simple delta.
 
+    _prev = None # type:Optional[dt_datetime] # last localised occurrence
+
     def __init__(self, rinfo:RepeatInfo):
         self.rinfo = rinfo
         self.dt = rinfo.start_in_rng
@@ -1824,6 +3372,16 @@ class RepeatIter_simpledelta:
         # Standard method for iterators
         return self
 
+    def _localise(self, dt:dt_datetime) -> Optional[dt_datetime]:
+        # Return time wall clock occurrence dt occurs (RepeatInfo.localise).
+        # Returns None if this is the same as the previous occurrence,
+        # which can happen when a time in a gap is moved on.
+        dt = self.rinfo.localise(dt)
+        if dt==self._prev:
+            return None
+        self._prev = dt
+        return dt
+
     def __next__(self) -> dt_date:
         # Return date/dattime for next occurrence in range.
         # Excluded dates are taken into account.
@@ -1836,7 +3394,12 @@ class RepeatIter_simpledelta:
             if not self.rinfo.is_exdate(self.dt):
                 break
         if self.rinfo.subday_rpt:
-            r = r.astimezone(get_local_tz()) # type:ignore[attr-defined]
+            r = utc_to_local(r) # type:ignore[arg-type]
+        elif self.rinfo.resolve_gaps:
+            loc = self._localise(r) # type:ignore[arg-type]
+            if loc is None:
+                return self.__next__() # Duplicate, so skip
+            r = loc
         return r
 
 
@@ -1862,7 +3425,12 @@ class RepeatIter_multidelta(RepeatIter_simpledelta):
             if not self.rinfo.is_exdate(self.dt):
                 break
         if self.rinfo.subday_rpt:
-            r = r.astimezone(get_local_tz()) # type:ignore[attr-defined]
+            r = utc_to_local(r) # type:ignore[arg-type]
+        elif self.rinfo.resolve_gaps:
+            loc = self._localise(r) # type:ignore[arg-type]
+            if loc is None:
+                return self.__next__() # Duplicate, so skip
+            r = loc
         return r
 
 
@@ -1888,34 +3456,97 @@ class RepeatIter_byweekdayinmonth(RepeatIter_simpledelta):
             if not self.rinfo.is_exdate(self.dt_toret):
                 break
         if self.rinfo.subday_rpt:
-            ret = ret.astimezone(get_local_tz()) # type:ignore[attr-defined]
+            ret = utc_to_local(ret) # type:ignore[arg-type]
+        elif self.rinfo.resolve_gaps:
+            loc = self._localise(ret) # type:ignore[arg-type]
+            if loc is None:
+                return self.__next__() # Duplicate, so skip
+            ret = loc
+        return ret
+
+
+class RepeatIter_periodset(RepeatIter_simpledelta):
+    # Iterator class for RepeatInfo where the repeat is a set of days in
+    # each month (or year). E.g. 2nd and 4th Tuesday of every month; or
+    # last weekday of the month (using BYSETPOS).
+
+    def __init__(self, rinfo:RepeatInfo):
+        self.rinfo = rinfo
+        self.dt_ref = rinfo.start_in_rng
+        self.days = rinfo.firstday_to_periodset(self.dt_ref)
+        self.i = 0
+
+    def __next__(self) -> dt_date:
+        # Return date/datetime for next occurrence in range.
+        # Excluded dates are taken into account.
+        # Raises StopIteration at end of occurrence list.
+        rinfo = self.rinfo
+        while True:
+            while self.i>=len(self.days):
+                # Move to next month/year (some may have no days)
+                self.dt_ref += rinfo.delta
+                if dt_lte(rinfo.stop_exc, self.dt_ref):
+                    raise StopIteration
+                self.days = rinfo.firstday_to_periodset(self.dt_ref)
+                self.i = 0
+            ret = self.days[self.i]
+            if dt_lte(rinfo.stop_exc, ret):
+                raise StopIteration
+            self.i += 1
+            if dt_lt(ret, rinfo.start):
+                continue # Before DTSTART (in first month/year)
+            if rinfo.rng_start is not None and dt_lt(ret, rinfo.rng_start):
+                continue # Before start of range
+            if not rinfo.is_exdate(ret):
+                break
+        if rinfo.resolve_gaps:
+            loc = self._localise(ret) # type:ignore[arg-type]
+            if loc is None:
+                return self.__next__() # Duplicate, so skip
+            ret = loc
         return ret
 
 
-def merge_repeating_entries_sort(target:list, ev:iEvent, start:dt_date, stop:dt_date) -> None:
-    # Given a sorted list of occurrences, 'target', and a single
-    # repeating event 'ev', splice the repeats of ev from 'start'
-    # to 'stop' into 'target', keeping it sorted.
-    # !! A potential spot for optimisation?
+def _occurrence_sort_key(occ:Tuple[Any,dt_date]) -> int:
+    # Key for sorting occurrences (entry,date) by date
+    return dt_sort_key(occ[1]) # type:ignore[no-any-return]
+
+
+def merge_occurrences(sources:Iterable[Iterable[Tuple[Any,dt_date]]]) -> Iterator[Tuple[Any,dt_date]]:
+    # Given sorted iterables of occurrences (i.e. (entry,date) pairs),
+    # yield all the occurrences in sorted order (a k-way merge, using a
+    # heap). Occurrences at the same time are in the order of sources.
+    return heapq_merge(*sources, key=_occurrence_sort_key)
+
+
+def entry_repeat_occurrences(ev:iEvent, start:dt_date, stop:dt_date, lazy:bool=False) -> Iterable[Tuple[iEvent,dt_date]]:
+    # Return sorted iterable of occurrences (ev,date) of repeating event
+    # ev from 'start' to 'stop'. If lazy is True, occurrences are only
+    # calculated as they are read (if possible), otherwise it's a list.
     try:
-        ev_reps = repeats_in_range(ev, start, stop)
+        ev_reps = repeats_in_range_iter(ev, start, stop) if lazy else repeats_in_range(ev, start, stop) # type:Iterable
     except ValueError as err:
         print('Warning: {:s} - ignoring repeat'.format(str(err)), file=stderr)
         dt_st = ev['DTSTART'].dt
         if dt_lt(dt_st,start) or dt_lte(stop,dt_st):
-            return
+            return []
         ev_reps = [dt_st]
-    i,j = 0,0
-    end_i = len(target)
-    end_j = len(ev_reps)
-    while i<end_i and j<end_j:
-        if dt_lt(ev_reps[j],target[i][1]):
-            target.insert(i,(ev,ev_reps[j]))
-            j += 1
-            end_i +=1
-        i += 1
-    if j<end_j:
-        target.extend([(ev,dt) for dt in ev_reps[j:]])
+    if lazy:
+        return ((ev,dt) for dt in ev_reps)
+    return [(ev,dt) for dt in ev_reps]
+
+
+def entry_repeat_days(ev:iEvent, start:dt_date, stop:dt_date) -> List[dt_date]:
+    # Return sorted list of local dates from 'start' to 'stop' on which
+    # repeating event ev has an occurrence.
+    try:
+        return repeat_days_in_range(ev, start, stop)
+    except ValueError as err:
+        print('Warning: {:s} - ignoring repeat'.format(str(err)), file=stderr)
+        dt_st = ev['DTSTART'].dt
+        if dt_lt(dt_st,start) or dt_lte(stop,dt_st):
+            return []
+        return [datetime_to_local_date(dt_st)]
 
 
 def first_occ(rrstr:str, dtstart:dt_date) -> dt_date:
@@ -1931,19 +3562,146 @@ def first_occ(rrstr:str, dtstart:dt_date) -> dt_date:
     return ret
 
 
-def _rrule_from_entry(en:Union[iEvent,iTodo]) -> Tuple[rruleobj, bool, bool]:
+def rdate_start(d:Any) -> dt_date:
+    # Return date/datetime of an RDATE value, which might be a PERIOD
+    # (as a tuple, start first).
+    return d[0] if isinstance(d, tuple) else d # type:ignore[no-any-return]
+
+
+def repeat_rdates(en:Union[iEvent,iTodo], is_timed:bool) -> List[dt_date]:
+    # Return sorted list of extra occurrences of entry en from RDATE.
+    # If is_timed, these are datetimes with timezones (dates are given
+    # time of DTSTART), otherwise dates.
+    if 'RDATE' not in en:
+        return []
+    ret = [] # type:List[dt_date]
+    st = date_to_datetime(en['DTSTART'].dt, True)
+    for d in Calendar.caldatetime_tree_to_dt_list(en['RDATE']):
+        d = rdate_start(d)
+        if not is_timed:
+            ret.append(datetime_to_date(d))
+        elif isinstance(d, dt_datetime):
+            ret.append(date_to_datetime(d, True))
+        else:
+            ret.append(dt_datetime.combine(d, st.timetz()))
+    ret.sort(key=dt_sort_key)
+    return ret
+
+
+# Lengths of repeat periods with these FREQs (see _seek_rrule())
+_RRULE_PERIOD_UNITS = {
+    'SECONDLY': timedelta(seconds=1),
+    'MINUTELY': timedelta(minutes=1),
+    'HOURLY': timedelta(hours=1),
+    'DAILY': timedelta(days=1),
+    'WEEKLY': timedelta(weeks=1),
+    }
+_RRULE_BY_PARTS = ('BYSECOND','BYMINUTE','BYHOUR','BYDAY','BYMONTHDAY','BYYEARDAY','BYWEEKNO','BYMONTH','BYSETPOS')
+# Rules are moved on by a multiple of this many periods (or to a day
+# boundary, for periods shorter than a day), so nearby ranges can use
+# the same moved rule (see RepeatPlan.rrule_near()).
+_RRULE_SEEK_STEP = 4
+
+
+def _rrule_dtstart(en:Union[iEvent,iTodo]) -> Tuple[dt_datetime, bool, bool]:
+    # Helper for _rrule_from_entry(). Returns tuple:
+    #    * start datetime for rrule object of entry (in UTC for
+    #      hour/minute/second repeats, naive if entry is untimed)
+    #    * a bool, True if repeat is hour/minute/second
+    #    * a bool, True if we need to consider time of entry
+    dt = en['DTSTART'].dt
+    is_hr_min_sec = en['RRULE']['FREQ'][0] in RepeatInfo.SUBDAY_REPEATS
+    is_timed = is_hr_min_sec or isinstance(dt, dt_datetime)
+    if not is_timed:
+        return dt_datetime.combine(dt, dt_time()), is_hr_min_sec, is_timed
+    dt = date_to_datetime(dt, True) # Ensure timed & with timezone
+    if is_hr_min_sec:
+        # We get rrule to do calculations in UTC, so summer time changes
+        # don't cause errors. We'll convert back to local time later.
+        dt = dt.astimezone(timezone.utc)
+    return dt, is_hr_min_sec, is_timed
+
+
+def _seek_periods(rr_parts:vRecur, dtstart:dt_datetime, near:dt_datetime) -> int:
+    # Helper for RepeatPlan.rrule_near(). Return number of repeat
+    # periods (FREQ*INTERVAL) to move rule on from dtstart, so it starts
+    # a period or more before 'near'. This is a multiple of
+    # _RRULE_SEEK_STEP (or is for the start of near's day, for periods
+    # shorter than a day), so it's the same for nearby values of 'near'.
+    # Return 0 if rule can't/needn't be moved.
+    freq = rr_parts['FREQ'][0]
+    interval = int(rr_parts['INTERVAL'][0]) if 'INTERVAL' in rr_parts else 1
+    if interval<=0:
+        return 0
+    step = _RRULE_SEEK_STEP
+    period = _RRULE_PERIOD_UNITS[freq]*interval if freq in _RRULE_PERIOD_UNITS else None
+    if period is not None and period < timedelta(days=1):
+        # Lots of occurrences per day, so use start of near's (local) day
+        near = near.replace(hour=0, minute=0, second=0, microsecond=0)
+        step = 1
+    # Find distance in "wall clock" time, as rrule steps in that
+    if dtstart.tzinfo is not None:
+        near = near.astimezone(dtstart.tzinfo)
+    near = near.replace(tzinfo=None)
+    if period is not None:
+        k = (near - dtstart.replace(tzinfo=None))//period - 1
+    elif freq in ('MONTHLY','YEARLY'):
+        months = interval*12 if freq=='YEARLY' else interval
+        k = ((near.year-dtstart.year)*12 + near.month-dtstart.month)//months - 1
+    else:
+        return 0
+    return max(k - k%step, 0)
+
+
+def _seek_rrule(rr_parts:vRecur, dtstart:dt_datetime, k:int) -> Optional[Tuple[vRecur,dt_datetime]]:
+    # Helper for _rrule_from_entry(). Return RRULE parts and new start
+    # moved on k repeat periods (FREQ*INTERVAL), giving the same
+    # occurrences from there. Return None if the rule can't be moved
+    # (e.g. COUNT can't be adjusted).
+    freq = rr_parts['FREQ'][0]
+    interval = int(rr_parts['INTERVAL'][0]) if 'INTERVAL' in rr_parts else 1
+    if freq in _RRULE_PERIOD_UNITS:
+        new_start = dtstart + _RRULE_PERIOD_UNITS[freq]*interval*k
+    else:
+        months = interval*12 if freq=='YEARLY' else interval
+        new_start = dtstart + relativedelta(months=months*k)
+    parts = deepcopy(rr_parts)
+    if not any(p in parts for p in ('BYWEEKNO','BYYEARDAY','BYMONTHDAY','BYDAY')):
+        # Make parts implied by DTSTART explicit (as dateutil.rrule does)
+        # since they may differ for new start (e.g. 31st -> 30th).
+        if freq=='YEARLY':
+            if 'BYMONTH' not in parts:
+                parts['BYMONTH'] = [dtstart.month]
+            parts['BYMONTHDAY'] = [dtstart.day]
+        elif freq=='MONTHLY':
+            parts['BYMONTHDAY'] = [dtstart.day]
+        elif freq=='WEEKLY':
+            parts['BYDAY'] = [RepeatInfo.DAY_ABBR[dtstart.weekday()]]
+    if 'COUNT' in parts:
+        # Can only adjust count if there's one occurrence per period
+        if freq not in _RRULE_PERIOD_UNITS or any(p in rr_parts for p in _RRULE_BY_PARTS):
+            return None
+        count = int(parts['COUNT'][0]) - k
+        if count<=0:
+            return None
+        parts['COUNT'] = [count]
+    return parts, new_start
+
+
+def _rrule_from_entry(en:Union[iEvent,iTodo], seek:int=0) -> Optional[Tuple[rruleobj, bool, bool]]:
     # Returns tuple:
     #    * an rrule object for an entry
     #    * a bool, True if repeat is hour/minute/day
     #    * a bool, True if we need to consider time of entry
+    # If seek>0, the rrule object starts that many repeat periods after
+    # DTSTART (see _seek_periods()), so dateutil doesn't need to step
+    # through all occurrences from DTSTART - or None is returned if
+    # this can't be done.
     # Assumes that entry has an RRULE.
-    dt = en['DTSTART'].dt
+    dt, is_hr_min_sec, is_timed = _rrule_dtstart(en)
     rr_for_str = en['RRULE'] # reference to rrule
-    is_hr_min_sec = rr_for_str['FREQ'][0] in RepeatInfo.SUBDAY_REPEATS
-    is_timed = is_hr_min_sec or isinstance(dt, dt_datetime)
     until_set = False
     if is_timed:
-        dt = date_to_datetime(dt, True) # Ensure timed & with timezone
         if 'UNTIL' in rr_for_str:
             # Make sure until is timed with timezone
             until = date_to_datetime(rr_for_str['UNTIL'][0], True)
@@ -1951,10 +3709,11 @@ def _rrule_from_entry(en:Union[iEvent,iTodo]) -> Tuple[rruleobj, bool, bool]:
             rr_for_str = deepcopy(rr_for_str) # So we don't modify the entry
             rr_for_str['UNTIL'][0] = until
             until_set = True
-    if is_hr_min_sec:
-        # We get rrule to do calculations in UTC, so summer time changes
-        # don't cause errors. We'll convert back to local time later.
-        dt = dt.astimezone(timezone.utc)
+    if seek>0:
+        moved = _seek_rrule(rr_for_str, dt, seek)
+        if moved is None:
+            return None
+        rr_for_str, dt = moved
     rrstr = rr_for_str.to_ical().decode('utf-8')
     # Hacky workaround because in some package/version combinations,
     # icalendar.to_ical(), returned UNTIL value lacks timezone 'Z'.
@@ -1967,7 +3726,13 @@ def _rrule_from_entry(en:Union[iEvent,iTodo]) -> Tuple[rruleobj, bool, bool]:
         if i_until_z == -1 or i_until_z > i_until_end:
             rrstr = rrstr[:i_until_end] + 'Z' + rrstr[i_until_end:]
     has_exd = 'EXDATE' in en
-    return rrulestr(rrstr, dtstart=dt, forceset=has_exd), is_hr_min_sec,is_timed
+    has_rd = 'RDATE' in en
+    rr = rrulestr(rrstr, dtstart=dt, forceset=has_exd or has_rd)
+    if has_rd:
+        # Add extra dates (rrule needs datetimes)
+        for d in repeat_rdates(en, is_timed):
+            rr.rdate(d if is_timed else dt_datetime.combine(d, dt_time()))
+    return rr, is_hr_min_sec, is_timed
 
 
 def repeats_in_range_with_rrstr(ev:iEvent, start:dt_date, stop:dt_date) -> list:
@@ -1975,20 +3740,22 @@ def repeats_in_range_with_rrstr(ev:iEvent, start:dt_date, stop:dt_date) -> list:
     # Slow, but comprehensive. Used as a fallback from repeats_in_range()
     # when quick methods can't be used.
     # Repeats are super clunky.
-    # Can caching results help?
-    rr, is_hr_min_sec, is_timed = _rrule_from_entry(ev)
+    # rrule object is cached in entry's repeat plan, so only built once.
+    plan = repeat_plan(ev)
+    is_hr_min_sec, is_timed = plan.rrule(ev)[1:]
 
     st = date_to_datetime(start, is_timed)
     sp = date_to_datetime(stop, is_timed)
     sp -= timedelta(milliseconds=1)
+    rr = plan.rrule_near(ev, st)
     ret = rr.between(after=st,before=sp,inc=True) # type:list
     if not is_timed:
         ret = [d.date() for d in ret]
     elif is_hr_min_sec:
         # After doing calculations in UTC, convert results to local time
-        ret = [d.astimezone(get_local_tz()) for d in ret]
+        ret = [utc_to_local(d) for d in ret]
     if 'EXDATE' in ev:
-        exdate_list = Calendar.caldatetime_tree_to_dt_list(ev['EXDATE'])
+        exdate_list = plan.exdate_list(ev)
         for exdt in exdate_list:
             if is_timed:
                 if isinstance(exdt, dt_datetime):
@@ -1998,77 +3765,120 @@ def repeats_in_range_with_rrstr(ev:iEvent, start:dt_date, stop:dt_date) -> list:
                     ret = [d for d in ret if d.date()!=exdt]
             else:
                 ret = [d for d in ret if d!=exdt]
+    if is_timed and not is_hr_min_sec:
+        # Wall clock times in DST gaps, as RepeatInfo
+        ret = RepeatInfo.localise_list(ret)
     return ret
 
 
-def repeats_in_range(ev:iEvent, start:dt_date, stop:dt_date) -> list:
-    # Given a repeating event ev, return list of occurrences from
-    # dates start to stop. N.B. start/stop must be dates, not datetimes.
+def _repeat_info_or_list(ev:iEvent, start:dt_date, stop:dt_date) -> Union['RepeatInfo',list]:
+    # Helper for repeats_in_range() & repeats_in_range_iter().
+    # Returns RepeatInfo for ev from start to stop, or if RepeatInfo
+    # can't be used, a list of the occurrences.
     if isinstance(start,dt_datetime) or isinstance(stop,dt_datetime):
         raise TypeError('Start/stop must be dates, not datetimes')
     try:
-        r_info = RepeatInfo(ev, start, stop)
+        return RepeatInfo(ev, start, stop)
     except RepeatImpossibleError:
         return list() # empty list
-    except RepeatUnsupportedError as err:
-        # RepeatInfo doesn't handle this type of repeat.
-        # Fall back to using rrule - more complete, but slower for simple repeats
-        print('Notice: Fallback to unoptimised repeat for "{:s}" ({:s})'.format(ev['SUMMARY'],str(err)), file=stderr)
+    except RepeatUnsupportedError:
+        # RepeatInfo doesn't handle this type of repeat, so fall back to
+        # rrule (notice is printed when entry's repeat plan is compiled)
         return repeats_in_range_with_rrstr(ev, start, stop)
-    ret = list(iter(r_info))
+
+
+def repeats_in_range_iter(ev:iEvent, start:dt_date, stop:dt_date) -> Iterator[dt_date]:
+    # Given a repeating event ev, return iterator over occurrences from
+    # dates start to stop. Where possible, occurrences are calculated
+    # as needed, so this is quicker if only the first few are used.
+    return iter(_repeat_info_or_list(ev, start, stop))
+
+
+def repeats_in_range(ev:iEvent, start:dt_date, stop:dt_date) -> list:
+    # Given a repeating event ev, return list of occurrences from
+    # dates start to stop. N.B. start/stop must be dates, not datetimes.
+    r_info = _repeat_info_or_list(ev, start, stop)
+    if isinstance(r_info, list):
+        return r_info
+    ret = repeats_numpy(r_info) # type:Optional[list] # Quicker for many repeats, if available
+    if ret is None:
+        ret = list(iter(r_info))
     # Uncomment the next two lines to test calculated values (slow!)
     #if ret != repeats_in_range_with_rrstr(ev, start, stop):
     #    print('Error: Wrong repeats for "{:s}"'.format(ev['SUMMARY']), file=stderr)
     return ret
 
 
-def _in_datelist(dt:dt_datetime, lst:list, is_timed:bool) -> bool:
-    if is_timed:
-        # Take care of comparing TZ-aware and not-aware dates
-        dt_tz = dt.tzinfo
-        if dt_tz is None:
-            for cmp in lst:
-                if date_to_datetime(dt, tz=cmp.tzinfo) == cmp:
-                    return True
-        else:
-            for cmp in lst:
-                if dt == date_to_datetime(cmp, tz=dt_tz):
-                    return True
-        return False
+def repeat_days_in_range(ev:iEvent, start:dt_date, stop:dt_date) -> List[dt_date]:
+    # Given a repeating event ev, return sorted list of local dates from
+    # start to stop on which it has at least one occurrence. For dense
+    # sub-day repeats this is quicker than listing all occurrences.
+    r_info = _repeat_info_or_list(ev, start, stop)
+    if isinstance(r_info, list):
+        occs = r_info
+    elif r_info.is_dense():
+        return [d for d in r_info.occurrence_days() if not dt_lt(d,start) and dt_lt(d,stop)]
     else:
-        return datetime_to_date(dt) in lst
+        occs = repeats_numpy(r_info)
+        if occs is None:
+            occs = list(iter(r_info))
+    ret = [] # type:List[dt_date]
+    for dt in occs:
+        d = datetime_to_local_date(dt)
+        if (not ret or d!=ret[-1]) and not dt_lt(d,start) and dt_lt(d,stop):
+            ret.append(d)
+    return ret
+
+
+def _skip_excluded(en:iEvent, plan:RepeatPlan, rr:rruleobj, occ:Optional[dt_date], forward:bool) -> Optional[dt_date]:
+    # Helper for previous_next_occurrence(). If occurrence occ (from
+    # rrule object rr) is excluded, return the nearest occurrence after
+    # (or before, if not forward) that is not excluded (or None).
+    # Rather than trying each following occurrence in turn (each rrule
+    # search starts at DTSTART, so this is slow), skip over exclusions
+    # by getting all occurrences up to an exclusion bound in one go.
+    while occ is not None and plan.is_excluded(en, occ):
+        lim = plan.exclusion_bound(en, occ, forward)
+        if lim is None:
+            occ = rr.after(occ, inc=False) if forward else rr.before(occ, inc=False)
+            continue
+        if forward:
+            cands = rr.between(occ, lim, inc=True)
+        else:
+            cands = reversed(rr.between(lim, occ, inc=True))
+        nxt = None
+        for c in cands:
+            if c!=occ and not plan.is_excluded(en, c):
+                nxt = c
+                break
+        if nxt is None:
+            # Whole run excluded, continue from the bound
+            nxt = rr.after(lim, inc=False) if forward else rr.before(lim, inc=False)
+        occ = nxt
+    return occ
 
 
-def previous_next_occurrence(en:Union[iEvent,iTodo], start:dt_date, limit_tries:bool=True) -> Tuple[Optional[dt_date], Optional[dt_date]]:
+def previous_next_occurrence(en:Union[iEvent,iTodo], start:dt_date) -> Tuple[Optional[dt_date], Optional[dt_date]]:
     # Given a repeating entry en, return a pair of the previous
     # and next occurrences relative to date.
     # Returned datetimes have local timezone.
     # Note: previous is *exclusive* of start, and next is *inclusive*
     # Assumes that entry has an RRULE.
-    rr, is_hr_min_sec, is_timed = _rrule_from_entry(en)
+    plan = repeat_plan(en)
+    rr, is_hr_min_sec, is_timed = plan.rrule(en)
 
     st = date_to_datetime(start, is_timed)
-    pre = rr.before(st, inc=False)
-    nxt = rr.after(st, inc=True)
+    rr_near = plan.rrule_near(en, st)
+    pre = rr_near.before(st, inc=False)
+    nxt = rr_near.after(st, inc=True)
     if 'EXDATE' in en:
-        TRIES_LIMIT = 20
-        exdate_list = Calendar.caldatetime_tree_to_dt_list(en['EXDATE'])
-        i = 0
-        while pre is not None and _in_datelist(pre, exdate_list, is_timed):
-            if limit_tries:
-                i += 1
-                if i == TRIES_LIMIT:
-                    pre = None
-                    break
-            pre = rr.before(pre, inc = False)
-        i = 0
-        while nxt is not None and _in_datelist(nxt, exdate_list, is_timed):
-            if limit_tries:
-                i += 1
-                if i == TRIES_LIMIT:
-                    nxt = None
-                    break
-            nxt = rr.after(nxt, inc = False)
+        pre = _skip_excluded(en, plan, rr_near, pre, False)
+        nxt = _skip_excluded(en, plan, rr_near, nxt, True)
+    if pre is None and rr_near is not rr:
+        # Previous occurrence may be before start of rr_near, so use rr
+        pre = rr.before(st, inc=False)
+        if 'EXDATE' in en:
+            pre = _skip_excluded(en, plan, rr, pre, False)
     if is_timed:
         # After doing calculations in UTC, convert results to local time
         tz = get_local_tz()
@@ -225,7 +225,8 @@ class ImportController:
             # However, some export tools on Psions don't add UIDs, so to
             # support import from Psions, show an alert, but allow import.
             cls._add_row(_('Invalid entry, no ID found'), style=GUI.STYLE_ALERTLABEL, halign=Gtk.Align.CENTER)
-        elif Calendar.get_entry_by_uid(en['UID']) is not None: # entry exists?
+        elif Calendar.override_exists(en['UID'], en['RECURRENCE-ID'].dt) if 'RECURRENCE-ID' in en else Calendar.uid_exists(en['UID']): # entry exists?
+            # (Entries with RECURRENCE-ID share UID with repeating entry)
             cls._add_row(_('An entry with this ID already exists'), style=GUI.STYLE_ALERTLABEL, halign=Gtk.Align.CENTER)
             can_import = False
 
@@ -396,6 +396,9 @@ class GUI:
         cls.view_redraw(True) # Draw active view, including entries
         cls._eventbox.show_all()
 
+        # Build search index in idle time, so Find is quick when used
+        GLib.idle_add(Calendar.search_index_build_step, priority=GLib.PRIORITY_LOW)
+
 
     @classmethod
     def _init_config(cls) -> None:
@@ -807,6 +810,7 @@ class GUI:
     def main(cls) -> None:
         # Run the main Gtk loop
         Gtk.main()
+        Calendar.close()
 
 
     # Signal handling functions
@@ -0,0 +1,520 @@
+# -*- coding: utf-8 -*-
+#
+# pygenda_index.py
+# Index data structures used by Calendar to speed up queries.
+#
+# Copyright (C) 2022-2026 Matthew Lewis
+#
+# This file is part of Pygenda.
+#
+# Pygenda is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# Pygenda is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pygenda. If not, see <https://www.gnu.org/licenses/>.
+
+
+from random import random
+from collections import OrderedDict
+from bisect import bisect_left, bisect_right, insort
+import re
+import unicodedata
+from typing import Optional, Any, Dict, Tuple, List, Set, Callable, Iterable, Iterator
+
+
+class _IntervalNode:
+    # Node in IntervalIndex tree (below).
+    __slots__ = ('key', 'end', 'item', 'prio', 'left', 'right', 'max_end')
+
+    def __init__(self, key:Tuple[Any,int], end:Any, item:Any):
+        self.key = key # (start, sequence number) - unique, so sortable
+        self.end = end
+        self.item = item
+        self.prio = random() # treap priority, keeps tree balanced
+        self.left = None # type:Optional[_IntervalNode]
+        self.right = None # type:Optional[_IntervalNode]
+        self.max_end = end # maximum end in subtree rooted at this node
+
+
+class IntervalIndex:
+    # Index of items with [start,end) spans, to quickly find the items
+    # overlapping a given range (e.g. which entries are ongoing today?).
+    # Start/end can be any comparable values (Calendar uses epoch times).
+    # Implemented as a treap (randomised binary search tree) ordered by
+    # start, where each node also records the maximum end in its subtree.
+    # This lets queries skip subtrees that can't contain results, so
+    # queries take O(log n + k) for k results in typical data, and
+    # add/discard take O(log n).
+    # Items are identified by object identity, since entries may not be
+    # hashable, and their dates might change while they are indexed.
+
+    def __init__(self):
+        self._root = None # type:Optional[_IntervalNode]
+        self._keys = {} # type:Dict[int,Tuple[Any,int]] # id(item) -> key
+        self._seq = 0 # Used to make keys unique, and stable for equal starts
+
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+    def __contains__(self, item:Any) -> bool:
+        return id(item) in self._keys
+
+
+    def add(self, item:Any, start:Any, end:Any) -> None:
+        # Add item to index, with span start <= . < end
+        if id(item) in self._keys:
+            raise ValueError('Item already in interval index')
+        key = (start, self._seq)
+        self._seq += 1
+        self._keys[id(item)] = key
+        self._root = self._insert(self._root, _IntervalNode(key, end, item))
+
+
+    def discard(self, item:Any) -> bool:
+        # Remove item from index, if present.
+        # Return True if item was removed, False if it wasn't in the index.
+        key = self._keys.pop(id(item), None)
+        if key is None:
+            return False
+        self._root = self._remove(self._root, key)
+        return True
+
+
+    def overlapping(self, lo:Any, hi:Any) -> list:
+        # Return list of items with start<hi and end>lo, sorted by start.
+        # Note: with lo==hi, this gives items "ongoing" at lo (i.e. items
+        # that start strictly before lo and end strictly after).
+        ret = [] # type:List[Any]
+        self._overlapping(self._root, lo, hi, ret)
+        return ret
+
+
+    def items(self) -> list:
+        # Return list of all items in index, sorted by start.
+        ret = [] # type:List[Any]
+        self._overlapping(self._root, float('-inf'), float('inf'), ret)
+        return ret
+
+
+    @classmethod
+    def _overlapping(cls, node:Optional[_IntervalNode], lo:Any, hi:Any, ret:list) -> None:
+        # Helper for overlapping(): recursively add matches to ret.
+        # Subtrees with all ends <=lo are skipped; right subtrees are
+        # skipped when node start is >=hi (since their starts are later).
+        while node is not None and node.max_end > lo:
+            cls._overlapping(node.left, lo, hi, ret)
+            if not node.key[0] < hi:
+                return
+            if node.end > lo:
+                ret.append(node.item)
+            node = node.right
+
+
+    @staticmethod
+    def _update(node:_IntervalNode) -> None:
+        # Recalculate node max_end after its children have changed
+        m = node.end
+        if node.left is not None and node.left.max_end > m:
+            m = node.left.max_end
+        if node.right is not None and node.right.max_end > m:
+            m = node.right.max_end
+        node.max_end = m
+
+
+    @classmethod
+    def _insert(cls, root:Optional[_IntervalNode], node:_IntervalNode) -> _IntervalNode:
+        # Insert node into tree rooted at root. Return new root.
+        if root is None:
+            return node
+        if node.key < root.key:
+            root.left = cls._insert(root.left, node)
+            if root.left.prio > root.prio:
+                # Rotate right
+                new_root = root.left
+                root.left = new_root.right
+                new_root.right = root
+                cls._update(root)
+                root = new_root
+        else:
+            root.right = cls._insert(root.right, node)
+            if root.right.prio > root.prio:
+                # Rotate left
+                new_root = root.right
+                root.right = new_root.left
+                new_root.left = root
+                cls._update(root)
+                root = new_root
+        cls._update(root)
+        return root
+
+
+    @classmethod
+    def _remove(cls, root:Optional[_IntervalNode], key:Tuple[Any,int]) -> Optional[_IntervalNode]:
+        # Remove node with given key from tree rooted at root.
+        # Return new root.
+        if root is None:
+            return None
+        if key < root.key:
+            root.left = cls._remove(root.left, key)
+        elif root.key < key:
+            root.right = cls._remove(root.right, key)
+        else:
+            return cls._join(root.left, root.right)
+        cls._update(root)
+        return root
+
+
+    @classmethod
+    def _join(cls, a:Optional[_IntervalNode], b:Optional[_IntervalNode]) -> Optional[_IntervalNode]:
+        # Join trees a & b, where all keys in a are less than keys in b.
+        if a is None:
+            return b
+        if b is None:
+            return a
+        if a.prio > b.prio:
+            a.right = cls._join(a.right, b)
+            cls._update(a)
+            return a
+        b.left = cls._join(a, b.left)
+        cls._update(b)
+        return b
+
+
+class SortedKeyList:
+    # List of items kept sorted by integer key, supporting O(log n)
+    # (amortised, for practical sizes) add/remove, and range queries.
+    # Used so Calendar can update its sorted entry list in place when
+    # entries are added/changed, rather than re-sorting everything.
+    # Implemented as a list of buckets (each a short sorted list), with
+    # parallel lists of keys, and a list of the max key in each bucket
+    # for bisecting. Items with equal keys are kept in insertion order.
+    # Items are identified by object identity, and the key used when an
+    # item was added is remembered, so an item can be removed/moved even
+    # if its key has changed since (e.g. an entry's date was edited).
+    BUCKET_SIZE = 512 # Buckets split when they reach twice this size
+
+    def __init__(self, key:Callable[[Any],int], items:Iterable=()):
+        self._keyfn = key
+        self._keys = {} # type:Dict[int,int] # id(item) -> key
+        self._bkt_items = [] # type:List[list]
+        self._bkt_keys = [] # type:List[List[int]]
+        self._maxes = [] # type:List[int] # max key of each bucket
+        lst = sorted(items, key=key)
+        for i in range(0, len(lst), self.BUCKET_SIZE):
+            b = lst[i:i+self.BUCKET_SIZE]
+            bk = [key(it) for it in b]
+            self._bkt_items.append(b)
+            self._bkt_keys.append(bk)
+            self._maxes.append(bk[-1])
+            for it,k in zip(b,bk):
+                self._keys[id(it)] = k
+
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+    def __contains__(self, item:Any) -> bool:
+        return id(item) in self._keys
+
+
+    def __iter__(self) -> Iterator:
+        for b in self._bkt_items:
+            yield from b
+
+
+    def add(self, item:Any) -> None:
+        # Add item at correct position for its key (after equal keys).
+        if id(item) in self._keys:
+            raise ValueError('Item already in sorted list')
+        k = self._keyfn(item)
+        self._keys[id(item)] = k
+        if not self._maxes:
+            self._bkt_items.append([item])
+            self._bkt_keys.append([k])
+            self._maxes.append(k)
+            return
+        bi = bisect_right(self._maxes, k)
+        if bi == len(self._maxes):
+            # Key is bigger than all others, so append to last bucket
+            bi -= 1
+            self._bkt_items[bi].append(item)
+            self._bkt_keys[bi].append(k)
+            self._maxes[bi] = k
+        else:
+            bk = self._bkt_keys[bi]
+            i = bisect_right(bk, k)
+            bk.insert(i, k)
+            self._bkt_items[bi].insert(i, item)
+        if len(self._bkt_keys[bi]) >= 2*self.BUCKET_SIZE:
+            self._split(bi)
+
+
+    def discard(self, item:Any) -> bool:
+        # Remove item, if present.
+        # Return True if item was removed, False if it wasn't in the list.
+        k = self._keys.pop(id(item), None)
+        if k is None:
+            return False
+        bi = bisect_left(self._maxes, k)
+        while True:
+            bk = self._bkt_keys[bi]
+            b = self._bkt_items[bi]
+            i = bisect_left(bk, k)
+            while i < len(b) and bk[i] == k:
+                if b[i] is item:
+                    del(b[i])
+                    del(bk[i])
+                    if not b:
+                        del(self._bkt_items[bi])
+                        del(self._bkt_keys[bi])
+                        del(self._maxes[bi])
+                    elif i == len(b):
+                        self._maxes[bi] = bk[-1]
+                    return True
+                i += 1
+            # Items with equal keys can continue into next bucket
+            bi += 1
+
+
+    def move(self, item:Any) -> None:
+        # Move item to correct position for its (possibly changed) key.
+        self.discard(item)
+        self.add(item)
+
+
+    def irange_key(self, lo:int, hi:int) -> Iterator:
+        # Iterate over items with lo <= key < hi, in order.
+        bi = bisect_left(self._maxes, lo)
+        if bi == len(self._maxes):
+            return
+        i = bisect_left(self._bkt_keys[bi], lo)
+        while bi < len(self._maxes):
+            bk = self._bkt_keys[bi]
+            b = self._bkt_items[bi]
+            while i < len(b):
+                if bk[i] >= hi:
+                    return
+                yield b[i]
+                i += 1
+            bi += 1
+            i = 0
+
+
+    def _split(self, bi:int) -> None:
+        # Split bucket bi into two halves.
+        h = len(self._bkt_keys[bi])//2
+        b = self._bkt_items[bi]
+        bk = self._bkt_keys[bi]
+        self._bkt_items[bi:bi+1] = [b[:h], b[h:]]
+        self._bkt_keys[bi:bi+1] = [bk[:h], bk[h:]]
+        self._maxes[bi:bi+1] = [bk[h-1], bk[-1]]
+
+
+class ExclusionIndex:
+    # Immutable set of excluded integer keys (e.g. epoch times of
+    # excluded repeat occurrences). Keys are held in a hash set, for
+    # O(1) membership tests, and a sorted list, so searches can find
+    # how far a run of exclusions might extend with a binary search
+    # (see bound_after()/bound_before()).
+
+    def __init__(self, keys:Iterable[int]=()):
+        self._set = set(keys)
+        self._sorted = sorted(self._set)
+
+
+    def __len__(self) -> int:
+        return len(self._sorted)
+
+
+    def __contains__(self, key:int) -> bool:
+        return key in self._set
+
+
+    def bound_after(self, key:int, n:int) -> Optional[int]:
+        # Return the n-th key after key (or the last key, if there are
+        # fewer than n). Returns None if there are no keys after key.
+        i = bisect_right(self._sorted, key)
+        if i == len(self._sorted):
+            return None
+        return self._sorted[min(i+n, len(self._sorted))-1]
+
+
+    def bound_before(self, key:int, n:int) -> Optional[int]:
+        # Return the n-th key before key (or the first key, if there are
+        # fewer than n). Returns None if there are no keys before key.
+        i = bisect_left(self._sorted, key)
+        if i == 0:
+            return None
+        return self._sorted[max(i-n, 0)]
+
+
+def fold_text(txt:str) -> str:
+    # Return txt case-folded with accents removed, for text matching.
+    # E.g. 'Café' -> 'cafe'
+    nfkd = unicodedata.normalize('NFKD', txt)
+    return ''.join([c for c in nfkd if not unicodedata.combining(c)]).casefold()
+
+
+_TOKEN_RE = re.compile(r'\w+')
+
+def text_tokens(txt:str) -> List[str]:
+    # Return list of (folded) word tokens in txt.
+    return _TOKEN_RE.findall(fold_text(txt)) # type:ignore[no-any-return]
+
+
+class TextIndex:
+    # Inverted index of word tokens in items' text fields, used to
+    # search entries without scanning all of them.
+    # Each item has a dict of text fields (e.g. 'SUMMARY':'Lunch').
+    # Searches are for tokens by prefix (so 'meet' finds 'meeting'),
+    # optionally restricted to certain fields. Distinct tokens are kept
+    # in a sorted list, so prefix search can bisect to matching tokens.
+    # Items are identified by object identity.
+
+    def __init__(self):
+        self._postings = {} # type:Dict[str,Dict[str,Set[int]]] # token -> field -> set of id(item)
+        self._vocab = [] # type:List[str] # sorted list of tokens
+        self._items = {} # type:Dict[int,Tuple[Any,int,Set[Tuple[str,str]]]] # id(item) -> (item,seq,tokens)
+        self._seq = 0 # Used to return results in order items were added
+
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+    def __contains__(self, item:Any) -> bool:
+        return id(item) in self._items
+
+
+    def add(self, item:Any, texts:Dict[str,str]) -> None:
+        # Add item to index, with given text fields.
+        # If item is already in index, it is replaced.
+        self.discard(item)
+        toks = set() # type:Set[Tuple[str,str]]
+        for fld,txt in texts.items():
+            for t in text_tokens(txt):
+                toks.add((fld,t))
+        for fld,t in toks:
+            p = self._postings.get(t)
+            if p is None:
+                p = self._postings[t] = {}
+                insort(self._vocab, t)
+            p.setdefault(fld, set()).add(id(item))
+        self._items[id(item)] = (item, self._seq, toks)
+        self._seq += 1
+
+
+    def discard(self, item:Any) -> bool:
+        # Remove item from index, if present.
+        # Return True if item was removed, False if it wasn't in the index.
+        v = self._items.pop(id(item), None)
+        if v is None:
+            return False
+        for fld,t in v[2]:
+            p = self._postings[t]
+            ids = p[fld]
+            ids.discard(id(item))
+            if not ids:
+                del(p[fld])
+                if not p:
+                    del(self._postings[t])
+                    del(self._vocab[bisect_left(self._vocab, t)])
+        return True
+
+
+    def search(self, terms:List[Tuple[str,Optional[Iterable[str]]]]) -> list:
+        # Return list of items matching all terms, in order added.
+        # Each term is a pair: (token prefix, fields), where fields=None
+        # means any field. Prefixes should be folded (see text_tokens()).
+        if not terms:
+            return []
+        matches = [self._prefix_ids(pf, flds) for pf,flds in terms]
+        matches.sort(key=len) # Intersect smallest sets first
+        res = matches[0]
+        for m in matches[1:]:
+            if not res:
+                break
+            res = res.intersection(m)
+        vals = [self._items[i] for i in res]
+        vals.sort(key=lambda v: v[1])
+        return [v[0] for v in vals]
+
+
+    def _prefix_ids(self, prefix:str, fields:Optional[Iterable[str]]) -> Set[int]:
+        # Return ids of items with a token starting with prefix in fields
+        ret = set() # type:Set[int]
+        i = bisect_left(self._vocab, prefix)
+        while i < len(self._vocab) and self._vocab[i].startswith(prefix):
+            p = self._postings[self._vocab[i]]
+            if fields is None:
+                for ids in p.values():
+                    ret.update(ids)
+            else:
+                for f in fields:
+                    if f in p:
+                        ret.update(p[f])
+            i += 1
+        return ret
+
+
+class WindowCache:
+    # Least-recently-used cache of query results for windows [lo,hi).
+    # When data changes, only results for windows overlapping the
+    # changed range need to be invalidated.
+    # Note: invalidate() is linear in the cache size, so the cache is
+    # intended to hold a modest number of windows (e.g. recent views).
+
+    def __init__(self, maxsize:int):
+        self.maxsize = maxsize
+        self._data = OrderedDict() # type:OrderedDict # key -> (lo,hi,value)
+        self.hits = 0
+        self.misses = 0
+
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+    def get(self, key:Any) -> Any:
+        # Return cached value for key, or None if not in cache.
+        try:
+            v = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key) # Most recently used is at end
+        self.hits += 1
+        return v[2]
+
+
+    def put(self, key:Any, lo:Any, hi:Any, value:Any) -> None:
+        # Add value for key to cache, for window lo <= . < hi.
+        # If cache is full, discards least recently used value.
+        if self.maxsize <= 0:
+            return
+        self._data[key] = (lo,hi,value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+
+    def invalidate(self, lo:Any, hi:Any) -> None:
+        # Remove cached values for windows overlapping lo <= . <= hi.
+        # Note: range is inclusive, so lo==hi invalidates a single point.
+        rm = [k for k,v in self._data.items() if v[0]<=hi and lo<v[1]]
+        for k in rm:
+            del(self._data[k])
+
+
+    def clear(self) -> None:
+        # Remove all values from cache (hit/miss counts are not reset)
+        self._data.clear()
@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+#
+# pygenda_lazyload.py
+# Lazy loading of large iCal files: the file is scanned quickly to find
+# its components, and simple events are only fully parsed when needed.
+#
+# Copyright (C) 2022-2026 Matthew Lewis
+#
+# This file is part of Pygenda.
+#
+# Pygenda is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# Pygenda is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pygenda. If not, see <https://www.gnu.org/licenses/>.
+
+
+from icalendar import Calendar as iCalendar, Event as iEvent, Component as iComponent
+from icalendar.parser import Contentline, Parameters
+import re
+from threading import Lock
+from typing import Optional, Any, Dict, Set
+
+
+# Properties of lazy events that can be read without a full parse.
+# These are the ones Calendar uses to sort & index entries.
+HEAD_PROPS = frozenset(('UID','DTSTART','DTEND','DURATION','DUE'))
+# Properties that mean an event is fully parsed when loading, since
+# they're needed to calculate repeats. (Repeating entries are usually
+# a small proportion of a calendar, so this doesn't cost much.)
+EAGER_PROPS = frozenset(('RRULE','RDATE','EXRULE','EXDATE','RECURRENCE-ID'))
+DATETIME_PROPS = frozenset(('DTSTART','DTEND','DUE'))
+
+_RE_COMPONENT = re.compile(rb'^(BEGIN|END):([-A-Za-z0-9]+)\r$', re.M)
+_RE_PROPNAME = re.compile(rb'[;:]')
+
+_load_lock = Lock() # So an event can't be loaded by two threads at once
+_getattr = object.__getattribute__ # Get attribute without loading event
+
+
+def lazy_load_ical(data:Any) -> Optional[iCalendar]:
+    # Return calendar parsed from iCal data (bytes or mmap), with
+    # simple events as LazyEvent objects. Returns None if data can't be
+    # loaded this way (e.g. not CRLF line endings), so caller should use
+    # iCalendar.from_ical() instead.
+    # Data must not change while the calendar is in use (since lazy
+    # events are parsed from it later).
+    blocks = [] # type:list
+    depth = 0
+    start = 0
+    for m in _RE_COMPONENT.finditer(data):
+        if m.group(1) == b'BEGIN':
+            if depth == 0:
+                if blocks or m.start() != 0 or m.group(2).upper() != b'VCALENDAR':
+                    return None # Not a single calendar
+            elif depth == 1:
+                start = m.start()
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 1:
+                blocks.append((m.group(2).upper(), start, m.end()+1))
+            elif depth == 0:
+                tail = m.start()
+                break
+            elif depth < 0:
+                return None
+    else:
+        return None # No end of calendar
+
+    # Header is calendar properties (between BEGIN & first component)
+    hdr_end = blocks[0][1] if blocks else tail
+    cal = iCalendar.from_ical(b''.join((data[:hdr_end], data[tail:])))
+    if cal.subcomponents or type(cal) is not iCalendar:
+        return None # Properties after components - unexpected
+    cal.__class__ = LazyCalendar
+
+    # Components other than events (e.g. timezones) are parsed first,
+    # in case events refer to them.
+    comps = [None]*len(blocks) # type:list
+    for i,(name,st,end) in enumerate(blocks):
+        if name != b'VEVENT':
+            comps[i] = iComponent.from_ical(data[st:end])
+    for i,(name,st,end) in enumerate(blocks):
+        if name == b'VEVENT':
+            comps[i] = LazyEvent.from_block(data, st, end)
+    cal.subcomponents.extend(comps)
+    return cal
+
+
+class LazyCalendar(iCalendar):
+    # Calendar containing LazyEvents.
+    # The icalendar walk() function looks for subcomponents of every
+    # component, which would load all events. Calendar components (e.g.
+    # events, todos) can only be at the top level of a calendar, so
+    # instead just look at the top level for these.
+    TOP_LEVEL = frozenset(('VEVENT','VTODO','VJOURNAL','VFREEBUSY','VTIMEZONE'))
+
+    def walk(self, name:Optional[str]=None, *args:Any) -> list:
+        if name is None or name.upper() not in self.TOP_LEVEL:
+            return super().walk(name, *args) # type:ignore[no-any-return]
+        name = name.upper()
+        return [c for c in self.subcomponents if c.name == name and (not args or args[0](c))]
+
+
+class LazyEvent(iEvent):
+    # Event that is only fully parsed when needed.
+    # Properties in HEAD_PROPS are parsed when the event is created, so
+    # events can be sorted/indexed without being fully parsed. Any other
+    # access causes the event to be parsed; then its class is changed to
+    # Event, so it works exactly like a normal event.
+    # Until parsed, the event's serialised data is the original data.
+
+    # Attributes that can be accessed without loading
+    _SAFE_ATTRS = frozenset(('__class__','__dict__','name','_load','_sort_dt','get','_ical_cache','_lazy'))
+    _needs_load = {} # type:Dict[str,bool] # Cache of attribute names
+
+    @classmethod
+    def from_block(cls, data:Any, start:int, end:int) -> iEvent:
+        # Return event parsed from data[start:end]. This is a LazyEvent,
+        # unless event can't be lazily loaded (then it's a normal Event).
+        blk = data[start:end]
+        names = set() # type:Set[str]
+        nested = False
+        head = {} # type:Dict[str,Any]
+        lines = blk.split(b'\r\n')
+        depth = 0
+        i = 1 # Skip BEGIN line
+        try:
+            while i < len(lines)-2: # Skip END line & empty string
+                ln = lines[i]
+                i += 1
+                if depth == 0 and ln[:1] not in (b' ',b'\t'):
+                    m = _RE_PROPNAME.search(ln)
+                    if m is None:
+                        raise ValueError('Bad content line')
+                    name = ln[:m.start()].upper().decode()
+                    if name == 'BEGIN':
+                        depth += 1
+                        nested = nested or ln[6:].upper() in (b'VEVENT',b'VTODO')
+                        continue
+                    if name in EAGER_PROPS:
+                        raise ValueError('Not loaded lazily')
+                    if name in HEAD_PROPS:
+                        if name in head:
+                            raise ValueError('Repeated property')
+                        while lines[i][:1] in (b' ',b'\t'): # Unfold
+                            ln += lines[i][1:]
+                            i += 1
+                        head[name] = cls._parse_prop(ln.decode())
+                    names.add(name)
+                elif ln[:4].upper() == b'END:':
+                    depth -= 1
+                elif ln[:6].upper() == b'BEGIN:':
+                    depth += 1
+            if 'UID' not in head or 'DTSTART' not in head or nested:
+                raise ValueError('Not loaded lazily')
+        except (ValueError, TypeError):
+            return iEvent.from_ical(blk) # type:ignore[no-any-return]
+        ev = cls()
+        ev._lazy = (data, start, end, head, frozenset(names))
+        return ev
+
+
+    @staticmethod
+    def _parse_prop(line:str) -> Any:
+        # Parse content line to a property, in the same way icalendar
+        # does when parsing a component. Raises ValueError if it is not
+        # a simple case (so event should be parsed normally).
+        sep = line.find(':')
+        if line.find(';', 0, sep) < 0:
+            # No parameters, so quick to split
+            name = line[:sep].upper()
+            params = Parameters()
+            vals = line[sep+1:]
+        else:
+            name, params, vals = Contentline(line).parts()
+            name = name.upper()
+        if 'VALUE' in params and params['VALUE'].upper() not in ('DATE','DATE-TIME','DURATION','TEXT'):
+            raise ValueError('Unexpected value type')
+        factory = iEvent.types_factory.for_property(name)
+        if name in DATETIME_PROPS and 'TZID' in params:
+            prop = factory(factory.from_ical(vals, params['TZID']))
+        else:
+            prop = factory(factory.from_ical(vals))
+        prop.params = params
+        return prop
+
+
+    def _load(self) -> None:
+        # Fully parse event, and change it into an Event.
+        with _load_lock:
+            d = self.__dict__
+            if '_lazy' not in d:
+                return # Already loaded (by another thread)
+            data, start, end, head, names = d['_lazy']
+            raw = data[start:end]
+            full = iEvent.from_ical(raw)
+            # Set cache first, so event serialises the same while loading
+            # (e.g. if a background save is running).
+            d['_ical_cache'] = raw
+            self.__class__ = iEvent
+            del(d['_lazy'])
+            dict.update(self, full)
+            # Keep parsed head properties. They might have been modified
+            # in place (e.g. timezone fixed), and entry_sort_key() checks
+            # DTSTART is the same object to use its cached key.
+            for k,v in head.items():
+                dict.__setitem__(self, k, v)
+            d.update(full.__dict__) # E.g. subcomponents
+
+
+    def __getattribute__(self, name:str) -> Any:
+        # Most attributes are icalendar methods & data that need the
+        # event to be loaded. Private attributes that are not part of
+        # Event are assumed to be Pygenda's (e.g. cached sort keys).
+        try:
+            needs_load = LazyEvent._needs_load[name]
+        except KeyError:
+            needs_load = name not in LazyEvent._SAFE_ATTRS and (name[:1]!='_' or name[:2]=='__' or hasattr(iEvent, name))
+            LazyEvent._needs_load[name] = needs_load
+        if needs_load:
+            _getattr(self, '_load')()
+        return _getattr(self, name)
+
+
+    @property
+    def _ical_cache(self) -> bytes:
+        # Serialised data for unloaded event is its original data
+        lz = _getattr(self, '_lazy')
+        return lz[0][lz[1]:lz[2]] # type:ignore[no-any-return]
+
+
+    def __getitem__(self, key:str) -> Any:
+        lz = _getattr(self, '_lazy')
+        k = key.upper()
+        if k in lz[3]:
+            return lz[3][k]
+        if k not in lz[4]:
+            raise KeyError(key)
+        self._load()
+        return self[key]
+
+
+    def get(self, key:str, default:Any=None) -> Any:
+        lz = _getattr(self, '_lazy')
+        k = key.upper()
+        if k in lz[3]:
+            return lz[3][k]
+        if k not in lz[4]:
+            return default
+        self._load()
+        return self.get(key, default)
+
+
+    def __contains__(self, key:Any) -> bool:
+        return isinstance(key, str) and key.upper() in _getattr(self, '_lazy')[4]
+
+
+    def __eq__(self, other:Any) -> bool:
+        # Quick check that UIDs differ, so e.g. searching lists for
+        # an entry doesn't load other entries.
+        if self is other:
+            return True
+        if isinstance(other, iComponent) and 'UID' in other and str(other['UID']) != str(_getattr(self, '_lazy')[3]['UID']):
+            return False
+        self._load()
+        return bool(self == other)
+
+
+    def __ne__(self, other:Any) -> bool:
+        return not self == other
+
+
+    __hash__ = None # type:ignore[assignment] # Like Event (a dict)
+
+
+# Special methods are looked up on the class, not via __getattribute__,
+# so they need to load the event explicitly.
+def _loading_method(name:str) -> Any:
+    def method(self:LazyEvent, *args:Any, **kwargs:Any) -> Any:
+        self._load()
+        return getattr(self, name)(*args, **kwargs)
+    return method
+
+for _name in ('__setitem__','__delitem__','__iter__','__len__','__repr__'):
+    setattr(LazyEvent, _name, _loading_method(_name))
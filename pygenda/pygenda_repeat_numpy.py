@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+#
+# pygenda_repeat_numpy.py
+# Optional NumPy-based calculation of repeating entry occurrences.
+# Used to speed up expansion of repeats over long ranges (e.g. a year
+# for Year View). If NumPy is not installed, the RepeatInfo iterators
+# (in pygenda_calendar.py) are used.
+#
+# Copyright (C) 2022-2026 Matthew Lewis
+#
+# This file is part of Pygenda.
+#
+# Pygenda is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# Pygenda is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pygenda. If not, see <https://www.gnu.org/licenses/>.
+
+
+from datetime import date as dt_date, datetime as dt_datetime, timedelta, timezone
+from typing import Optional, Any
+
+try:
+    import numpy as np
+except ImportError:
+    np = None # type:ignore[assignment] # NumPy is optional, callers should fall back if None
+
+from .pygenda_util import dt_lt, date_to_datetime, utc_list_to_local
+
+
+# For small numbers of occurrences, the RepeatInfo iterators are quicker
+# than setting up NumPy arrays, so only use NumPy above this.
+MIN_OCCURRENCES = 32
+
+_EPOCH_ORD = dt_date(1970,1,1).toordinal()
+_EPOCH_NAIVE = dt_datetime(1970,1,1)
+_ONE_DAY_US = 86400*1000000
+_ONE_US = timedelta(microseconds=1)
+
+
+def numpy_available() -> bool:
+    # Return True if NumPy can be used to calculate repeats
+    return np is not None
+
+
+def repeats_numpy(rinfo:Any) -> Optional[list]:
+    # Return list of occurrences for RepeatInfo object rinfo, calculated
+    # with NumPy. Occurrences are identical to those given by iterating
+    # over rinfo (including excluded dates removed).
+    # Returns None if NumPy is not available, or it's quicker to use
+    # the iterator (e.g. few occurrences, or repeats with sets of days
+    # in each month, which aren't vectorised) - caller should iterate.
+    if np is None or rinfo.start_in_rng is None or rinfo._isby_period_set:
+        return None
+    ret = _repeats_numpy(rinfo)
+    if ret is not None and rinfo.rdates:
+        ret = list(rinfo.merge_rdates(ret))
+    return ret
+
+
+def _repeats_numpy(rinfo:Any) -> Optional[list]:
+    # Helper for repeats_numpy(), returns occurrences from RRULE
+    base = rinfo.start_in_rng
+    timed = rinfo.timed_rpt
+    if timed:
+        # Work in "wall clock" microseconds, in timezone of occurrences.
+        # (Adding timedeltas to datetimes is wall clock arithmetic, and
+        # sub-day repeats are calculated in UTC by RepeatInfo.)
+        tz = base.tzinfo
+        base_us = (base.replace(tzinfo=None) - _EPOCH_NAIVE)//_ONE_US
+        stop = date_to_datetime(rinfo.stop_exc, True).astimezone(tz).replace(tzinfo=None)
+        # Offset changes (e.g. summer time) may make wall clock stop a
+        # bit out, so add a day margin. Extra values are trimmed below.
+        bound = (stop - _EPOCH_NAIVE)//_ONE_US + (0 if rinfo.subday_rpt else _ONE_DAY_US)
+        unit = 1
+    else:
+        # Work in days
+        base_us = base.toordinal() - _EPOCH_ORD
+        stop_exc = rinfo.stop_exc
+        bound = stop_exc.toordinal() - _EPOCH_ORD
+        if isinstance(stop_exc, dt_datetime):
+            bound += 1 # Trimmed below, if needed
+        unit = _ONE_DAY_US
+    if bound <= base_us:
+        return []
+
+    if rinfo._isby_weekday_in_month:
+        arr = _months_byweekdayinmonth(rinfo, base, bound, timed)
+    elif isinstance(rinfo.delta, list):
+        arr = _multidelta(rinfo, base_us, bound, unit)
+    elif isinstance(rinfo.delta, timedelta):
+        step = rinfo.delta//_ONE_US//unit
+        if (bound-base_us)//step < MIN_OCCURRENCES:
+            return None
+        arr = base_us + step*np.arange(-(-(bound-base_us)//step), dtype=np.int64)
+    else:
+        arr = _months_simple(rinfo, base, bound, timed)
+    if arr is None:
+        return None
+    arr = arr[arr<bound]
+
+    # Remove excluded dates
+    exdates = rinfo.exdates
+    ex_dts = None
+    if exdates:
+        ex_days = [d.toordinal()-_EPOCH_ORD for d in exdates if not isinstance(d,dt_datetime)]
+        ex_dts = [d for d in exdates if isinstance(d,dt_datetime)]
+        if not timed:
+            if ex_days:
+                arr = arr[~np.isin(arr, ex_days)]
+            ex_dts = None # Datetimes never match date occurrences
+        elif rinfo.subday_rpt:
+            # Occurrences are in UTC, so can compare as epoch times
+            if ex_dts:
+                ex_us = [(date_to_datetime(d,True).astimezone(timezone.utc).replace(tzinfo=None)-_EPOCH_NAIVE)//_ONE_US for d in ex_dts]
+                arr = arr[~np.isin(arr, ex_us)]
+            ex_dts = None
+        else:
+            # Timed daily/weekly/... repeats also exclude by date
+            if ex_days:
+                arr = arr[~np.isin(arr//_ONE_DAY_US, ex_days)]
+            # Datetime exdates are checked (below) by datetime comparison
+            # because of timezone edge cases (e.g. occurrence in DST gap).
+
+    # Convert to Python dates/datetimes
+    if not timed:
+        ret = arr.astype('datetime64[D]').tolist()
+    else:
+        ret = arr.astype('datetime64[us]').tolist()
+        if rinfo.subday_rpt:
+            ret = utc_list_to_local(ret)
+        else:
+            ret = [d.replace(tzinfo=tz) for d in ret]
+            if ex_dts:
+                exs = set(ex_dts)
+                ret = [d for d in ret if d not in exs]
+
+    # Trim values that are not before stop (from margins added above)
+    stop_exc = rinfo.stop_exc
+    while ret and not dt_lt(ret[-1], stop_exc):
+        ret.pop()
+    if rinfo.resolve_gaps:
+        # Adjust wall clock times in DST gaps (as RepeatInfo iterators)
+        ret = rinfo.localise_list(ret)
+    return ret # type:ignore[no-any-return]
+
+
+def _multidelta(rinfo:Any, base:int, bound:int, unit:int) -> Any:
+    # Return array of occurrences for repeat with list of deltas (i.e. a
+    # weekly repeat on several days), in units from epoch.
+    # Returns None if iterator should be used.
+    deltas = [d//_ONE_US//unit for d in rinfo.delta]
+    i = rinfo.delta_index
+    deltas = deltas[i:] + deltas[:i] # Rotate, so first delta is deltas[0]
+    period = sum(deltas)
+    cycles = -(-(bound-base)//period)
+    if cycles*len(deltas) < MIN_OCCURRENCES:
+        return None
+    offs = np.concatenate(([0], np.cumsum(deltas[:-1], dtype=np.int64)))
+    arr = base + (period*np.arange(cycles, dtype=np.int64))[:,None] + offs
+    return arr.ravel()
+
+
+def _month_index(d:dt_date) -> int:
+    # Return month number of d, counting from Jan 1970
+    return (d.year-1970)*12 + d.month-1
+
+
+def _months_range(rinfo:Any, base:dt_date, bound:int, timed:bool) -> Any:
+    # Return array of month indexes (from Jan 1970) for a monthly/yearly
+    # repeat, from base month to a month including bound.
+    # Returns None if iterator should be used.
+    step = rinfo.delta.years*12 + rinfo.delta.months
+    bound_days = bound//_ONE_DAY_US if timed else bound
+    bound_date = dt_date.fromordinal(min(bound_days+_EPOCH_ORD, dt_date.max.toordinal()))
+    m0 = _month_index(base)
+    count = (_month_index(bound_date)-m0)//step + 1
+    if count < MIN_OCCURRENCES:
+        return None
+    return m0 + step*np.arange(count, dtype=np.int64)
+
+
+def _time_of_day_us(dt:dt_date) -> int:
+    # Return time-of-day part of dt in microseconds (0 if dt is a date)
+    if not isinstance(dt, dt_datetime):
+        return 0
+    return ((dt.hour*60 + dt.minute)*60 + dt.second)*1000000 + dt.microsecond
+
+
+def _months_simple(rinfo:Any, base:dt_date, bound:int, timed:bool) -> Any:
+    # Return array of occurrences for a repeat with a relativedelta of
+    # months/years (monthly/yearly repeats on same day of month).
+    # Days of the month are always valid (repeats on days that aren't
+    # in every month are a RepeatInfo "period set"), so can add months.
+    months = _months_range(rinfo, base, bound, timed)
+    if months is None:
+        return None
+    arr = months.astype('datetime64[M]').astype('datetime64[D]').astype(np.int64) + (base.day-1)
+    if timed:
+        arr = arr*_ONE_DAY_US + _time_of_day_us(base)
+    return arr
+
+
+def _months_byweekdayinmonth(rinfo:Any, base:dt_date, bound:int, timed:bool) -> Any:
+    # Return array of occurrences for a "by weekday in month" repeat
+    # (e.g. last Sunday of the month). Vectorised version of
+    # RepeatInfo.firstday_to_byweekdayinmonth().
+    months = _months_range(rinfo, base, bound, timed)
+    if months is None:
+        return None
+    firsts = months.astype('datetime64[M]').astype('datetime64[D]').astype(np.int64)
+    wday = (firsts+3)%7 # Monday=0 (1/1/1970 was a Thursday)
+    if rinfo.byday_idx>0:
+        retday = 1 + (rinfo.byday_day-wday)%7 + (rinfo.byday_idx-1)*7
+    else:
+        mdays = (months+1).astype('datetime64[M]').astype('datetime64[D]').astype(np.int64) - firsts
+        lastday_idx = (wday+mdays-1)%7
+        delta = (rinfo.byday_day-lastday_idx)%7
+        retday = mdays + np.where(delta!=0, delta-7, 0) + (rinfo.byday_idx+1)*7
+    arr = firsts + retday - 1
+    if timed:
+        arr = arr*_ONE_DAY_US + _time_of_day_us(base)
+    return arr
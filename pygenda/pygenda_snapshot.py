@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+#
+# pygenda_snapshot.py
+# On-disk cache of parsed calendar data, so large iCal files can be
+# loaded quickly at startup without re-parsing.
+#
+# Copyright (C) 2022-2026 Matthew Lewis
+#
+# This file is part of Pygenda.
+#
+# Pygenda is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# Pygenda is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pygenda. If not, see <https://www.gnu.org/licenses/>.
+
+
+import pickle
+from hashlib import sha256, sha1
+from pathlib import Path
+from sys import stderr, version_info as python_version
+import stat
+import tempfile
+import icalendar
+from typing import Optional
+
+# Pygenda components
+from .pygenda_config import Config
+
+
+# Increase this if the format of snapshot contents changes
+SNAPSHOT_VERSION = 1
+
+SNAPSHOT_DIR = 'cache'
+SNAPSHOT_EXT = 'snapshot'
+
+
+def snapshot_key(filename:Path, data:bytes) -> tuple:
+    # Return key identifying contents of iCal file `filename`, where
+    # `data` is the file contents. If the key stored in a snapshot does
+    # not match, then the snapshot is out of date.
+    # Includes versions of things that might change the pickled data.
+    st = filename.stat()
+    return (SNAPSHOT_VERSION, str(filename.resolve()), st.st_mtime_ns,
+        st.st_size, sha256(data).hexdigest(),
+        getattr(icalendar, '__version__', ''), python_version[:2])
+
+
+def _snapshot_path(filename:Path) -> Path:
+    # Return path of snapshot file for iCal file `filename`.
+    # Name is based on hash of path, so each calendar has its own file.
+    name = sha1(str(filename.resolve()).encode('utf-8')).hexdigest()
+    return Path(Config.config_dir) / SNAPSHOT_DIR / '.'.join((name,SNAPSHOT_EXT))
+
+
+def load_snapshot(filename:Path, key:tuple) -> Optional[dict]:
+    # Return snapshot content for iCal file `filename`, or None if
+    # there is no snapshot or the snapshot key does not match.
+    try:
+        with _snapshot_path(filename).open('rb') as sf:
+            snap_key = pickle.load(sf)
+            if snap_key != key:
+                return None
+            content = pickle.load(sf) # type:dict
+            return content
+    except FileNotFoundError:
+        pass
+    except Exception as excep:
+        # Corrupt/unreadable snapshot - not fatal, we'll just parse file
+        print('Warning: Failed reading calendar snapshot ({:s})'.format(str(excep)), file=stderr)
+    return None
+
+
+def save_snapshot(filename:Path, key:tuple, content:bytes) -> None:
+    # Write snapshot content for iCal file `filename` to disk.
+    # Content should already be pickled (so caller can check data was
+    # not changed while it was being pickled).
+    # Key is pickled first & separately, so it can be checked without
+    # loading the rest of the snapshot.
+    # Like iCal file saving, we write to a temp file and then rename,
+    # so a crash while writing does not leave a partial snapshot.
+    sp = _snapshot_path(filename)
+    sp.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(mode='wb', prefix=sp.name, dir=str(sp.parent), delete=False) as tf:
+        temp_filename = Path(tf.name)
+        temp_filename.chmod(stat.S_IRUSR|stat.S_IWUSR) # Private to user
+        pickle.dump(key, tf, protocol=pickle.HIGHEST_PROTOCOL)
+        tf.write(content)
+    temp_filename.replace(sp)
@@ -27,7 +27,13 @@ from datetime import date, time, datetime, timedelta, tzinfo, timezone
 from dateutil import tz as du_tz
 from tzlocal import get_localzone
 import locale
-from typing import Tuple, Any, Union, Optional
+from bisect import bisect_right
+from typing import Tuple, Any, Union, Optional, List, Dict
+try:
+    from zoneinfo import ZoneInfo
+    _HAVE_ZONEINFO = True
+except ImportError:
+    _HAVE_ZONEINFO = False # Python<3.9, so no zoneinfo
 
 from .pygenda_config import Config
 
@@ -40,6 +46,16 @@ def datetime_to_date(dt:date) -> date:
         return dt
 
 
+def datetime_to_local_date(dt:date) -> date:
+    # Return local date of date/datetime object, so e.g. 1am tomorrow
+    # in another timezone might be today in local timezone.
+    if not isinstance(dt, datetime):
+        return dt
+    if dt.tzinfo is None:
+        return dt.date()
+    return dt.astimezone(_local_tz).date()
+
+
 def datetime_to_time(dt:date):
     # Extract time from datetime object.
     # Return False if no time component.
@@ -70,6 +86,145 @@ def _set_local_tz(zinfo:Any) -> None:
     # Users should set time from the system, not an agenda app!
     global _local_tz
     _local_tz = zinfo
+    _tz_tables.clear()
+
+
+# Converting many datetimes to local time (e.g. for sub-day repeats)
+# with astimezone() is slow for timezones implemented in Python (like
+# dateutil's), since each conversion searches the zone's transitions.
+# Instead, build a table of the local timezone's UTC offsets for each
+# year as needed, and convert by looking up the offset in the table.
+# Tables are rebuilt if the local timezone object changes.
+# (Conversion with zoneinfo objects is done in C, so tables not used.)
+_tz_tables = {} # type:Dict[int,Optional[Tuple[List[datetime],List[timedelta],List[datetime]]]]
+_tz_tables_zone = None # type:Any
+_TZ_FAST_TYPES = (timezone,ZoneInfo) if _HAVE_ZONEINFO else (timezone,) # type:Tuple[type,...]
+_ONE_DAY = timedelta(days=1)
+_ONE_SEC = timedelta(seconds=1)
+
+def _utc_offset_at(utc:datetime) -> timedelta:
+    # Return UTC offset of local timezone at naive UTC datetime utc.
+    # Helper for _tz_table().
+    return utc.replace(tzinfo=timezone.utc).astimezone(_local_tz).utcoffset() # type:ignore[return-value]
+
+
+def _tz_table(year:int) -> Optional[Tuple[List[datetime],List[timedelta],List[datetime]]]:
+    # Return table of local timezone offsets for given (UTC) year, as
+    # a tuple of lists: (starts, offsets, fold_ends), where:
+    #   starts[i] = naive UTC datetime from which offsets[i] applies
+    #   fold_ends[i] = naive UTC datetime until which local times are
+    #     repeated, after clocks go back (so have fold=1, see PEP 495)
+    # Returns None if table can't be built (e.g. year out of bounds).
+    global _tz_tables_zone
+    if _tz_tables_zone is not _local_tz:
+        _tz_tables.clear()
+        _tz_tables_zone = _local_tz
+    if year in _tz_tables:
+        return _tz_tables[year]
+    try:
+        # Start table a day early, so any fold from previous year ends
+        # before year starts. Probe offset daily, and if it changes, find
+        # the second of the transition by binary search.
+        t = datetime(year,1,1) - _ONE_DAY
+        end = datetime(year+1,1,1)
+        off = _utc_offset_at(t)
+        starts = [t]
+        offsets = [off]
+        fold_ends = [t]
+        while t < end:
+            nxt = t + _ONE_DAY
+            nxt_off = _utc_offset_at(nxt)
+            if nxt_off != off:
+                lo,hi = t,nxt # offset changes in range lo < . <= hi
+                while hi-lo > _ONE_SEC:
+                    mid = lo + ((hi-lo)//_ONE_SEC//2)*_ONE_SEC
+                    if _utc_offset_at(mid) == off:
+                        lo = mid
+                    else:
+                        hi = mid
+                starts.append(hi)
+                offsets.append(nxt_off)
+                fold_ends.append(hi+(off-nxt_off) if off>nxt_off else hi)
+                off = nxt_off
+            t = nxt
+        table = (starts,offsets,fold_ends) # type:Optional[Tuple[List[datetime],List[timedelta],List[datetime]]]
+    except (OverflowError, ValueError):
+        table = None
+    _tz_tables[year] = table
+    return table
+
+
+def utc_to_local(dt:datetime) -> datetime:
+    # Convert timezone-aware datetime dt to local timezone.
+    # Equivalent to dt.astimezone(get_local_tz()), but uses offset
+    # table if that will be quicker.
+    if isinstance(_local_tz, _TZ_FAST_TYPES):
+        return dt.astimezone(_local_tz)
+    utc = dt.replace(tzinfo=None)
+    if dt.tzinfo is not timezone.utc:
+        utc -= dt.utcoffset() # type:ignore[operator]
+    table = _tz_table(utc.year)
+    if table is None:
+        return dt.astimezone(_local_tz)
+    i = bisect_right(table[0], utc) - 1
+    return (utc+table[1][i]).replace(tzinfo=_local_tz, fold=1 if utc<table[2][i] else 0)
+
+
+def utc_list_to_local(dts:List[datetime]) -> List[datetime]:
+    # Given sorted list of naive datetimes representing UTC times,
+    # return list of corresponding timezone-aware local datetimes.
+    # Offsets are constant between transitions, so are looked up once
+    # for each run of datetimes between transitions.
+    if isinstance(_local_tz, _TZ_FAST_TYPES):
+        return [d.replace(tzinfo=timezone.utc).astimezone(_local_tz) for d in dts]
+    ret = [] # type:List[datetime]
+    i = 0
+    n = len(dts)
+    while i < n:
+        utc = dts[i]
+        table = _tz_table(utc.year)
+        if table is None:
+            ret.append(utc.replace(tzinfo=timezone.utc).astimezone(_local_tz))
+            i += 1
+            continue
+        starts,offsets,fold_ends = table
+        j = bisect_right(starts, utc) - 1
+        # Run ends at next transition, or end of year's table
+        run_end = starts[j+1] if j+1<len(starts) else datetime(utc.year+1,1,1)
+        off = offsets[j]
+        fold_end = fold_ends[j]
+        while i < n and dts[i] < run_end:
+            d = dts[i]
+            ret.append((d+off).replace(tzinfo=_local_tz, fold=1 if d<fold_end else 0))
+            i += 1
+    return ret
+
+
+def local_utcoffset(dt:datetime) -> Optional[timedelta]:
+    # Return UTC offset of datetime dt. Equivalent to dt.utcoffset(), but
+    # uses offset table if dt is in local timezone and that is quicker.
+    if dt.tzinfo is not _local_tz or isinstance(_local_tz, _TZ_FAST_TYPES):
+        return dt.utcoffset()
+    wall = dt.replace(tzinfo=None, fold=0)
+    table = _tz_table(wall.year)
+    if table is None:
+        return dt.utcoffset()
+    starts,offsets = table[0],table[1]
+    # Find last segment starting at/before wall in local (wall clock)
+    # time. These local starts are in order, apart from within folds.
+    i = len(starts) - 1
+    while i > 0 and wall < starts[i]+offsets[i]:
+        i -= 1
+    if i>0 and offsets[i-1]>offsets[i] and wall < starts[i]+offsets[i-1]:
+        # Repeated time, when clocks go back, so fold decides offset
+        return offsets[i] if dt.fold else offsets[i-1]
+    if i+1<len(starts) and wall >= starts[i+1]+offsets[i]:
+        # In gap, when clocks go forward
+        return dt.utcoffset()
+    if i+1==len(starts) and wall-offsets[i] >= datetime(wall.year+1,1,1):
+        # After end of table
+        return dt.utcoffset()
+    return offsets[i]
 
 
 def date_to_datetime(dt:date, tz:Union[tzinfo,bool]=None) -> datetime:
@@ -102,7 +257,11 @@ def start_end_dts_occ(occ:Tuple[iCal.Event,date]) -> Tuple[date,date]:
         root_dt = occ[0]['DTSTART'].dt
         if isinstance(start, datetime):
             root_dt = date_to_datetime(root_dt,start.tzinfo)
-        d = start - root_dt
+        if isinstance(start, datetime) and start.tzinfo is not root_dt.tzinfo and start.tzinfo is not None:
+            # Different timezones, so difference is in UTC (as with '-')
+            d = start.replace(tzinfo=None) - local_utcoffset(start) - root_dt.replace(tzinfo=None) + local_utcoffset(root_dt) # type:ignore[operator]
+        else:
+            d = start - root_dt
         end = occ[0]['DTEND'].dt + d
     elif 'DURATION' in occ[0]:
         end = start + occ[0]['DURATION'].dt
@@ -219,6 +378,43 @@ def dt_lt(dt_a:date, dt_b:date) -> bool:
     return dt_a < dt_b
 
 
+_EPOCH = datetime(1970,1,1,tzinfo=timezone.utc)
+_ONE_MICROSEC = timedelta(microseconds=1)
+
+def dt_epoch_us(dt:date) -> int:
+    # Return dt as an integer number of microseconds since the Unix epoch.
+    # Used to give numeric keys for indexing/sorting entries.
+    # As in dt_lt(), dates (and datetimes without timezone) are taken
+    # to be in local timezone, so keys depend on the local timezone.
+    return (date_to_datetime(dt,True) - _EPOCH)//_ONE_MICROSEC
+
+
+def dt_sort_key(dt:date) -> int:
+    # Return integer key for sorting dates/datetimes, consistent with
+    # dt_lt(). Datetimes sort after dates at the same time (i.e. "day"
+    # entries before entries timed at midnight).
+    # Note: keys for dates/datetimes without timezones depend on the
+    # local timezone, so need to be recalculated if it changes.
+    return dt_epoch_us(dt)*2 + (1 if isinstance(dt,datetime) else 0)
+
+
+def entry_sort_key(en:Union[iCal.Event,iCal.Todo]) -> int:
+    # Return sort key for entry (from DTSTART for events, DUE for todos).
+    # Keys are cached in the entry, since they are used a lot for
+    # sorting and searching sorted lists of entries. The cached key is
+    # recalculated if the date or local timezone changes.
+    dt = en._sort_dt()
+    try:
+        c = en._sort_key_cache
+        if c[1] is dt and c[0] is _local_tz:
+            return c[2] # type:ignore[no-any-return]
+    except AttributeError:
+        pass
+    k = dt_sort_key(dt)
+    en._sort_key_cache = (_local_tz, dt, k)
+    return k
+
+
 # We want to be able to sort events/todos by datetime.
 # These functions return the relevant datetime for comparison.
 def _event_sort_dt(self) -> date:
@@ -231,18 +427,15 @@ iCal.Event._sort_dt = _event_sort_dt
 iCal.Todo._sort_dt = _todo_sort_dt
 
 
-# And these functions do the comparison between events/todos.
-def _event_lt(self, other) -> bool:
-    # Return True if start date/time of self < start date/time of other
-    return dt_lt(self['DTSTART'].dt, other._sort_dt())
-
-def _todo_lt(self, other) -> bool:
+# And this function does the comparison between events/todos.
+# (For sorting lists, using key=entry_sort_key is quicker.)
+def _entry_lt(self, other) -> bool:
     # Return True if start date/time of self < start date/time of other
-    return dt_lt(self['DUE'].dt, other._sort_dt())
+    return entry_sort_key(self) < entry_sort_key(other)
 
 # Attach methods to classes so they will be used to sort
-iCal.Event.__lt__ = _event_lt
-iCal.Todo.__lt__ = _todo_lt
+iCal.Event.__lt__ = _entry_lt
+iCal.Todo.__lt__ = _entry_lt
 
 
 def dt_add_delta(dt:date, delta:timedelta) -> datetime:
@@ -254,10 +447,10 @@ def dt_add_delta(dt:date, delta:timedelta) -> datetime:
         r += timedelta(days=delta.days)
         delta = timedelta(seconds=delta.seconds,microseconds=delta.microseconds)
     # Add seconds in UTC because then there's no DST to worry about
-    r_utc = r.astimezone(timezone.utc)
+    r_utc = r.replace(tzinfo=timezone.utc) - local_utcoffset(r) # type:ignore[operator]
     r_utc += delta
     # Convert back to localtime for return
-    r = r_utc.astimezone(_local_tz)
+    r = utc_to_local(r_utc)
     return r
 
 
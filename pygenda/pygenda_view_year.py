@@ -23,7 +23,7 @@
 from gi.repository import Gtk, Gdk, GLib
 
 import calendar
-from datetime import date as dt_date, datetime as dt_datetime, timedelta
+from datetime import date as dt_date, timedelta
 from locale import gettext as _ # type:ignore[attr-defined]
 from icalendar import cal as iCal, Event as iEvent, Todo as iTodo
 from typing import Tuple, Union
@@ -436,19 +436,6 @@ class View_Year(View_DayUnit_Base):
         return cls._visible_occurrences[View._cursor_idx_in_date][0]
 
 
-    @staticmethod
-    def _local_date(dt:dt_date) -> dt_date:
-        # Given a date/datetime, return the corresponding local date.
-        # Note this is timezone aware, so 1am-tomorrow in another
-        # timezone might correspond to today in local timezone.
-        # Helper function for _show_gridcontent().
-        if not isinstance(dt, dt_datetime):
-            return dt
-        if dt.tzinfo is None:
-            return dt.date()
-        return dt.astimezone().date()
-
-
     MAP = {
         'YEARLY': 'yearview_entry_repeated_year',
         'MONTHLY': 'yearview_entry_repeated_month',
@@ -478,19 +465,8 @@ class View_Year(View_DayUnit_Base):
         yr = cls._year_viewed
         date = dt_date(year=yr,month=1,day=1)
         oneday = timedelta(days=1)
-        single_list = Calendar.occurrence_list(date, dt_date(year=yr+1,month=1,day=1), include_single=True, include_repeated=False, in_grid=True)
-        occ_dates_single = [cls._local_date(o[1]) for o in single_list if isinstance(o[0],iEvent)]
-        occ_dates_single_iter = iter(occ_dates_single)
-        occ_dates_single_next = next(occ_dates_single_iter,None)
-        if cls.show_todos:
-            occ_dates_todo = [cls._local_date(o[1]) for o in single_list if isinstance(o[0],iTodo)]
-            occ_dates_todo_iter = iter(occ_dates_todo)
-            occ_dates_todo_next = next(occ_dates_todo_iter,None)
-        reps_list = Calendar.occurrence_list(date, dt_date(year=yr+1,month=1,day=1), include_single=False, include_repeated=True, in_grid=True)
-        # Now simplify this list to keep the info we need...
-        reps_list = [(cls._rep_id(o[0]),cls._local_date(o[1])) for o in reps_list if 'FREQ' in o[0]['RRULE']]
-        reps_list_iter = iter(reps_list)
-        reps_list_next_fr,reps_list_next_dt = next(reps_list_iter, (None,None))
+        single_days = Calendar.days_with_occurrences(date, dt_date(year=yr+1,month=1,day=1), include_single=True, include_repeated=False, in_grid=True)
+        reps_days = Calendar.days_with_occurrences(date, dt_date(year=yr+1,month=1,day=1), include_single=False, include_repeated=True, in_grid=True)
 
         for m in range(1,13):
             day,daycount = calendar.monthrange(yr,m)
@@ -498,17 +474,14 @@ class View_Year(View_DayUnit_Base):
             for d in range(daycount):
                 l = cls._grid_cells.get_child_at(x,y)
                 ctx = l.get_style_context()
-                if date == occ_dates_single_next:
+                singles = single_days.get(date, ())
+                if any(isinstance(e,iEvent) for e in singles):
                     ctx.add_class('yearview_entry_single')
-                    while date == occ_dates_single_next:
-                        occ_dates_single_next = next(occ_dates_single_iter,None)
                 elif do_clear:
                     ctx.remove_class('yearview_entry_single')
                 if cls.show_todos:
-                    if date == occ_dates_todo_next:
+                    if any(isinstance(e,iTodo) for e in singles):
                         ctx.add_class('yearview_entry_todo')
-                        while date == occ_dates_todo_next:
-                            occ_dates_todo_next = next(occ_dates_todo_iter,None)
                     elif do_clear:
                         ctx.remove_class('yearview_entry_todo')
                 if do_clear:
@@ -521,11 +494,10 @@ class View_Year(View_DayUnit_Base):
                     ctx.remove_class('yearview_entry_repeated_minute')
                     ctx.remove_class('yearview_entry_repeated_second')
                     ctx.remove_class('yearview_entry_anniversary')
-                if date == reps_list_next_dt:
-                    ctx.add_class('yearview_entry_repeated')
-                    while date == reps_list_next_dt:
-                        ctx.add_class(cls.MAP[reps_list_next_fr]) # type:ignore[index]
-                        reps_list_next_fr,reps_list_next_dt = next(reps_list_iter, (None,None))
+                for e in reps_days.get(date, ()):
+                    if 'FREQ' in e['RRULE']:
+                        ctx.add_class('yearview_entry_repeated')
+                        ctx.add_class(cls.MAP[cls._rep_id(e)])
 
                 date += oneday
                 x += 1
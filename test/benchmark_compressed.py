@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Benchmark loading & saving compressed iCal files, compared with
+# uncompressed files. Uses a generated calendar of 50000 events.
+# Run from test directory: ./benchmark_compressed.py
+#
+# Copyright (C) 2022-2026 Matthew Lewis
+#
+# This file is part of Pygenda.
+#
+# Pygenda is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# Pygenda is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pygenda. If not, see <https://www.gnu.org/licenses/>.
+#
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from timeit import timeit
+
+# Add '..' to path, so this can be run from test directory
+import sys
+sys.path.append('..')
+
+from pygenda.pygenda_calendar import CalendarConnector, CalendarConnectorICalFile, zstandard
+
+RUNS = 3
+EVENTS = 50000
+
+def make_calendar() -> bytes:
+    # Return iCal data for test calendar (same as maketest_large.py)
+    lines = ['BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//Semiprime//PygendaTest//EN']
+    for x in range(EVENTS):
+        lines.extend((
+            'BEGIN:VEVENT',
+            'UID:Pygenda-{:08d}'.format(x),
+            'DTSTAMP:20220101T000000Z',
+            'SUMMARY:Test event {:d}'.format(x),
+            'DTSTART:{:04d}{:02d}{:02d}'.format(2025-x//100, 11-(x//10)%10, 20-x%10),
+            'END:VEVENT'))
+    lines.append('END:VCALENDAR')
+    return ('\r\n'.join(lines)+'\r\n').encode()
+
+
+def load(filename:Path) -> CalendarConnectorICalFile:
+    return CalendarConnectorICalFile(filename, CalendarConnector.TYPE_ALL, save_delay=0)
+
+
+def read_only(conn:CalendarConnectorICalFile, filename:Path) -> None:
+    # Just read (and decompress) file, without parsing
+    with filename.open('rb') as file:
+        comp = conn._detect_compression(file)
+        if comp is None:
+            file.read()
+        else:
+            conn._read_compressed(file, comp)
+
+
+data = make_calendar()
+compressions = ['none', 'gzip']
+if zstandard is not None:
+    compressions.append('zstd')
+else:
+    print('zstandard module not installed, so not testing zstd')
+
+with TemporaryDirectory() as tmpdir:
+    for comp in compressions:
+        filename = Path(tmpdir) / 'benchmark.ics'
+        conn = CalendarConnectorICalFile(filename, CalendarConnector.TYPE_ALL, save_delay=0, compression=comp)
+        t_save = timeit(lambda:conn._write_file(data), number=RUNS)
+        size = filename.stat().st_size
+        t_read = timeit(lambda:read_only(conn, filename), number=RUNS)
+        t_load = timeit(lambda:load(filename), number=1)
+        print('{:s}: size {:d} bytes ({:.1f}%), save {:.1f}ms, read {:.1f}ms, load & parse {:.2f}s'.format(comp, size, size*100/len(data), t_save*1000/RUNS, t_read*1000/RUNS, t_load))
+        filename.unlink()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Benchmark calculation of repeats with TZID across DST changes.
+# Compares RepeatInfo (fast) calculation with dateutil.rrule fallback.
+# Run from test directory: ./benchmark_repeats_dst.py
+#
+# Copyright (C) 2022-2026 Matthew Lewis
+#
+# This file is part of Pygenda.
+#
+# Pygenda is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# Pygenda is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Pygenda. If not, see <https://www.gnu.org/licenses/>.
+#
+
+from datetime import datetime, date
+from dateutil import tz
+from timeit import timeit
+import icalendar
+
+# Add '..' to path, so this can be run from test directory
+import sys
+sys.path.append('..')
+
+from pygenda.pygenda_calendar import repeats_in_range, repeats_in_range_with_rrstr
+from pygenda.pygenda_util import _set_local_tz as set_local_tz
+
+RUNS = 20
+
+tz_NY = tz.gettz('America/New_York')
+set_local_tz(tz.gettz('Europe/London'))
+
+tests = (
+    ('Daily 02:30 (in gap)', datetime(2020,1,6,2,30,tzinfo=tz_NY), {'FREQ':['DAILY']}),
+    ('Weekly Mo,We,Fr 01:30 (overlap)', datetime(2020,1,6,1,30,tzinfo=tz_NY), {'FREQ':['WEEKLY'],'BYDAY':['MO','WE','FR']}),
+    ('Monthly 2nd Su 02:15', datetime(2020,1,12,2,15,tzinfo=tz_NY), {'FREQ':['MONTHLY'],'BYDAY':['2SU']}),
+    )
+
+for (name, dtst, rrule) in tests:
+    ev = icalendar.Event()
+    ev.add('DTSTART', dtst) # Adds TZID parameter
+    ev.add('RRULE', rrule)
+    for (st,end) in ((date(2024,3,1),date(2024,4,1)), (date(2024,1,1),date(2025,1,1))):
+        t_fast = timeit(lambda:repeats_in_range(ev, st, end), number=RUNS)
+        t_rr = timeit(lambda:repeats_in_range_with_rrstr(ev, st, end), number=RUNS)
+        print('{:s}, {} to {}: fast {:.2f}ms, rrule {:.2f}ms'.format(name, st, end, t_fast*1000/RUNS, t_rr*1000/RUNS))
@@ -22,20 +22,27 @@
 #
 
 import unittest
-from datetime import date, datetime, timedelta
+import gzip
+from datetime import date, datetime, timedelta, timezone
+from dateutil import tz
 from os import remove as os_remove
 from os.path import dirname, realpath
+from pathlib import Path
 from icalendar import Event as iEvent, Todo as iTodo
 from time import sleep
+from threading import Thread
+from tempfile import TemporaryDirectory
 
 # Add '..' to path, so this can be run from test directory
 import sys
 sys.path.append('..')
 
 # Import the modules we need for testing...
-from pygenda.pygenda_calendar import Calendar
+from pygenda.pygenda_calendar import Calendar, CalendarConnectorICalFile
+from pygenda.pygenda_lazyload import LazyEvent
 from pygenda.pygenda_entryinfo import EntryInfo
 from pygenda.pygenda_config import Config
+from pygenda.pygenda_util import get_local_tz, _set_local_tz as set_local_tz, dt_epoch_us
 
 
 class TestEntries(unittest.TestCase):
@@ -74,10 +81,12 @@ class TestEntries(unittest.TestCase):
     @classmethod
     def _delete_testfile(cls) -> None:
         # Helper function for setup/teardown
-        try:
-            os_remove(cls.TESTFILE_NAME)
-        except FileNotFoundError:
-            pass
+        Calendar.close() # So pending saves don't re-create file
+        for fn in (cls.TESTFILE_NAME, cls.TESTFILE_NAME+'.journal'):
+            try:
+                os_remove(fn)
+            except FileNotFoundError:
+                pass
 
 
     #@unittest.skip
@@ -233,6 +242,525 @@ class TestEntries(unittest.TestCase):
         self.check_entry_basic_properties(ev7, desc[7], stdt[7])
 
 
+    #@unittest.skip
+    def test_event_06_snapshot(self) -> None:
+        # Test calendar data is the same when loaded from a snapshot
+        saved_config_dir = Config.config_dir
+        saved_min_size = CalendarConnectorICalFile.SNAPSHOT_MIN_SIZE
+        with TemporaryDirectory() as tmpdir:
+            # Put snapshots in temporary dir, & use snapshot for small files
+            Config.config_dir = tmpdir
+            CalendarConnectorICalFile.SNAPSHOT_MIN_SIZE = 0
+            try:
+                Calendar.new_entry(EntryInfo(desc='event 06.2', start_dt=datetime(2012,3,4,12,30)))
+                Calendar.new_entry(EntryInfo(desc='event 06.1', start_dt=date(2012,3,4)))
+                Calendar.new_entry(EntryInfo(type=EntryInfo.TYPE_TODO, desc='todo 06'))
+                occs_orig = self._occ_summaries(date(2012,3,1), date(2012,3,8))
+
+                # No snapshot yet, so file is parsed and snapshot saved
+                Calendar.init()
+                self.assertIsNone(Calendar.calConnectors[0].presorted_norep_list())
+                Calendar.calConnectors[0]._snapshot_thread.join()
+                self.assertEqual(self._occ_summaries(date(2012,3,1), date(2012,3,8)), occs_orig)
+
+                # This time calendar should be loaded from snapshot
+                Calendar.init()
+                self.assertIsNotNone(Calendar.calConnectors[0].presorted_norep_list())
+                self.assertIsNone(Calendar.calConnectors[0]._snapshot_thread)
+                self.assertEqual(self._occ_summaries(date(2012,3,1), date(2012,3,8)), occs_orig)
+                self.assertEqual(len(Calendar.todo_list()), 1)
+
+                # Changing the file makes the snapshot out of date
+                Calendar.new_entry(EntryInfo(desc='event 06.3', start_dt=date(2012,3,5)))
+                Calendar.init()
+                self.assertIsNone(Calendar.calConnectors[0].presorted_norep_list())
+                Calendar.calConnectors[0]._snapshot_thread.join()
+                self.assertEqual(len(self._occ_summaries(date(2012,3,1), date(2012,3,8))), 3)
+            finally:
+                Config.config_dir = saved_config_dir
+                CalendarConnectorICalFile.SNAPSHOT_MIN_SIZE = saved_min_size
+
+
+    #@unittest.skip
+    def test_event_07_occurrence_cache(self) -> None:
+        # Test cached occurrence lists are invalidated when entries change
+        ev = Calendar.new_entry(EntryInfo(desc='event 07', start_dt=date(2015,6,2)))
+        Calendar.new_entry(EntryInfo(desc='event 07 other', start_dt=date(2015,9,1)))
+        self.assertEqual(self._occ_summaries(date(2015,6,1), date(2015,6,8)), ['event 07'])
+        self.assertEqual(self._occ_summaries(date(2015,7,1), date(2015,7,8)), [])
+        self.assertEqual(self._occ_summaries(date(2015,9,1), date(2015,9,8)), ['event 07 other'])
+
+        # Repeat queries should come from cache
+        hits = Calendar.occurrence_cache_stats()['hits']
+        self.assertEqual(self._occ_summaries(date(2015,6,1), date(2015,6,8)), ['event 07'])
+        self.assertEqual(Calendar.occurrence_cache_stats()['hits'], hits+1)
+
+        # Move event - windows for old & new dates must be updated
+        gen = Calendar.occurrence_cache_stats()['generation']
+        ev = Calendar.update_entry(ev, EntryInfo(desc='event 07', start_dt=date(2015,7,3)))
+        self.assertGreater(Calendar.occurrence_cache_stats()['generation'], gen)
+        hits = Calendar.occurrence_cache_stats()['hits']
+        self.assertEqual(self._occ_summaries(date(2015,6,1), date(2015,6,8)), [])
+        self.assertEqual(self._occ_summaries(date(2015,7,1), date(2015,7,8)), ['event 07'])
+        self.assertEqual(Calendar.occurrence_cache_stats()['hits'], hits)
+        # ... but window not overlapping change is still cached
+        self.assertEqual(self._occ_summaries(date(2015,9,1), date(2015,9,8)), ['event 07 other'])
+        self.assertEqual(Calendar.occurrence_cache_stats()['hits'], hits+1)
+
+        # Repeating entry affects all later windows
+        ei = EntryInfo(desc='event 07 repeat', start_dt=date(2015,5,27))
+        ei.set_repeat_info('WEEKLY')
+        ev_r = Calendar.new_entry(ei)
+        self.assertEqual(self._occ_summaries(date(2015,9,1), date(2015,9,8)), ['event 07 other', 'event 07 repeat'])
+        Calendar.delete_entry(ev_r)
+        self.assertEqual(self._occ_summaries(date(2015,9,1), date(2015,9,8)), ['event 07 other'])
+        Calendar.delete_entry(ev)
+        self.assertEqual(self._occ_summaries(date(2015,7,1), date(2015,7,8)), [])
+
+
+    def test_event_08_sort_keys(self) -> None:
+        # Test occurrences are sorted (by cached sort keys) correctly,
+        # and keys are recalculated when local timezone changes.
+        saved_tz = get_local_tz()
+        try:
+            set_local_tz(tz.gettz('Europe/London'))
+            Calendar.init()
+            Calendar.new_entry(EntryInfo(desc='event 08 utc', start_dt=datetime(2016,3,1,3,0,tzinfo=timezone.utc)))
+            Calendar.new_entry(EntryInfo(desc='event 08 floating', start_dt=datetime(2016,3,1,2,0)))
+            Calendar.new_entry(EntryInfo(desc='event 08 midnight', start_dt=datetime(2016,3,1,0,0)))
+            Calendar.new_entry(EntryInfo(desc='event 08 day', start_dt=date(2016,3,1)))
+            self.assertEqual(self._occ_summaries(date(2016,3,1), date(2016,3,2)), ['event 08 day', 'event 08 midnight', 'event 08 floating', 'event 08 utc'])
+
+            # In New York, 03:00 UTC is the previous day
+            set_local_tz(tz.gettz('America/New_York'))
+            self.assertEqual(self._occ_summaries(date(2016,3,1), date(2016,3,2)), ['event 08 day', 'event 08 midnight', 'event 08 floating'])
+            self.assertEqual(self._occ_summaries(date(2016,2,29), date(2016,3,2)), ['event 08 utc', 'event 08 day', 'event 08 midnight', 'event 08 floating'])
+        finally:
+            set_local_tz(saved_tz)
+
+
+    def test_event_09_incremental_index(self) -> None:
+        # Test sorted entry list is updated in place (not rebuilt) when
+        # entries are created/changed/deleted.
+        ev_a = Calendar.new_entry(EntryInfo(desc='event 09a', start_dt=date(2017,5,3)))
+        Calendar.new_entry(EntryInfo(desc='event 09b', start_dt=datetime(2017,5,3,9,0)))
+        self.assertEqual(self._occ_summaries(date(2017,5,1), date(2017,5,8)), ['event 09a', 'event 09b'])
+        norep = Calendar._entry_norep_list_sorted
+        self.assertIsNotNone(norep)
+
+        ev_c = Calendar.new_entry(EntryInfo(desc='event 09c', start_dt=date(2017,5,2)))
+        ev_a = Calendar.update_entry(ev_a, EntryInfo(desc='event 09a', start_dt=datetime(2017,5,3,10,0)))
+        self.assertEqual(self._occ_summaries(date(2017,5,1), date(2017,5,8)), ['event 09c', 'event 09b', 'event 09a'])
+
+        # Entry becomes repeating, so moves out of sorted list
+        ei = EntryInfo(desc='event 09c', start_dt=date(2017,5,2))
+        ei.set_repeat_info('DAILY', count=2)
+        ev_c = Calendar.update_entry(ev_c, ei)
+        self.assertEqual(self._occ_summaries(date(2017,5,1), date(2017,5,8)), ['event 09c', 'event 09c', 'event 09b', 'event 09a'])
+        self.assertNotIn(ev_c, Calendar._entry_norep_list_sorted)
+
+        Calendar.delete_entry(ev_a)
+        self.assertEqual(self._occ_summaries(date(2017,5,1), date(2017,5,8)), ['event 09c', 'event 09c', 'event 09b'])
+        self.assertIs(Calendar._entry_norep_list_sorted, norep)
+        self.assertEqual(len(norep), 1)
+
+
+    def test_event_10_uid_index(self) -> None:
+        # Test lookup of entries by UID, and detection of duplicate UIDs
+        ev = Calendar.new_entry(EntryInfo(desc='event 10', start_dt=date(2018,1,9)))
+        td = Calendar.new_entry(EntryInfo(type=EntryInfo.TYPE_TODO, desc='todo 10'))
+        uid = ev['UID']
+        self.assertIs(Calendar.get_entry_by_uid(uid), ev)
+        self.assertIs(Calendar.get_entry_by_uid(td['UID']), td)
+        self.assertTrue(Calendar.uid_exists(uid))
+        self.assertFalse(Calendar.uid_exists('no-such-uid'))
+        self.assertIsNone(Calendar.get_entry_by_uid('no-such-uid'))
+
+        # Pasted entry gets new UID
+        ev2 = Calendar.paste_entry(ev)
+        self.assertIs(Calendar.get_entry_by_uid(ev2['UID']), ev2)
+        self.assertFalse(Calendar.uid_is_duplicate(uid))
+
+        # Imported entry keeps UID, so is a duplicate
+        ev3 = Calendar.import_entry(ev, 0)
+        self.assertEqual(ev3['UID'], uid)
+        self.assertTrue(Calendar.uid_is_duplicate(uid))
+        self.assertEqual(Calendar.duplicate_uids(), {uid})
+
+        # Updating entry doesn't change index
+        ev = Calendar.update_entry(ev, EntryInfo(desc='event 10a', start_dt=date(2018,1,10)))
+        self.assertTrue(Calendar.uid_is_duplicate(uid))
+
+        # Delete duplicate, the other entry is found
+        Calendar.delete_entry(ev)
+        self.assertFalse(Calendar.uid_is_duplicate(uid))
+        self.assertIs(Calendar.get_entry_by_uid(uid), ev3)
+        Calendar.delete_entry(ev3)
+        self.assertFalse(Calendar.uid_exists(uid))
+        Calendar.delete_entry(td)
+        self.assertIsNone(Calendar.get_entry_by_uid(td['UID']))
+
+        # Index is rebuilt by init
+        Calendar.init()
+        self.assertEqual(Calendar.get_entry_by_uid(ev2['UID'])['SUMMARY'], 'event 10')
+        self.assertFalse(Calendar.uid_exists(uid))
+
+
+    def test_event_11_search(self) -> None:
+        # Test searching entries, including index updates as entries change
+        ev1 = Calendar.new_entry(EntryInfo(desc='Café meeting', start_dt=date(2019,2,6), location='Office'))
+        ev2 = Calendar.new_entry(EntryInfo(desc='Team meet', start_dt=date(2019,2,5)))
+        ei = EntryInfo(type=EntryInfo.TYPE_TODO, desc='Book office party')
+        ei.set_categories(('Work',))
+        td = Calendar.new_entry(ei)
+        self.assertEqual(self._search_summaries('meet'), ['Team meet', 'Café meeting'])
+        self.assertEqual(self._search_summaries('CAFE'), ['Café meeting'])
+        self.assertEqual(self._search_summaries('office'), ['Café meeting', 'Book office party'])
+        self.assertEqual(self._search_summaries('loc:office'), ['Café meeting'])
+        self.assertEqual(self._search_summaries('cat:work'), ['Book office party'])
+        self.assertEqual(self._search_summaries('meet office'), ['Café meeting'])
+        self.assertEqual(self._search_summaries('eting'), [])
+        self.assertEqual(self._search_summaries(''), [])
+
+        # Index is updated when entries change
+        ev2 = Calendar.update_entry(ev2, EntryInfo(desc='Team lunch', start_dt=date(2019,2,5)))
+        self.assertEqual(self._search_summaries('meet'), ['Café meeting'])
+        self.assertEqual(self._search_summaries('lunch'), ['Team lunch'])
+        Calendar.delete_entry(ev1)
+        self.assertEqual(self._search_summaries('office'), ['Book office party'])
+        ev3 = Calendar.new_entry(EntryInfo(desc='Office move', start_dt=date(2019,1,1)))
+        self.assertEqual(self._search_summaries('offic'), ['Office move', 'Book office party'])
+
+        # Index can be built incrementally (e.g. in idle time)
+        Calendar.init()
+        self.assertTrue(Calendar.search_index_build_step(1))
+        while Calendar.search_index_build_step(1):
+            pass
+        self.assertEqual(self._search_summaries('team'), ['Team lunch'])
+
+
+    def test_event_12_repeat_bounds(self) -> None:
+        # Test repeats that have finished/not started are skipped quickly
+        # by occurrence_list(), and the index is updated as they change.
+        ei = EntryInfo(desc='event 12 until', start_dt=date(2020,1,6))
+        ei.set_repeat_info('WEEKLY', until=date(2020,2,3))
+        ev_u = Calendar.new_entry(ei)
+        ei = EntryInfo(desc='event 12 count', start_dt=datetime(2020,1,1,9,0))
+        ei.set_repeat_info('DAILY', count=10)
+        ev_c = Calendar.new_entry(ei)
+        ei = EntryInfo(desc='event 12 forever', start_dt=date(2020,3,2))
+        ei.set_repeat_info('MONTHLY')
+        Calendar.new_entry(ei)
+        self.assertEqual(self._occ_summaries(date(2020,1,6), date(2020,1,7)), ['event 12 until', 'event 12 count'])
+        self.assertEqual(len(self._occ_summaries(date(2020,1,1), date(2021,1,1))), 5+10+10)
+
+        # Check index only returns repeats that might be in range
+        idx = Calendar._entry_rep_index
+        self.assertEqual(self._rep_candidates(date(2020,2,10), date(2020,2,17)), [])
+        self.assertEqual(self._rep_candidates(date(2019,1,1), date(2020,1,1)), [])
+        self.assertEqual(self._rep_candidates(date(2020,1,10), date(2020,1,11)), ['event 12 count', 'event 12 until'])
+        self.assertEqual(self._rep_candidates(date(2024,5,1), date(2024,6,1)), ['event 12 forever'])
+
+        # Extend repeat, so index must be updated
+        ei = EntryInfo(desc='event 12 count', start_dt=datetime(2020,1,1,9,0))
+        ei.set_repeat_info('DAILY', count=50)
+        ev_c = Calendar.update_entry(ev_c, ei)
+        self.assertEqual(self._occ_summaries(date(2020,2,10), date(2020,2,11)), ['event 12 count'])
+        Calendar.delete_entry(ev_u)
+        self.assertEqual(self._rep_candidates(date(2020,1,6), date(2020,1,7)), ['event 12 count'])
+        self.assertIs(Calendar._entry_rep_index, idx)
+
+
+    def test_event_13_occurrence_iter(self) -> None:
+        # Test merging of occurrences, and occurrence generator
+        ei = EntryInfo(desc='event 13 daily', start_dt=datetime(2021,3,1,12,0))
+        ei.set_repeat_info('DAILY')
+        Calendar.new_entry(ei)
+        ei = EntryInfo(desc='event 13 weekly', start_dt=date(2021,3,3))
+        ei.set_repeat_info('WEEKLY')
+        Calendar.new_entry(ei)
+        Calendar.new_entry(EntryInfo(desc='event 13 single', start_dt=datetime(2021,3,2,12,0)))
+        Calendar.new_entry(EntryInfo(desc='event 13 early', start_dt=datetime(2021,3,2,8,0)))
+        self.assertEqual(self._occ_summaries(date(2021,3,2), date(2021,3,4)), ['event 13 early', 'event 13 single', 'event 13 daily', 'event 13 weekly', 'event 13 daily'])
+
+        # Generator gives same results, and can stop early
+        it = Calendar.occurrence_iter(date(2021,3,1), date(2121,3,1))
+        self.assertEqual([next(it)[0]['SUMMARY'] for i in range(3)], ['event 13 daily', 'event 13 early', 'event 13 single'])
+        occs = Calendar.occurrence_list(date(2021,3,1), date(2021,6,1))
+        self.assertEqual(len(occs), 92+13+2)
+        self.assertEqual(list(Calendar.occurrence_iter(date(2021,3,1), date(2021,6,1))), occs)
+        Calendar._occ_cache.clear()
+        self.assertEqual(list(Calendar.occurrence_iter(date(2021,3,1), date(2021,6,1))), occs)
+        self.assertEqual(list(Calendar.occurrence_iter(date(2021,3,1), date(2021,6,1), include_single=False)), [o for o in occs if 'RRULE' in o[0]])
+
+
+    def test_event_14_days_with_occurrences(self) -> None:
+        # Test days with occurrences are found, including dense repeats
+        ei = EntryInfo(desc='event 14 minutely', start_dt=datetime(2022,5,1,9,0))
+        ei.set_repeat_info('MINUTELY', count=2000)
+        ev_m = Calendar.new_entry(ei)
+        ei = EntryInfo(desc='event 14 weekly', start_dt=date(2022,5,2))
+        ei.set_repeat_info('WEEKLY')
+        ev_w = Calendar.new_entry(ei)
+        ev_s = Calendar.new_entry(EntryInfo(desc='event 14 single', start_dt=datetime(2022,5,2,12,0)))
+        days = Calendar.days_with_occurrences(date(2022,5,1), date(2022,6,1))
+        self.assertEqual(sorted(days), [date(2022,5,1), date(2022,5,2), date(2022,5,9), date(2022,5,16), date(2022,5,23), date(2022,5,30)])
+        self.assertEqual(days[date(2022,5,1)], [ev_m])
+        self.assertEqual(days[date(2022,5,2)], [ev_s, ev_m, ev_w])
+        self.assertEqual(Calendar.days_with_occurrences(date(2022,5,1), date(2022,6,1), include_repeated=False), {date(2022,5,2):[ev_s]})
+
+
+    def test_event_15_recurrence_id(self) -> None:
+        # Test occurrences overridden by entries with RECURRENCE-ID are
+        # replaced by the override entries
+        ex = iEvent()
+        ex.add('UID', 'test-event-15')
+        ex.add('SUMMARY', 'event 15 weekly')
+        ex.add('DTSTART', datetime(2023,1,2,10,0))
+        ex.add('RRULE', {'FREQ':['WEEKLY']})
+        Calendar.import_entry(ex, 0)
+        self.assertEqual(len(self._occ_summaries(date(2023,1,1), date(2023,2,1))), 5)
+
+        # Move one occurrence to a different day
+        ex = iEvent()
+        ex.add('UID', 'test-event-15')
+        ex.add('SUMMARY', 'event 15 moved')
+        ex.add('DTSTART', datetime(2023,1,10,11,0))
+        ex.add('RECURRENCE-ID', datetime(2023,1,9,10,0))
+        ev_moved = Calendar.import_entry(ex, 0)
+        # Cancel another occurrence
+        ex = iEvent()
+        ex.add('UID', 'test-event-15')
+        ex.add('SUMMARY', 'event 15 cancelled')
+        ex.add('DTSTART', datetime(2023,1,16,10,0))
+        ex.add('RECURRENCE-ID', datetime(2023,1,16,10,0))
+        ex.add('STATUS', 'CANCELLED')
+        Calendar.import_entry(ex, 0)
+        self.assertEqual(self._occ_summaries(date(2023,1,1), date(2023,2,1)), ['event 15 weekly', 'event 15 moved', 'event 15 cancelled', 'event 15 weekly', 'event 15 weekly'])
+        self.assertEqual(sorted(Calendar.days_with_occurrences(date(2023,1,1), date(2023,2,1))), [date(2023,1,2), date(2023,1,10), date(2023,1,16), date(2023,1,23), date(2023,1,30)])
+        self.assertEqual(len(Calendar._overrides_of(Calendar.get_entry_by_uid('test-event-15'))), 2)
+
+        # Overrides are identified by UID & RECURRENCE-ID (used on import)
+        self.assertTrue(Calendar.uid_exists('test-event-15'))
+        self.assertTrue(Calendar.override_exists('test-event-15', datetime(2023,1,9,10,0)))
+        self.assertTrue(Calendar.override_exists('test-event-15', datetime(2023,1,16,10,0)))
+        self.assertFalse(Calendar.override_exists('test-event-15', datetime(2023,1,23,10,0)))
+        self.assertFalse(Calendar.override_exists('test-event-15x', datetime(2023,1,9,10,0)))
+
+        # Deleting override brings back original occurrence
+        Calendar.delete_entry(ev_moved)
+        self.assertEqual(self._occ_summaries(date(2023,1,9), date(2023,1,11)), ['event 15 weekly'])
+        self.assertFalse(Calendar.override_exists('test-event-15', datetime(2023,1,9,10,0)))
+
+
+    def test_event_16_journal(self) -> None:
+        # Test changes saved to journal, replayed on load & compacted
+        Config.set('calendar', 'journal', 'True')
+        try:
+            journal = Path(self.TESTFILE_NAME+'.journal')
+            ev = Calendar.new_entry(EntryInfo(desc='event 16', start_dt=date(2024,2,1)))
+            Calendar.close() # Writes entry to file
+            self.assertFalse(journal.exists())
+            Calendar.init()
+            with open(self.TESTFILE_NAME, 'rb') as f:
+                filedata = f.read()
+
+            # Changes go to journal; file not re-written
+            ev = Calendar.get_entry_by_uid(str(ev['UID']))
+            Calendar.update_entry(ev, EntryInfo(desc='event 16a', start_dt=date(2024,2,2)))
+            ev_b = Calendar.new_entry(EntryInfo(desc='event 16b', start_dt=date(2024,2,1)))
+            ev_c = Calendar.new_entry(EntryInfo(desc='event 16c', start_dt=date(2024,2,1)))
+            Calendar.delete_entry(ev_b)
+            self.assertTrue(journal.exists())
+            with open(self.TESTFILE_NAME, 'rb') as f:
+                self.assertEqual(f.read(), filedata)
+
+            # Journal is replayed on load. Incomplete record is ignored.
+            # (Simulate crash, so connector is not closed.)
+            Calendar.calConnectors[0]._save_timer.cancel()
+            Calendar.calConnectors = []
+            with journal.open('ab') as f:
+                f.write(b'BEGIN:X-PYGENDA-JOURNAL\r\nX-PYGENDA-OP:DEL')
+            Calendar.init()
+            self.assertEqual(self._occ_summaries(date(2024,2,1), date(2024,2,3)), ['event 16c', 'event 16a'])
+            self.assertTrue(journal.exists())
+
+            # On close, journal is compacted into file
+            Calendar.close()
+            self.assertFalse(journal.exists())
+            Calendar.init()
+            self.assertEqual(self._occ_summaries(date(2024,2,1), date(2024,2,3)), ['event 16c', 'event 16a'])
+        finally:
+            Config.set('calendar', 'journal', None)
+
+
+    def test_event_17_background_save(self) -> None:
+        # Test changes are saved together, in background, after a delay
+        Calendar.new_entry(EntryInfo(desc='event 17a', start_dt=date(2024,3,1)))
+        Calendar.new_entry(EntryInfo(desc='event 17b', start_dt=date(2024,3,2)))
+        self.assertTrue(Calendar.save_pending())
+        self.assertIsNone(Calendar.save_latency())
+        for i in range(100):
+            if not Calendar.save_pending():
+                break
+            sleep(0.05)
+        self.assertFalse(Calendar.save_pending())
+        self.assertGreaterEqual(Calendar.save_latency(), CalendarConnectorICalFile.SAVE_DELAY)
+
+        # Pending change is saved on close
+        Calendar.new_entry(EntryInfo(desc='event 17c', start_dt=date(2024,3,3)))
+        Calendar.close()
+        self.assertFalse(Calendar.save_pending())
+        Calendar.init()
+        self.assertEqual(self._occ_summaries(date(2024,3,1), date(2024,3,4)), ['event 17a', 'event 17b', 'event 17c'])
+
+
+    def test_event_18_serialise_cache(self) -> None:
+        # Test saved data uses cached serialisation of unchanged entries,
+        # and is identical to serialising whole calendar
+        conn = Calendar.calConnectors[0]
+        ev1 = Calendar.new_entry(EntryInfo(desc='event 18a', start_dt=datetime(2024,4,1,10,0)))
+        ei = EntryInfo(desc='event 18b', start_dt=date(2024,4,2))
+        ei.set_repeat_info('WEEKLY')
+        ev2 = Calendar.new_entry(ei)
+        self.assertEqual(conn._to_ical(), conn.cal.to_ical())
+        self.assertTrue(hasattr(ev1, '_ical_cache'))
+
+        # Changed entry is re-serialised
+        Calendar.set_toggle_status_entry(ev1, 'CANCELLED')
+        self.assertFalse(hasattr(ev1, '_ical_cache'))
+        self.assertTrue(hasattr(ev2, '_ical_cache'))
+        ev2 = Calendar.update_entry(ev2, EntryInfo(desc='event 18c', start_dt=date(2024,4,3)))
+        self.assertEqual(conn._to_ical(), conn.cal.to_ical())
+        Calendar.init()
+        self.assertEqual(self._occ_summaries(date(2024,4,1), date(2024,4,4)), ['event 18a', 'event 18c'])
+
+
+    def test_event_19_lazy_load(self) -> None:
+        # Test lazily loaded events are parsed when needed, and unchanged
+        # events are saved as they were in the file
+        Calendar.new_entry(EntryInfo(desc='event 19a', start_dt=datetime(2024,5,1,10,0)))
+        ev_b = Calendar.new_entry(EntryInfo(desc='event 19b', start_dt=date(2024,5,2)))
+        ei = EntryInfo(desc='event 19c', start_dt=date(2024,4,30))
+        ei.set_repeat_info('DAILY')
+        Calendar.new_entry(ei)
+        uid_b = str(ev_b['UID'])
+        Calendar.close()
+        Config.set('calendar', 'lazy_load', 'True')
+        min_size = CalendarConnectorICalFile.LAZY_MIN_SIZE
+        CalendarConnectorICalFile.LAZY_MIN_SIZE = 0
+        try:
+            Calendar.init()
+            with open(self.TESTFILE_NAME, 'rb') as f:
+                filedata = f.read()
+            evs = Calendar.calConnectors[0].cal.walk('VEVENT')
+            self.assertEqual([type(e) for e in evs], [LazyEvent, LazyEvent, iEvent])
+
+            # Search index not built in idle time (it would parse events)
+            self.assertFalse(Calendar.search_index_build_step())
+            self.assertEqual([type(e) for e in evs], [LazyEvent, LazyEvent, iEvent])
+
+            # Accessing an event parses it
+            self.assertEqual(self._occ_summaries(date(2024,5,1), date(2024,5,3)), ['event 19c', 'event 19a', 'event 19b', 'event 19c'])
+            self.assertEqual([type(e) for e in evs], [iEvent, iEvent, iEvent])
+            Calendar.init()
+            ev_b = Calendar.get_entry_by_uid(uid_b)
+            self.assertIs(type(ev_b), LazyEvent)
+            self.assertEqual(ev_b['DTSTART'].dt, date(2024,5,2))
+            self.assertIs(type(ev_b), LazyEvent)
+
+            # Unchanged events are saved unchanged
+            Calendar.update_entry(ev_b, EntryInfo(desc='event 19d', start_dt=date(2024,5,3)))
+            Calendar.close()
+            with open(self.TESTFILE_NAME, 'rb') as f:
+                newdata = f.read()
+            self.assertIn(evs[0]._ical_cache, newdata)
+            self.assertNotEqual(newdata, filedata)
+            Calendar.init()
+            self.assertEqual(self._occ_summaries(date(2024,5,1), date(2024,5,4)), ['event 19c', 'event 19a', 'event 19c', 'event 19d', 'event 19c'])
+            self.assertEqual(self._search_summaries('19d'), ['event 19d'])
+        finally:
+            CalendarConnectorICalFile.LAZY_MIN_SIZE = min_size
+            Config.set('calendar', 'lazy_load', None)
+
+
+    def test_event_20_compressed(self) -> None:
+        # Test calendar file saved gzip-compressed, and loaded again
+        Calendar.new_entry(EntryInfo(desc='event 20a', start_dt=date(2024,6,1)))
+        Calendar.close()
+        Config.set('calendar', 'compression', 'gzip')
+        try:
+            Calendar.init()
+            ev = Calendar.new_entry(EntryInfo(desc='event 20b', start_dt=date(2024,6,2)))
+            Calendar.close()
+            with open(self.TESTFILE_NAME, 'rb') as f:
+                filedata = f.read()
+            self.assertEqual(filedata[:2], b'\x1f\x8b')
+            self.assertIn(b'SUMMARY:event 20b', gzip.decompress(filedata))
+
+            # If compression not set, format of existing file is kept
+            Config.set('calendar', 'compression', None)
+            Calendar.init()
+            self.assertEqual(self._occ_summaries(date(2024,6,1), date(2024,6,3)), ['event 20a', 'event 20b'])
+            ev = Calendar.get_entry_by_uid(str(ev['UID']))
+            Calendar.update_entry(ev, EntryInfo(desc='event 20c', start_dt=date(2024,6,2)))
+            Calendar.close()
+            with open(self.TESTFILE_NAME, 'rb') as f:
+                self.assertEqual(f.read(2), b'\x1f\x8b')
+
+            # Saved uncompressed if compression is 'none'
+            Config.set('calendar', 'compression', 'none')
+            Calendar.init()
+            Calendar.new_entry(EntryInfo(desc='event 20d', start_dt=date(2024,6,2)))
+            Calendar.close()
+            with open(self.TESTFILE_NAME, 'rb') as f:
+                self.assertEqual(f.read(15), b'BEGIN:VCALENDAR')
+            Calendar.init()
+            self.assertEqual(self._occ_summaries(date(2024,6,1), date(2024,6,3)), ['event 20a', 'event 20c', 'event 20d'])
+        finally:
+            Config.set('calendar', 'compression', None)
+
+
+    def test_event_21_background_save_during_edit(self) -> None:
+        # Test background save doesn't write an entry that is part-way
+        # through being changed (simulated by holding edit lock)
+        conn = Calendar.calConnectors[0]
+        ev = Calendar.new_entry(EntryInfo(desc='event 21a', start_dt=date(2024,7,1)))
+        conn._save_timer.cancel()
+        with Calendar._edit_lock:
+            ev['SUMMARY'] = 'event 21 part-changed'
+            saver = Thread(target=conn._background_save)
+            saver.start()
+            sleep(0.2) # Data serialised, waiting for lock
+            Calendar.update_entry(ev, EntryInfo(desc='event 21b', start_dt=date(2024,7,1)))
+        saver.join()
+        if Path(self.TESTFILE_NAME).exists():
+            with open(self.TESTFILE_NAME, 'rb') as f:
+                self.assertNotIn(b'part-changed', f.read())
+        self.assertTrue(Calendar.save_pending())
+        Calendar.close()
+        with open(self.TESTFILE_NAME, 'rb') as f:
+            self.assertIn(b'SUMMARY:event 21b', f.read())
+
+
+    def _rep_candidates(self, start:date, stop:date) -> list:
+        # Helper function: return summaries of repeating entries that
+        # the index says might have occurrences in range
+        Calendar._update_entry_rep_index()
+        reps = Calendar._entry_rep_index.overlapping(dt_epoch_us(start), dt_epoch_us(stop))
+        return [e['SUMMARY'] for e in reps]
+
+
+    def _search_summaries(self, txt:str) -> list:
+        # Helper function: return summaries of search results
+        return [e['SUMMARY'] for e in Calendar.search(txt)]
+
+
+    def _occ_summaries(self, start:date, stop:date) -> list:
+        # Helper function: return summaries of occurrences in range
+        return [o[0]['SUMMARY'] for o in Calendar.occurrence_list(start, stop)]
+
+
     #@unittest.skip
     def test_todo_01_create_modify(self) -> None:
         # Create and modify a basic todo
@@ -56,6 +56,7 @@ class TestImportPaste(unittest.TestCase):
         Config.set('calendar', 'readonly', None)
         Config.set('calendar', 'entry_type', None)
         Config.set('calendar1', 'type', None) # so only specified file opened
+        Config.set('calendar', 'save_delay', '0') # so file saved immediately
 
         # Save local timezone, so running tests will test in your tz
         cls.local_tz_saved = get_local_tz()
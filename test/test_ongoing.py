@@ -78,6 +78,7 @@ class TestOngoing(unittest.TestCase):
     @classmethod
     def _delete_testfile(cls) -> None:
         # Helper function for setup/teardown
+        Calendar.close() # So pending saves don't re-create file
         try:
             os_remove(cls.TESTFILE_NAME)
         except FileNotFoundError:
@@ -511,6 +512,42 @@ class TestOngoing(unittest.TestCase):
         self.check_ongoing_count(date(2020,11,4), 0)
 
 
+    #@unittest.skip
+    def test_11_update_delete(self) -> None:
+        # Test ongoing entries are updated when entries are changed
+        en = Calendar.new_entry(EntryInfo(desc='to be moved', start_dt=date(2024,5,6), end_dt=date(2024,5,9)))
+        self.check_ongoing_count(date(2024,5,7), 1)
+        self.check_ongoing_count(date(2024,6,7), 0)
+
+        # Move to a month later
+        en = Calendar.update_entry(en, EntryInfo(desc='moved', start_dt=date(2024,6,6), end_dt=date(2024,6,9)))
+        self.check_ongoing_count(date(2024,5,7), 0)
+        self.check_ongoing_count(date(2024,6,7), 1)
+        self.assertEqual(Calendar.ongoing_list(date(2024,6,8))[0][0]['SUMMARY'], 'moved')
+
+        # Make it a single-day event, so it's no longer ongoing
+        en = Calendar.update_entry(en, EntryInfo(desc='one day', start_dt=date(2024,6,6)))
+        self.check_ongoing_count(date(2024,6,7), 0)
+
+        # And back to multi-day, then delete
+        en = Calendar.update_entry(en, EntryInfo(desc='two days', start_dt=date(2024,6,6), duration=timedelta(days=2)))
+        self.check_ongoing_count(date(2024,6,7), 1)
+        Calendar.delete_entry(en)
+        self.check_ongoing_count(date(2024,6,7), 0)
+
+
+    #@unittest.skip
+    def test_12_sorted(self) -> None:
+        # Test ongoing entries are returned in order of start
+        Calendar.new_entry(EntryInfo(desc='third', start_dt=datetime(2024,8,3,9,0), end_dt=datetime(2024,8,12,9,0)))
+        Calendar.new_entry(EntryInfo(desc='first', start_dt=date(2024,8,1), end_dt=date(2024,8,15)))
+        Calendar.new_entry(EntryInfo(desc='not ongoing', start_dt=date(2024,8,9), end_dt=date(2024,8,20)))
+        Calendar.new_entry(EntryInfo(desc='second', start_dt=datetime(2024,8,1,12,0), duration=timedelta(days=30)))
+        Calendar.new_entry(EntryInfo(desc='finished', start_dt=date(2024,7,1), end_dt=date(2024,8,8)))
+        ol = Calendar.ongoing_list(date(2024,8,8))
+        self.assertEqual([o[0]['SUMMARY'] for o in ol], ['first','second','third'])
+
+
     def check_ongoing_count(self, dt:date, count:int) -> None:
         # Helper function checks number of ongoing entries
         ol = Calendar.ongoing_list(dt)
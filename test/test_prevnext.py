@@ -890,6 +890,40 @@ class TestPrevNext(unittest.TestCase):
         self.check_prevnext_transition(event, date(2045,5,14), date(2045,5,13), date(2045,5,15))
 
 
+    #@unittest.skip
+    def test_29_daily_long_exdate_run(self) -> None:
+        # Create daily repeating events with long runs of exception
+        # dates (e.g. term-time only), more than used to be searched.
+        exdates = [date(2010,7,20)+timedelta(days=i) for i in range(45)]
+        exdates.extend([date(2010,10,25)+timedelta(days=i) for i in range(7)])
+        event = self.create_event(
+            'Event {}'.format(sys._getframe().f_code.co_name),
+            date(2010,1,4),
+            rrule = {'FREQ':['DAILY']},
+            exdates = exdates)
+
+        self.check_prevnext_transition(event, date(2010,7,19), date(2010,7,18), date(2010,9,3))
+        self.check_prevnext_transition(event, date(2010,7,20), date(2010,7,19), date(2010,9,3), False)
+        self.check_prevnext_transition(event, date(2010,8,20), date(2010,7,19), date(2010,9,3), False)
+        self.check_prevnext_transition(event, date(2010,9,3), date(2010,7,19), date(2010,9,4))
+        self.check_prevnext_transition(event, date(2010,10,25), date(2010,10,24), date(2010,11,1), False)
+        self.check_prevnext_transition(event, date(2010,11,1), date(2010,10,24), date(2010,11,2))
+
+        # Timed version, with mix of date & datetime exceptions
+        exdates = [date(2010,7,20)+timedelta(days=i) for i in range(40)]
+        exdates.extend([datetime(2010,8,29,9,0)+timedelta(days=i) for i in range(5)])
+        event = self.create_event(
+            'Event {}'.format(sys._getframe().f_code.co_name),
+            datetime(2010,1,4,9,0),
+            rrule = {'FREQ':['DAILY']},
+            exdates = exdates)
+
+        self.check_prevnext(event, date(2010,7,19), datetime(2010,7,18,9,0), datetime(2010,7,19,9,0))
+        self.check_prevnext(event, date(2010,7,20), datetime(2010,7,19,9,0), datetime(2010,9,3,9,0))
+        self.check_prevnext(event, date(2010,8,31), datetime(2010,7,19,9,0), datetime(2010,9,3,9,0))
+        self.check_prevnext(event, date(2010,9,4), datetime(2010,9,3,9,0), datetime(2010,9,4,9,0))
+
+
     # Helper methods
     @staticmethod
     def create_event(summary:str, dt_st:date, rrule:dict, dt_end:date=None, exdates=None) -> icalendar.Event:
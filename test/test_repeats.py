@@ -22,7 +22,7 @@
 #
 
 import unittest
-from datetime import datetime, date, time, timedelta
+from datetime import datetime, date, time, timedelta, timezone
 from dateutil import tz
 import icalendar
 from dateutil.rrule import rrulestr
@@ -34,8 +34,9 @@ import sys
 sys.path.append('..')
 
 # Import pygenda modules...
-from pygenda.pygenda_calendar import repeats_in_range
-from pygenda.pygenda_util import get_local_tz, _set_local_tz as set_local_tz
+from pygenda.pygenda_calendar import repeats_in_range, repeat_days_in_range, RepeatInfo, RepeatImpossibleError, RepeatUnsupportedError, RepeatPlan, repeat_plan
+from pygenda.pygenda_repeat_numpy import repeats_numpy
+from pygenda.pygenda_util import get_local_tz, _set_local_tz as set_local_tz, utc_to_local, utc_list_to_local, dt_add_delta
 
 
 # Set this to True to skip some slow tests.
@@ -2381,6 +2382,373 @@ class TestRepeats(unittest.TestCase):
         self.check_count(event, date(2025,4,17), date(2025,4,23), 0)
 
 
+    #@unittest.skip
+    def test_86_repeat_plan_cache(self) -> None:
+        # Test compiled repeat plans are cached, and updated on changes
+        event = self.create_event(
+            'Event {}'.format(sys._getframe().f_code.co_name),
+            date(2024,1,1),
+            rrule = {'FREQ':['YEARLY'],'BYWEEKNO':['1','27'],'BYDAY':['MO']}) # Unsupported by RepeatInfo
+        self.check_count_rrule(event, date(2024,1,1), date(2025,1,1), 3)
+        plan = repeat_plan(event)
+        self.assertEqual(plan.kind, RepeatPlan.FALLBACK)
+        self.check_count_rrule(event, date(2025,1,1), date(2026,1,1), 2)
+        self.assertIs(repeat_plan(event), plan)
+
+        # Changing repeat gives a new plan
+        del(event['RRULE'])
+        event.add('RRULE', {'FREQ':['YEARLY'],'BYWEEKNO':['1','27'],'BYDAY':['MO'],'COUNT':[2]})
+        self.assertIsNot(repeat_plan(event), plan)
+        self.check_count_rrule(event, date(2024,1,1), date(2025,1,1), 2)
+        event = self.create_event(
+            'Event {}'.format(sys._getframe().f_code.co_name),
+            date(2024,1,30),
+            rrule = {'FREQ':['WEEKLY']})
+        plan = repeat_plan(event)
+        self.assertEqual(plan.kind, RepeatPlan.FAST)
+        self.check_count_rrule(event, date(2024,1,1), date(2025,1,1), 49)
+        event.add('EXDATE', date(2024,2,6))
+        self.assertIsNot(repeat_plan(event), plan)
+        self.check_count_rrule(event, date(2024,1,1), date(2025,1,1), 48)
+
+
+    #@unittest.skip
+    def test_87_daily_tzid_dst_gap(self) -> None:
+        # Create daily repeating event with TZID, at a time that doesn't
+        # occur when clocks go forward, and occurs twice when they go back.
+        tz_NY = tz.gettz('America/New_York')
+        self.assertTrue(tz_NY) # check not None
+        set_local_tz(tz_NY)
+
+        event = self.create_event(
+            'Event {}'.format(sys._getframe().f_code.co_name),
+            datetime(2024,1,10,1,30,tzinfo=tz_NY), # Time 01:30 NY
+            rrule = {'FREQ':['DAILY']})
+        self.assertIn('TZID', event['DTSTART'].params)
+        self.assertEqual(repeat_plan(event).kind, RepeatPlan.FAST)
+        # (Range for rrule check avoids ambiguous time, because these
+        # never compare equal if tzinfo objects differ - see PEP 495)
+        self.check_count_rrule(event, date(2024,1,1), date(2024,11,1), 296)
+        self.check_count(event, date(2024,1,1), date(2025,1,1), 357)
+
+        # Clocks going back: first 01:30 (EDT) is used
+        reps = repeats_in_range(event, date(2024,11,3), date(2024,11,4))
+        self.assertEqual(len(reps), 1)
+        self.assertEqual(reps[0].utcoffset(), timedelta(hours=-4))
+
+        event = self.create_event(
+            'Event {}'.format(sys._getframe().f_code.co_name),
+            datetime(2024,1,10,2,30,tzinfo=tz_NY), # Time 02:30 NY
+            rrule = {'FREQ':['DAILY']})
+        # Clocks going forward: uses offset before the gap, so 03:30 EDT
+        for rng in ((date(2024,3,10),date(2024,3,11)), (date(2024,1,1),date(2025,1,1))):
+            reps = [d for d in repeats_in_range(event, *rng) if d.date()==date(2024,3,10)]
+            self.assertEqual(reps, [datetime(2024,3,10,7,30,tzinfo=tz.tzutc())])
+            self.assertEqual(reps[0].replace(tzinfo=None), datetime(2024,3,10,3,30))
+            self.check_numpy(event, *rng)
+        self.check_count(event, date(2024,3,9), date(2024,3,12), 3)
+
+
+    #@unittest.skip
+    def test_88_monthly_byday_sets(self) -> None:
+        # Create monthly repeating events with several BYDAY values,
+        # BYSETPOS or 5th weekday.
+        event = self.create_event(
+            'Event {}'.format(sys._getframe().f_code.co_name),
+            date(1901,1,8),
+            rrule = {'FREQ':['MONTHLY'],'BYDAY':['2TU','4TU']})
+        self.assertEqual(repeat_plan(event).kind, RepeatPlan.FAST)
+        self.check_count(event, date(1900,1,1), date(1901,1,8), 0)
+        self.check_count_rrule(event, date(1900,1,1), date(1902,1,1), 24)
+        self.check_count_rrule(event, date(2024,3,13), date(2024,5,1), 3)
+
+        # Last working day of the month
+        event = self.create_event(
+            'Event {}'.format(sys._getframe().f_code.co_name),
+            datetime(2024,1,31,17,0),
+            rrule = {'FREQ':['MONTHLY'],'BYDAY':['MO','TU','WE','TH','FR'],'BYSETPOS':[-1]})
+        self.assertEqual(repeat_plan(event).kind, RepeatPlan.FAST)
+        self.check_count_rrule(event, date(2024,1,1), date(2025,1,1), 12)
+        self.check_count_rrule(event, date(2024,8,31), date(2024,9,1), 0) # Sat
+        self.check_count_rrule(event, date(2024,8,30), date(2024,8,31), 1) # Fri
+
+        # 5th Friday (only some months)
+        event = self.create_event(
+            'Event {}'.format(sys._getframe().f_code.co_name),
+            date(2024,3,29),
+            rrule = {'FREQ':['MONTHLY'],'BYDAY':['5FR'],'COUNT':[6]})
+        self.assertEqual(repeat_plan(event).kind, RepeatPlan.FAST)
+        self.check_count_rrule(event, date(2024,1,1), date(2025,1,1), 4)
+        self.check_count_rrule(event, date(2024,1,1), date(2030,1,1), 6)
+
+        # Yearly, last two weekdays of February, with exdate
+        event = self.create_event(
+            'Event {}'.format(sys._getframe().f_code.co_name),
+            date(2024,2,28),
+            rrule = {'FREQ':['YEARLY'],'BYMONTH':['2'],'BYDAY':['MO','TU','WE','TH','FR'],'BYSETPOS':[-2,-1]},
+            exdates = [date(2025,2,27)])
+        self.assertEqual(repeat_plan(event).kind, RepeatPlan.FAST)
+        self.check_count_rrule(event, date(2024,1,1), date(2030,1,1), 11)
+
+
+    #@unittest.skip
+    def test_89_bymonthday_byyearday_sets(self) -> None:
+        # Create repeating events with lists of BYMONTHDAY/BYYEARDAY
+        event = self.create_event(
+            'Event {}'.format(sys._getframe().f_code.co_name),
+            date(2024,1,1),
+            rrule = {'FREQ':['MONTHLY'],'BYMONTHDAY':['1','15','-1']})
+        self.assertEqual(repeat_plan(event).kind, RepeatPlan.FAST)
+        self.check_count_rrule(event, date(2024,1,1), date(2025,1,1), 36)
+        self.check_count_rrule(event, date(2024,2,2), date(2024,3,1), 2)
+
+        # Friday 13th
+        event = self.create_event(
+            'Event {}'.format(sys._getframe().f_code.co_name),
+            datetime(2024,9,13,13,13),
+            rrule = {'FREQ':['MONTHLY'],'BYDAY':['FR'],'BYMONTHDAY':['13']})
+        self.assertEqual(repeat_plan(event).kind, RepeatPlan.FAST)
+        self.check_count_rrule(event, date(2024,1,1), date(2030,1,1), 10)
+
+        # 31st, so only occurs in some months
+        event = self.create_event(
+            'Event {}'.format(sys._getframe().f_code.co_name),
+            date(2024,1,31),
+            rrule = {'FREQ':['MONTHLY'],'BYMONTHDAY':['31'],'INTERVAL':[2]})
+        self.assertEqual(repeat_plan(event).kind, RepeatPlan.FAST)
+        self.check_count_rrule(event, date(2024,1,1), date(2026,1,1), 8)
+
+        event = self.create_event(
+            'Event {}'.format(sys._getframe().f_code.co_name),
+            date(2024,1,1),
+            rrule = {'FREQ':['YEARLY'],'BYYEARDAY':['1','100','-1']})
+        self.assertEqual(repeat_plan(event).kind, RepeatPlan.FAST)
+        self.check_count_rrule(event, date(2024,1,1), date(2028,1,1), 12)
+        self.check_count_rrule(event, date(2024,4,9), date(2024,4,10), 1) # Leap year
+        self.check_count_rrule(event, date(2025,4,10), date(2025,4,11), 1)
+
+
+    #@unittest.skip
+    def test_90_count_exdate_rdate(self) -> None:
+        # Create repeating events with COUNT and EXDATE, and with RDATE
+        event = self.create_event(
+            'Event {}'.format(sys._getframe().f_code.co_name),
+            datetime(2024,1,1,10,0),
+            rrule = {'FREQ':['DAILY'],'COUNT':[10]},
+            exdates = [date(2024,1,3), datetime(2024,1,5,10,0,tzinfo=get_local_tz())])
+        self.assertEqual(repeat_plan(event).kind, RepeatPlan.FAST)
+        # Excluded occurrences are included in the count
+        self.check_count_rrule(event, date(2024,1,1), date(2025,1,1), 8)
+        self.check_count_rrule(event, date(2024,1,10), date(2024,1,11), 1)
+        self.check_count_rrule(event, date(2024,1,11), date(2024,1,12), 0)
+
+        event = self.create_event(
+            'Event {}'.format(sys._getframe().f_code.co_name),
+            date(2024,1,1),
+            rrule = {'FREQ':['WEEKLY'],'COUNT':[5]},
+            exdates = [date(2024,1,8)])
+        for d in (date(2023,12,25), date(2024,1,15), date(2024,1,17), date(2024,3,1)):
+            event.add('RDATE', d)
+        self.assertEqual(repeat_plan(event).kind, RepeatPlan.FAST)
+        # RDATEs are merged in order, not limited by COUNT, and
+        # duplicates (e.g. 15th) are removed
+        self.assertEqual(repeats_in_range(event, date(2023,1,1), date(2025,1,1)),
+            [date(2023,12,25), date(2024,1,1), date(2024,1,15), date(2024,1,17),
+            date(2024,1,22), date(2024,1,29), date(2024,3,1)])
+        self.check_count(event, date(2024,1,16), date(2024,1,23), 2)
+        self.check_count(event, date(2024,2,1), date(2024,3,1), 0)
+        self.check_count(event, date(2024,3,1), date(2024,3,2), 1)
+
+        # Check RDATE is also used by fallback
+        del(event['RRULE'])
+        event.add('RRULE', {'FREQ':['YEARLY'],'COUNT':[5],'BYWEEKNO':[1],'BYDAY':['MO']})
+        self.assertEqual(repeat_plan(event).kind, RepeatPlan.FALLBACK)
+        self.check_count(event, date(2023,1,1), date(2025,1,1), 6)
+
+
+    #@unittest.skip
+    def test_91_monthly_31st_yearly_leapday(self) -> None:
+        # Create repeats on days that are not in every month/year.
+        # Occurrences on non-existent dates are skipped (RFC-5545).
+        event = self.create_event(
+            'Event {}'.format(sys._getframe().f_code.co_name),
+            datetime(1950,1,31,9,0),
+            rrule = {'FREQ':['MONTHLY']})
+        self.assertEqual(repeat_plan(event).kind, RepeatPlan.FAST)
+        self.check_count_rrule(event, date(1950,1,1), date(1951,1,1), 7)
+        self.check_count_rrule(event, date(2024,2,1), date(2024,3,31), 0)
+        self.check_count_rrule(event, date(2024,2,1), date(2024,4,1), 1)
+        self.check_count_rrule(event, date(2300,1,1), date(2301,1,1), 7)
+
+        event = self.create_event(
+            'Event {}'.format(sys._getframe().f_code.co_name),
+            date(1896,2,29),
+            rrule = {'FREQ':['YEARLY'],'COUNT':[5]})
+        self.assertEqual(repeat_plan(event).kind, RepeatPlan.FAST)
+        self.check_count_rrule(event, date(1896,1,1), date(1905,1,1), 2) # 1900 not leap
+        self.check_count_rrule(event, date(1800,1,1), date(2000,1,1), 5)
+        self.check_count_rrule(event, date(1912,1,1), date(1913,1,1), 1)
+        self.check_count_rrule(event, date(1916,1,1), date(1917,1,1), 1)
+        self.check_count_rrule(event, date(1920,1,1), date(1921,1,1), 0) # After count
+
+
+    #@unittest.skip
+    def test_92_fallback_far_from_dtstart(self) -> None:
+        # Create repeats unsupported by RepeatInfo, and check ranges
+        # long after DTSTART (where fallback rrule is started nearby).
+        event = self.create_event(
+            'Event {}'.format(sys._getframe().f_code.co_name),
+            datetime(2015,1,1,10,0),
+            rrule = {'FREQ':['HOURLY'],'INTERVAL':[5],'BYDAY':['MO','WE']})
+        self.assertEqual(repeat_plan(event).kind, RepeatPlan.FALLBACK)
+        self.check_count_rrule(event, date(2015,1,1), date(2015,2,1), 39)
+        self.check_count_rrule(event, date(2024,3,4), date(2024,3,11), 10)
+        self.check_count_rrule(event, date(2024,3,25), date(2024,4,1), 10) # DST
+        self.check_count_rrule(event, date(2040,1,1), date(2041,1,1), 503)
+
+        event = self.create_event(
+            'Event {}'.format(sys._getframe().f_code.co_name),
+            datetime(2016,2,29,9,0),
+            rrule = {'FREQ':['YEARLY'],'BYHOUR':['9','17']})
+        self.assertEqual(repeat_plan(event).kind, RepeatPlan.FALLBACK)
+        self.check_count_rrule(event, date(2016,1,1), date(2017,1,1), 2)
+        self.check_count_rrule(event, date(2024,1,1), date(2025,1,1), 2)
+        self.check_count_rrule(event, date(2025,1,1), date(2028,1,1), 0)
+        self.check_count_rrule(event, date(2096,1,1), date(2105,1,1), 4) # 2100 not leap
+
+        # Nearby ranges use the same moved rrule object
+        event = self.create_event(
+            'Event {}'.format(sys._getframe().f_code.co_name),
+            datetime(2010,1,5,9,0),
+            rrule = {'FREQ':['WEEKLY'],'BYDAY':['TU','TH'],'BYSETPOS':['1']})
+        plan = repeat_plan(event)
+        self.assertEqual(plan.kind, RepeatPlan.FALLBACK)
+        self.check_count_rrule(event, date(2024,1,1), date(2024,1,2), 0)
+        rr = plan.rrule_near(event, datetime(2024,1,1,tzinfo=get_local_tz()))
+        self.check_count_rrule(event, date(2024,1,2), date(2024,1,3), 1)
+        self.check_count_rrule(event, date(2024,1,9), date(2024,1,10), 1)
+        self.assertIs(plan.rrule_near(event, datetime(2024,1,10,tzinfo=get_local_tz())), rr)
+        self.assertIsNot(plan.rrule_near(event, datetime(2024,6,1,tzinfo=get_local_tz())), rr)
+
+
+    #@unittest.skip
+    def test_93_days_with_occurrences(self) -> None:
+        # Check days with occurrences of dense sub-day repeats, which
+        # are calculated without listing every occurrence.
+        event = self.create_event(
+            'Event {}'.format(sys._getframe().f_code.co_name),
+            datetime(2024,3,30,23,50),
+            rrule = {'FREQ':['MINUTELY'],'INTERVAL':[7],'UNTIL':[datetime(2024,4,2,0,10)]})
+        self.check_days(event, date(2024,3,1), date(2024,5,1), 4) # DST change
+        self.check_days(event, date(2024,3,31), date(2024,4,2), 2)
+
+        event = self.create_event(
+            'Event {}'.format(sys._getframe().f_code.co_name),
+            datetime(2024,1,1,0,0),
+            rrule = {'FREQ':['HOURLY'],'INTERVAL':[12]},
+            exdates = [datetime(2024,1,5,0,0), datetime(2024,1,5,12,0), datetime(2024,1,6,12,0)])
+        self.check_days(event, date(2024,1,1), date(2024,2,1), 30) # 5th excluded
+        self.check_days(event, date(2024,3,1), date(2024,4,1), 31)
+
+        event = self.create_event(
+            'Event {}'.format(sys._getframe().f_code.co_name),
+            datetime(2024,1,1,10,0),
+            rrule = {'FREQ':['SECONDLY'],'COUNT':[100000]})
+        self.check_days(event, date(2023,12,1), date(2024,2,1), 2)
+
+        tz_NY = tz.gettz('America/New_York')
+        self.assertTrue(tz_NY) # check not None
+        event = self.create_event(
+            'Event {}'.format(sys._getframe().f_code.co_name),
+            datetime(2024,1,1,20,0,tzinfo=tz_NY), # Next day in London
+            rrule = {'FREQ':['HOURLY'],'INTERVAL':[3],'UNTIL':[datetime(2024,1,3,20,0,tzinfo=tz_NY)]})
+        self.check_days(event, date(2024,1,1), date(2024,2,1), 3)
+
+        # Daily repeat, so days are found from occurrences
+        event = self.create_event(
+            'Event {}'.format(sys._getframe().f_code.co_name),
+            datetime(2024,1,1,20,0,tzinfo=tz_NY),
+            rrule = {'FREQ':['DAILY'],'COUNT':[10]})
+        self.check_days(event, date(2024,1,1), date(2024,2,1), 10)
+
+
+    #@unittest.skip
+    def test_94_local_tz_table(self) -> None:
+        # Check conversions from UTC to local time using table of offsets
+        # give same results as astimezone(), including when clocks change.
+        utc_list = [datetime(2024,1,1)+timedelta(minutes=17*i) for i in range(31000)]
+        for zone in ('Europe/London', 'America/New_York', 'Australia/Lord_Howe'):
+            local_tz = tz.gettz(zone)
+            set_local_tz(local_tz)
+            from_astz = [d.replace(tzinfo=timezone.utc).astimezone(local_tz) for d in utc_list]
+            # Compare reprs, so fold is checked
+            self.assertEqual([repr(d) for d in utc_list_to_local(utc_list)], [repr(d) for d in from_astz])
+            self.assertEqual([repr(utc_to_local(d.replace(tzinfo=timezone.utc))) for d in utc_list[::97]], [repr(d) for d in from_astz[::97]])
+            # Add time across clock changes
+            for d in from_astz[::53]:
+                self.assertEqual(repr(dt_add_delta(d, timedelta(hours=1))), repr((d.astimezone(timezone.utc)+timedelta(hours=1)).astimezone(local_tz)))
+
+        # Changing local timezone, table is rebuilt
+        tz_NY = tz.gettz('America/New_York')
+        set_local_tz(tz_NY)
+        self.assertEqual(utc_to_local(datetime(2024,7,1,12,0,tzinfo=timezone.utc)), datetime(2024,7,1,8,0,tzinfo=tz_NY))
+        set_local_tz(tz.gettz('Europe/London'))
+        self.assertEqual(utc_to_local(datetime(2024,7,1,12,0,tzinfo=timezone.utc)).hour, 13)
+
+
+    #@unittest.skip
+    def test_95_period_sets_start_midperiod(self) -> None:
+        # Create repeats with a set of days in each month/year, where
+        # DTSTART is not the first day of the set in its month/year.
+        # Days in that month/year before DTSTART are not occurrences.
+        event = self.create_event(
+            'Event {}'.format(sys._getframe().f_code.co_name),
+            date(2024,1,16),
+            rrule = {'FREQ':['MONTHLY'],'BYDAY':['1TU','3TU']})
+        self.assertEqual(repeat_plan(event).kind, RepeatPlan.FAST)
+        self.check_count(event, date(2024,1,1), date(2024,1,16), 0)
+        self.check_count_rrule(event, date(2024,1,1), date(2024,4,1), 5)
+
+        event = self.create_event(
+            'Event {}'.format(sys._getframe().f_code.co_name),
+            datetime(2024,1,16,10,0),
+            rrule = {'FREQ':['MONTHLY'],'BYMONTHDAY':['2','16'],'COUNT':[3]})
+        self.assertEqual(repeat_plan(event).kind, RepeatPlan.FAST)
+        self.check_count(event, date(2024,1,1), date(2024,1,16), 0)
+        self.check_count_rrule(event, date(2024,1,1), date(2025,1,1), 3)
+        self.check_days(event, date(2024,1,1), date(2024,3,1), 3)
+
+        event = self.create_event(
+            'Event {}'.format(sys._getframe().f_code.co_name),
+            date(2024,3,10),
+            rrule = {'FREQ':['YEARLY'],'BYYEARDAY':['5','70']})
+        self.assertEqual(repeat_plan(event).kind, RepeatPlan.FAST)
+        self.check_count(event, date(2024,1,1), date(2024,3,10), 0)
+        self.check_count_rrule(event, date(2024,1,1), date(2026,1,1), 3)
+
+
+    def test_96_dst_gap_no_duplicates(self) -> None:
+        # Create repeats with several times each day, where some are in
+        # the gap when clocks go forward. These are moved on by the length
+        # of the gap, so may land on another occurrence, which should
+        # only be returned once.
+        tz_LON = tz.gettz('Europe/London')
+        event = self.create_event(
+            'Event {}'.format(sys._getframe().f_code.co_name),
+            datetime(2024,3,1,1,30,tzinfo=tz_LON),
+            rrule = {'FREQ':['DAILY'],'BYHOUR':[1,2]})
+        self.assertEqual(repeat_plan(event).kind, RepeatPlan.FALLBACK)
+        self.assertEqual(repeats_in_range(event, date(2024,3,31), date(2024,4,1)), [datetime(2024,3,31,2,30,tzinfo=tz_LON)])
+        self.assertEqual(len(repeats_in_range(event, date(2024,3,30), date(2024,4,2))), 5)
+
+        # Times moved out of gap are also kept in order
+        event = self.create_event(
+            'Event {}'.format(sys._getframe().f_code.co_name),
+            datetime(2024,3,1,1,0,tzinfo=tz_LON),
+            rrule = {'FREQ':['DAILY'],'BYHOUR':[1,2],'BYMINUTE':[0,30]})
+        self.assertEqual(repeats_in_range(event, date(2024,3,31), date(2024,4,1)), [datetime(2024,3,31,2,0,tzinfo=tz_LON), datetime(2024,3,31,2,30,tzinfo=tz_LON)])
+
+
     # Helper methods
     @staticmethod
     def create_event(summary:str, dt_st:date, dt_end=None, rrule=None, exdates=None) -> icalendar.Event:
@@ -2403,6 +2771,31 @@ class TestRepeats(unittest.TestCase):
         self.assertTrue((dt_end-dt_st)>=timedelta(0)) # consistency check range
         from_reps_in_rng = repeats_in_range(event, dt_st, dt_end)
         self.assertEqual(len(from_reps_in_rng), expected)
+        self.check_numpy(event, dt_st, dt_end)
+
+
+    def check_days(self, event:icalendar.Event, dt_st:date, dt_end:date, expected:int) -> None:
+        # Helper function checks number of days with repeats in given
+        # period, and that they are the days of the repeats.
+        from_reps_days = repeat_days_in_range(event, dt_st, dt_end)
+        self.assertEqual(len(from_reps_days), expected)
+        from_reps = repeats_in_range(event, dt_st, dt_end)
+        days = sorted(set([d.astimezone(get_local_tz()).date() for d in from_reps]))
+        self.assertEqual(from_reps_days, days)
+
+
+    def check_numpy(self, event:icalendar.Event, dt_st:date, dt_end:date) -> None:
+        # Helper function checks that repeats calculated using NumPy
+        # (if available) are identical to those from RepeatInfo iterator
+        try:
+            from_numpy = repeats_numpy(RepeatInfo(event, dt_st, dt_end))
+        except (RepeatImpossibleError, RepeatUnsupportedError):
+            return
+        if from_numpy is None:
+            return # NumPy not installed, or iterator used for few repeats
+        from_iter = list(iter(RepeatInfo(event, dt_st, dt_end)))
+        # Compare reprs, so timezones are also checked
+        self.assertEqual([repr(d) for d in from_numpy], [repr(d) for d in from_iter])
 
 
     def check_count_rrule(self, event:icalendar.Event, dt_st:date, dt_end:date, expected:int) -> None:
@@ -2413,6 +2806,7 @@ class TestRepeats(unittest.TestCase):
         # First check using count
         from_reps_in_rng = repeats_in_range(event, dt_st, dt_end)
         self.assertEqual(len(from_reps_in_rng), expected)
+        self.check_numpy(event, dt_st, dt_end)
 
         # Then check using rrule to make sure repeat dates/times as expected
         ev_rr = deepcopy(event['RRULE']) # Deep copy so can change elements